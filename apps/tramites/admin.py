@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import PlantillaDocumento, CampoPlantilla
+from .services.storage_service import preparar_reemplazo_archivo_plantilla, programar_procesamiento_plantilla
 
 class CampoPlantillaInline(admin.TabularInline):
     """
@@ -29,3 +30,13 @@ class PlantillaDocumentoAdmin(admin.ModelAdmin):
             'fields': ('archivo_base', 'administrador')
         }),
     )
+
+    def save_model(self, request, obj, form, change):
+        # Un archivo nuevo va al almacén por huella y se vuelve a procesar como una subida:
+        # los campos y el índice de layout del archivo anterior dejan de valer
+        archivo_nuevo = 'archivo_base' in form.changed_data and form.cleaned_data.get('archivo_base')
+        if archivo_nuevo:
+            preparar_reemplazo_archivo_plantilla(obj, archivo_nuevo)
+        super().save_model(request, obj, form, change)
+        if archivo_nuevo:
+            programar_procesamiento_plantilla(obj)
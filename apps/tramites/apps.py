@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class TramitesConfig(AppConfig):
+    name = 'apps.tramites'
+    label = 'tramites'
+
+    def ready(self):
+        # Registrar los receptores de señales (invalidación del esquema de formularios)
+        from . import signals  # noqa: F401
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0012_alter_documento_archivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tramite',
+            name='estado_documento',
+            field=models.CharField(choices=[('PENDIENTE', 'Documento pendiente'), ('GENERANDO', 'Generando documento'), ('LISTO', 'Documento listo'), ('ERROR', 'Error al generar el documento')], default='LISTO', help_text='Estado de la generación (posiblemente diferida) del documento PDF del trámite', max_length=20),
+        ),
+    ]
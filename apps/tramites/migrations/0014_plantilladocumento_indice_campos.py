@@ -0,0 +1,18 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0013_tramite_estado_documento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantilladocumento',
+            name='indice_campos',
+            field=models.JSONField(blank=True, default=dict, help_text='Índice de layout: campo -> página, widget, rectángulo y tipo. Se calcula al subir la plantilla.'),
+        ),
+    ]
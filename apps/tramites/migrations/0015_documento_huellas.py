@@ -0,0 +1,23 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0014_plantilladocumento_indice_campos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documento',
+            name='huella_plantilla',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='huella_datos',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
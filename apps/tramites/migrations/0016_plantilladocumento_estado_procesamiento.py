@@ -0,0 +1,23 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0015_documento_huellas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantilladocumento',
+            name='estado_procesamiento',
+            field=models.CharField(choices=[('PENDIENTE', 'En cola de procesamiento'), ('PROCESANDO', 'Procesando plantilla'), ('LISTA', 'Plantilla lista'), ('ERROR', 'Error al procesar la plantilla')], default='LISTA', help_text='Etapa del procesamiento en segundo plano de la plantilla subida', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='plantilladocumento',
+            name='error_procesamiento',
+            field=models.TextField(blank=True, default='', help_text='Motivo del último error de procesamiento'),
+        ),
+    ]
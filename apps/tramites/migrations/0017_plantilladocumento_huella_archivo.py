@@ -0,0 +1,37 @@
+# Generated by Django 4.2 manually
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def calcular_huellas(apps, schema_editor):
+    """
+    Calcula la huella de los archivos base de las plantillas existentes.
+    """
+    PlantillaDocumento = apps.get_model('tramites', 'PlantillaDocumento')
+    for plantilla in PlantillaDocumento.objects.exclude(archivo_base='').iterator():
+        huella = hashlib.sha256()
+        try:
+            with plantilla.archivo_base.open('rb') as archivo:
+                for bloque in archivo.chunks():
+                    huella.update(bloque)
+        except (FileNotFoundError, OSError):
+            continue
+        PlantillaDocumento.objects.filter(id=plantilla.id).update(huella_archivo=huella.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0016_plantilladocumento_estado_procesamiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantilladocumento',
+            name='huella_archivo',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA-256 del archivo base. Las subidas idénticas comparten archivo y extracción.', max_length=64),
+        ),
+        migrations.RunPython(calcular_huellas, migrations.RunPython.noop),
+    ]
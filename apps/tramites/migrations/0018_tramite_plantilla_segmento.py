@@ -0,0 +1,66 @@
+# Generated by Django 4.2 manually
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+
+TAMANO_LOTE = 1000
+
+
+def asociar_plantillas(apps, schema_editor):
+    """
+    Rellena plantilla y segmento de los trámites existentes a partir de su nombre
+    (tipo_especifico de la plantilla), en lotes por id con una transacción por lote.
+    """
+    PlantillaDocumento = apps.get_model('tramites', 'PlantillaDocumento')
+    Tramite = apps.get_model('tramites', 'Tramite')
+
+    # Por tipo: la plantilla activa más reciente o, si no hay, la más reciente
+    plantilla_por_tipo = {}
+    for plantilla_id, tipo, segmento in (
+        PlantillaDocumento.objects.order_by('-activo', '-fecha_creacion')
+        .values_list('id', 'tipo_especifico', 'segmento')
+    ):
+        plantilla_por_tipo.setdefault(tipo, (plantilla_id, segmento))
+
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Tramite.objects.filter(id__gt=ultimo_id, plantilla__isnull=True)
+            .order_by('id').values_list('id', 'nombre')[:TAMANO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1][0]
+
+        ids_por_tipo = {}
+        for tramite_id, nombre in lote:
+            if nombre in plantilla_por_tipo:
+                ids_por_tipo.setdefault(nombre, []).append(tramite_id)
+
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for nombre, ids in ids_por_tipo.items():
+                plantilla_id, segmento = plantilla_por_tipo[nombre]
+                Tramite.objects.filter(id__in=ids).update(plantilla_id=plantilla_id, segmento=segmento)
+
+
+class Migration(migrations.Migration):
+    # Cada lote del relleno se confirma por separado (no bloquear la tabla entera)
+    atomic = False
+
+    dependencies = [
+        ('tramites', '0017_plantilladocumento_huella_archivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tramite',
+            name='plantilla',
+            field=models.ForeignKey(blank=True, help_text='Plantilla con la que se inició el trámite', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tramites', to='tramites.plantilladocumento'),
+        ),
+        migrations.AddField(
+            model_name='tramite',
+            name='segmento',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Segmento de la plantilla (desnormalizado para el bloqueo por segmento)', max_length=100),
+        ),
+        migrations.RunPython(asociar_plantillas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Copia fija de Tramite.ESTADOS_ACTIVOS al crear esta migración: el modelo puede cambiar
+# después, pero la migración debe seguir creando el mismo índice
+ESTADOS_ACTIVOS = ('PENDIENTE', 'EN_PROCESO', 'RETRASADO')
+
+
+def verificar_segmentos_activos(apps, schema_editor):
+    """
+    El índice no se puede crear si algún solicitante ya tiene varios trámites activos
+    en el mismo segmento: se listan para que se resuelvan (cerrando los sobrantes) antes de migrar.
+    """
+    Tramite = apps.get_model('tramites', 'Tramite')
+    duplicados = list(
+        Tramite.objects.filter(estado__in=ESTADOS_ACTIVOS).exclude(segmento='')
+        .values('solicitante_id', 'segmento')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+    if not duplicados:
+        return
+
+    detalle = []
+    for grupo in duplicados:
+        ids = list(
+            Tramite.objects.filter(
+                solicitante_id=grupo['solicitante_id'], segmento=grupo['segmento'], estado__in=ESTADOS_ACTIVOS
+            ).order_by('id').values_list('id', flat=True)
+        )
+        detalle.append(f"solicitante #{grupo['solicitante_id']}, segmento '{grupo['segmento']}': trámites {ids}")
+    raise RuntimeError(
+        "Hay solicitantes con más de un trámite activo en el mismo segmento; "
+        "cierre los sobrantes antes de aplicar esta migración:\n" + "\n".join(detalle)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0018_tramite_plantilla_segmento'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_segmentos_activos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tramite',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ESTADOS_ACTIVOS), models.Q(('segmento', ''), _negated=True)), fields=('solicitante', 'segmento'), name='tramite_un_activo_por_segmento'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+
+SECUENCIA_TURNOS = 'tramites_asignacion_turno_seq'
+
+
+def crear_secuencia(apps, schema_editor):
+    """
+    Secuencia del modo de asignación 'contador' (solo PostgreSQL; el resto de motores
+    usa UltimaAsignacion.contador).
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SECUENCIA_TURNOS}")
+
+
+def eliminar_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SECUENCIA_TURNOS}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0019_tramite_un_activo_por_segmento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ultimaasignacion',
+            name='contador',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(crear_secuencia, eliminar_secuencia),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2 manually
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+ESTADOS_ABIERTOS = ('PENDIENTE', 'EN_PROCESO')
+TAMANO_LOTE = 1000
+
+
+def calcular_cargas(apps, schema_editor):
+    """
+    Una fila por tramitador con sus trámites abiertos actuales (una sola consulta agregada).
+    """
+    Tramite = apps.get_model('tramites', 'Tramite')
+    CargaTramitador = apps.get_model('tramites', 'CargaTramitador')
+    Usuario = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    # En el historial de migraciones el campo aún se llama empleado_asignado (misma columna)
+    campo = next(f.name for f in Tramite._meta.concrete_fields if f.column == 'empleado_asignado_id')
+
+    abiertos = dict(
+        Tramite.objects.filter(estado__in=ESTADOS_ABIERTOS, **{f'{campo}__isnull': False})
+        .values_list(campo)
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    tramitadores = set(Usuario.objects.filter(rol='TRAMITADOR').values_list('id', flat=True)) | set(abiertos)
+    CargaTramitador.objects.bulk_create(
+        [CargaTramitador(tramitador_id=tramitador_id, abiertos=abiertos.get(tramitador_id, 0)) for tramitador_id in tramitadores],
+        batch_size=TAMANO_LOTE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tramites', '0020_ultimaasignacion_contador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaTramitador',
+            fields=[
+                ('tramitador', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='carga', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('abiertos', models.IntegerField(default=0)),
+                ('ultimo_turno', models.BigIntegerField(default=0, help_text='Turno de la última asignación recibida (desempate round-robin)')),
+            ],
+            options={
+                'verbose_name': 'Carga de Tramitador',
+                'verbose_name_plural': 'Cargas de Tramitadores',
+                'indexes': [models.Index(fields=['abiertos', 'ultimo_turno'], name='carga_abiertos_turno_idx')],
+            },
+        ),
+        migrations.RunPython(calcular_cargas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2 manually
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+TAMANO_LOTE = 1000
+
+
+def calcular_estadisticas(apps, schema_editor):
+    """
+    Una fila por tramitador y estado con los trámites actuales (una sola consulta agregada).
+    """
+    Tramite = apps.get_model('tramites', 'Tramite')
+    EstadisticaTramitador = apps.get_model('tramites', 'EstadisticaTramitador')
+    # En el historial de migraciones el campo aún se llama empleado_asignado (misma columna)
+    campo = next(f.name for f in Tramite._meta.concrete_fields if f.column == 'empleado_asignado_id')
+
+    conteos = (
+        Tramite.objects.filter(**{f'{campo}__isnull': False})
+        .values_list(campo, 'estado')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    EstadisticaTramitador.objects.bulk_create(
+        [EstadisticaTramitador(tramitador_id=tramitador_id, estado=estado, total=total) for tramitador_id, estado, total in conteos],
+        batch_size=TAMANO_LOTE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tramites', '0021_cargatramitador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaTramitador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente de Aprobación'), ('APROBADO', 'Aprobado'), ('RECHAZADO', 'Rechazado'), ('EN_PROCESO', 'En Proceso'), ('COMPLETADO', 'Completado'), ('RETRASADO', 'Retrasado')], max_length=20)),
+                ('total', models.IntegerField(default=0)),
+                ('tramitador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_trabajo', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Estadística de Tramitador',
+                'verbose_name_plural': 'Estadísticas de Tramitadores',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticatramitador',
+            constraint=models.UniqueConstraint(fields=('tramitador', 'estado'), name='estadistica_tramitador_estado_unica'),
+        ),
+        migrations.RunPython(calcular_estadisticas, migrations.RunPython.noop),
+    ]
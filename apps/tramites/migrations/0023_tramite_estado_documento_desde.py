@@ -0,0 +1,18 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0022_estadisticatramitador'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tramite',
+            name='estado_documento_desde',
+            field=models.DateTimeField(blank=True, help_text='Momento del último cambio de estado_documento (detecta trabajos perdidos del worker)', null=True),
+        ),
+    ]
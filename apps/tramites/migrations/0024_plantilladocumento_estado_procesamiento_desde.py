@@ -0,0 +1,18 @@
+# Generated by Django 4.2 manually
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tramites', '0023_tramite_estado_documento_desde'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plantilladocumento',
+            name='estado_procesamiento_desde',
+            field=models.DateTimeField(blank=True, help_text='Momento del último cambio de estado_procesamiento (detecta trabajos perdidos del worker)', null=True),
+        ),
+    ]
@@ -1,5 +1,5 @@
 import os
-from django.apps import apps
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.conf import settings
 from .storage import OverwriteStorage
@@ -20,26 +20,31 @@ def documento_upload_to(instance, filename):
     new_filename = f"{documento_nombre_clean}_v{version}{ext}"
     
     # Segmento
-    segmento = 'general'
-    
-    # Intentar obtener la plantilla
-    PlantillaDocumento = apps.get_model('tramites', 'PlantillaDocumento')
-    
-    # Try to find template attached to tramite or by name
-    plantilla = getattr(tramite, 'plantilla', None)
-    if not plantilla:
-        # Try to find by name
-        plantilla = PlantillaDocumento.objects.filter(tipo_especifico=tramite.nombre).first()
-            
-    if plantilla:
-        segmento = plantilla.segmento.lower().replace(' ', '_')
-    elif hasattr(tramite, 'nombre'):
-         segmento = tramite.nombre.split()[0].lower()
+    segmento = carpeta_segmento(tramite)
 
     return f"solicitante/solicitante_{solicitante_id:04d}/{segmento}/{new_filename}"
 
+def carpeta_segmento(tramite):
+    """
+    Carpeta del segmento del trámite dentro del directorio del solicitante.
+    Usa el segmento desnormalizado del trámite (sin consultar la plantilla).
+    """
+    if tramite.segmento:
+        return tramite.segmento.lower().replace(' ', '_')
+    if tramite.nombre:
+        return tramite.nombre.split()[0].lower()
+    return 'general'
+
+# Estados que ocupan el segmento: un solicitante solo puede tener un trámite activo por segmento.
+# A nivel de módulo porque Tramite.Meta (restricción de segmento) no ve los atributos de la clase.
+ESTADOS_TRAMITE_ACTIVOS = ('PENDIENTE', 'EN_PROCESO', 'RETRASADO')
+
 class Tramite(models.Model):
     ESTADOS = (('PENDIENTE', 'Pendiente de Aprobación'), ('APROBADO', 'Aprobado'), ('RECHAZADO', 'Rechazado'), ('EN_PROCESO', 'En Proceso'), ('COMPLETADO', 'Completado'), ('RETRASADO', 'Retrasado'))
+    ESTADOS_ACTIVOS = ESTADOS_TRAMITE_ACTIVOS
+    # Estados que cuentan como trabajo abierto del tramitador (CargaTramitador.abiertos)
+    ESTADOS_ABIERTOS = ('PENDIENTE', 'EN_PROCESO')
+    ESTADOS_DOCUMENTO = (('PENDIENTE', 'Documento pendiente'), ('GENERANDO', 'Generando documento'), ('LISTO', 'Documento listo'), ('ERROR', 'Error al generar el documento'))
     solicitante = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tramites')
     tramitador_asignado = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
@@ -59,10 +64,59 @@ class Tramite(models.Model):
     fecha_rechazo = models.DateTimeField(null=True, blank=True, help_text="Fecha en que el tramitador rechazó el trámite")
     motivo_rechazo = models.TextField(blank=True, null=True, help_text="Razón del rechazo del trámite")
     datos_formulario = models.JSONField(default=dict, blank=True, help_text="Datos dinámicos del formulario del trámite")
+    estado_documento = models.CharField(max_length=20, choices=ESTADOS_DOCUMENTO, default='LISTO', help_text="Estado de la generación (posiblemente diferida) del documento PDF del trámite")
+    estado_documento_desde = models.DateTimeField(null=True, blank=True, help_text="Momento del último cambio de estado_documento (detecta trabajos perdidos del worker)")
+    plantilla = models.ForeignKey('PlantillaDocumento', on_delete=models.SET_NULL, null=True, blank=True, related_name='tramites', help_text="Plantilla con la que se inició el trámite")
+    segmento = models.CharField(max_length=100, blank=True, default='', db_index=True, help_text="Segmento de la plantilla (desnormalizado para el bloqueo por segmento)")
     def __str__(self): return self.nombre
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Valores leídos de la BD: las señales calculan con ellos el cambio de carga del tramitador
+        instancia._valores_carga = {
+            campo: instancia.__dict__[campo] for campo in ('estado', 'tramitador_asignado_id') if campo in instancia.__dict__
+        }
+        return instancia
+
+    def bloquear_para_cambio(self):
+        """
+        Bloquea la fila (SELECT ... FOR UPDATE) hasta el final de la transacción en curso y
+        refresca estado y tramitador con los valores bloqueados. Así las señales calculan el
+        cambio de los contadores desde el valor vigente, no desde una lectura sin bloqueo que
+        otra petición pudo dejar obsoleta. Debe llamarse dentro de transaction.atomic().
+        """
+        bloqueado = type(self).objects.select_for_update().only('estado', 'tramitador_asignado').get(pk=self.pk)
+        self.estado = bloqueado.estado
+        self.tramitador_asignado_id = bloqueado.tramitador_asignado_id
+        self._valores_carga = bloqueado._valores_carga
+
+    def obtener_plantilla_vigente(self):
+        """
+        Plantilla activa con la que se edita y genera el documento del trámite.
+
+        Es la plantilla asociada mientras siga activa. Si se eliminó o se desactivó (ej: al
+        reemplazarla por una nueva subida del mismo tipo) se busca, como antes de existir la
+        asociación, la plantilla activa más reciente del mismo tipo. Retorna None si no hay.
+        """
+        if self.plantilla_id is not None and self.plantilla.activo:
+            return self.plantilla
+        plantilla = PlantillaDocumento.objects.filter(tipo_especifico=self.nombre, activo=True).first()
+        if plantilla is not None:
+            self.plantilla = plantilla  # Para _generar_ruta_archivo y los usos posteriores en memoria
+        return plantilla
+
     class Meta:
         db_table = 'tramites_tramite'
         permissions = [("can_modify_own_tramite", "Puede modificar sus propios trámites"), ("can_approve_tramite", "Puede aprobar trámites")]
+        constraints = [
+            # Bloqueo de segmento: índice único parcial sobre los trámites activos
+            models.UniqueConstraint(
+                fields=['solicitante', 'segmento'],
+                condition=models.Q(estado__in=ESTADOS_TRAMITE_ACTIVOS) & ~models.Q(segmento=''),
+                name='tramite_un_activo_por_segmento',
+            ),
+        ]
 
 class Tarea(models.Model):
     tramite = models.ForeignKey(Tramite, on_delete=models.CASCADE, related_name='tareas')
@@ -77,6 +131,9 @@ class Documento(models.Model):
     archivo = models.FileField(upload_to=documento_upload_to, storage=OverwriteStorage())
     version = models.PositiveIntegerField(default=1)
     fecha_subida = models.DateTimeField(auto_now_add=True)
+    # Origen de los PDFs generados desde una plantilla (vacío en documentos subidos)
+    huella_plantilla = models.CharField(max_length=64, blank=True, default='')
+    huella_datos = models.CharField(max_length=64, blank=True, default='')
     def __str__(self): return f"{self.nombre} (v{self.version})"
 
 class Alerta(models.Model):
@@ -115,11 +172,17 @@ class Notificacion(models.Model):
     def __str__(self): return f"Notificación para {self.destinatario.email}: {self.mensaje[:20]}..."
 
 class PlantillaDocumento(models.Model):
+    ESTADOS_PROCESAMIENTO = (('PENDIENTE', 'En cola de procesamiento'), ('PROCESANDO', 'Procesando plantilla'), ('LISTA', 'Plantilla lista'), ('ERROR', 'Error al procesar la plantilla'))
     nombre = models.CharField(max_length=255, help_text="Título descriptivo de la plantilla.")
     segmento = models.CharField(max_length=100, help_text="Categoría principal, ej: 'Visas', 'Residencias'.")
     tipo_especifico = models.CharField(max_length=150, help_text="Subcategoría, ej: 'Residencia por Inversión'.")
     archivo_base = models.FileField(upload_to='plantillas_maestras/', help_text="Archivo PDF de la plantilla.")
+    huella_archivo = models.CharField(max_length=64, blank=True, default='', db_index=True, help_text="SHA-256 del archivo base. Las subidas idénticas comparten archivo y extracción.")
     activo = models.BooleanField(default=True, help_text="Indica si la plantilla está disponible para su uso.")
+    indice_campos = models.JSONField(default=dict, blank=True, help_text="Índice de layout: campo -> página, widget, rectángulo y tipo. Se calcula al subir la plantilla.")
+    estado_procesamiento = models.CharField(max_length=20, choices=ESTADOS_PROCESAMIENTO, default='LISTA', help_text="Etapa del procesamiento en segundo plano de la plantilla subida")
+    estado_procesamiento_desde = models.DateTimeField(null=True, blank=True, help_text="Momento del último cambio de estado_procesamiento (detecta trabajos perdidos del worker)")
+    error_procesamiento = models.TextField(blank=True, default='', help_text="Motivo del último error de procesamiento")
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     administrador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, limit_choices_to={'rol': 'ADMINISTRADOR'}, help_text="Administrador que subió la plantilla.")
     @property
@@ -127,6 +190,37 @@ class PlantillaDocumento(models.Model):
         if self.archivo_base: return self.archivo_base.url
         return None
     def __str__(self): return f"{self.nombre} ({self.segmento} - {self.tipo_especifico})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Segmento leído de la BD: la señal solo propaga a los trámites un cambio real
+        instancia._segmento_original = instancia.__dict__.get('segmento')
+        return instancia
+
+    @property
+    def segmento_cambiado(self) -> bool:
+        return self.pk is not None and getattr(self, '_segmento_original', self.segmento) != self.segmento
+
+    def tramites_en_conflicto_de_segmento(self):
+        """
+        Trámites activos de esta plantilla cuyo solicitante ya tiene otro trámite activo en el
+        segmento nuevo: moverlos violaría el índice único de un trámite activo por segmento.
+        """
+        if not self.segmento:
+            return Tramite.objects.none()
+        activos = Tramite.objects.filter(estado__in=Tramite.ESTADOS_ACTIVOS)
+        return activos.filter(plantilla=self).filter(
+            solicitante__in=activos.filter(segmento=self.segmento).exclude(plantilla=self).values('solicitante')
+        )
+
+    def clean(self):
+        if self.segmento_cambiado and self.tramites_en_conflicto_de_segmento().exists():
+            raise ValidationError({'segmento': (
+                "Hay solicitantes con un trámite en curso de esta plantilla y otro en el segmento "
+                f"'{self.segmento}'; no se puede mover la plantilla hasta que uno de ellos termine."
+            )})
+
     class Meta:
         db_table = 'tramites_plantilladocumento'
         verbose_name = "Plantilla de Documento"
@@ -159,8 +253,45 @@ class UltimaAsignacion(models.Model):
         help_text="ID del último tramitador asignado",
         db_column='ultimo_empleado_id' # Mapeo a la columna existente
     )
+    # Contador del modo de asignación 'contador' en motores sin secuencias (en PostgreSQL se usa una secuencia)
+    contador = models.BigIntegerField(default=0)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Última Asignación"
         verbose_name_plural = "Últimas Asignaciones"
+
+
+class CargaTramitador(models.Model):
+    """
+    Trámites abiertos (Tramite.ESTADOS_ABIERTOS) de cada tramitador, mantenido por las señales de Tramite.
+    La estrategia de asignación 'menor_carga' lo consulta en lugar de contar sobre tramites_tramite.
+    """
+    tramitador = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='carga')
+    abiertos = models.IntegerField(default=0)
+    ultimo_turno = models.BigIntegerField(default=0, help_text="Turno de la última asignación recibida (desempate round-robin)")
+
+    class Meta:
+        verbose_name = "Carga de Tramitador"
+        verbose_name_plural = "Cargas de Tramitadores"
+        indexes = [models.Index(fields=['abiertos', 'ultimo_turno'], name='carga_abiertos_turno_idx')]
+
+    def __str__(self): return f"Tramitador #{self.tramitador_id}: {self.abiertos} abiertos"
+
+
+class EstadisticaTramitador(models.Model):
+    """
+    Número de trámites de cada tramitador por estado, mantenido por las señales de Tramite.
+    Las estadísticas de carga leen esta tabla (una fila por tramitador y estado) en lugar de
+    contar sobre tramites_tramite; el comando reconstruir_estadisticas_tramitadores la recalcula.
+    """
+    tramitador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='estadisticas_trabajo')
+    estado = models.CharField(max_length=20, choices=Tramite.ESTADOS)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Estadística de Tramitador"
+        verbose_name_plural = "Estadísticas de Tramitadores"
+        constraints = [models.UniqueConstraint(fields=['tramitador', 'estado'], name='estadistica_tramitador_estado_unica')]
+
+    def __str__(self): return f"Tramitador #{self.tramitador_id}: {self.total} {self.estado}"
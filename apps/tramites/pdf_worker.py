@@ -0,0 +1,82 @@
+"""
+Puntos de entrada de los procesos worker del motor de renderizado de PDFs.
+
+Con el método de arranque 'spawn' el worker importa este módulo para deserializar el
+inicializador y cada trabajo, antes de que Django esté configurado. Por eso vive fuera
+de apps.tramites.services (cuyo __init__ importa los modelos) y solo importa el código
+de la app dentro de las funciones, una vez que _inicializar_worker ejecutó django.setup().
+"""
+import os
+import tempfile
+
+
+def _inicializar_worker():
+    """
+    Inicializa Django en el proceso worker (necesario con el método de arranque 'spawn').
+    """
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def _rellenar(plantilla, form_data: dict, salida=None):
+    from apps.tramites.services.tramite_service import _rellenar_pdf_plantilla
+    return _rellenar_pdf_plantilla(plantilla, form_data, salida)
+
+
+def _renderizar_en_worker(plantilla, form_data: dict) -> bytes:
+    """
+    Punto de entrada dentro del proceso worker. Cada worker mantiene su propia
+    caché de plantillas parseadas, por lo que los trabajos siguientes sobre la
+    misma plantilla no vuelven a parsear el PDF.
+    """
+    return _rellenar(plantilla, form_data).getvalue()
+
+
+def _renderizar_lote_a_archivos_en_worker(plantilla, trabajos: list) -> list:
+    """
+    Renderiza varios rellenos de la misma plantilla en un solo trabajo: la plantilla
+    parseada, su índice y su renderizador de superposición se reutilizan en todo el lote.
+    Cada PDF se escribe en su ruta final (archivo temporal en el mismo directorio + rename
+    atómico), sin devolver los bytes al proceso principal.
+
+    Args:
+        trabajos: Lista de (form_data, ruta_destino)
+
+    Returns:
+        Lista con None por cada PDF escrito o el mensaje de error, en el mismo orden
+    """
+    from django.conf import settings
+
+    # Mismo modo que FileSystemStorage al guardar archivos (None = no cambiarlo)
+    permisos = settings.FILE_UPLOAD_PERMISSIONS
+    resultados = []
+    for form_data, ruta_destino in trabajos:
+        directorio = os.path.dirname(ruta_destino)
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            descriptor, ruta_temporal = tempfile.mkstemp(dir=directorio, prefix='.renderizado-', suffix='.pdf.tmp')
+            os.close(descriptor)
+            try:
+                _renderizar_en_worker_a_archivo(plantilla, form_data, ruta_temporal)
+                if permisos is not None:
+                    os.chmod(ruta_temporal, permisos)  # mkstemp crea el archivo con 0600
+                os.replace(ruta_temporal, ruta_destino)
+            finally:
+                if os.path.exists(ruta_temporal):
+                    os.remove(ruta_temporal)
+            resultados.append(None)
+        except Exception as e:
+            resultados.append(str(e))
+    return resultados
+
+
+def _renderizar_en_worker_a_archivo(plantilla, form_data: dict, ruta_destino: str) -> str:
+    """
+    Como _renderizar_en_worker, pero el PdfWriter escribe directamente en ruta_destino:
+    el PDF no se devuelve por el pipe entre procesos ni se copia en memoria.
+    """
+    with open(ruta_destino, 'wb') as salida:
+        _rellenar(plantilla, form_data, salida)
+    return ruta_destino
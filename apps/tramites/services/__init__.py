@@ -1,4 +1,4 @@
-from .tramite_service import iniciar_nuevo_tramite, actualizar_datos_tramite, generar_pdf_desde_tramite
+from .tramite_service import iniciar_nuevo_tramite, actualizar_datos_tramite, generar_pdf_desde_tramite, SegmentoOcupadoError
 from .tramite_data_service import TramiteDataService
 from .asignacion_service import AsignacionTramitadorService
 from .aprobacion_service import AprobacionTramiteService
@@ -8,6 +8,7 @@ __all__ = [
     'iniciar_nuevo_tramite',
     'actualizar_datos_tramite',
     'generar_pdf_desde_tramite',
+    'SegmentoOcupadoError',
     'TramiteDataService',
     'AsignacionTramitadorService',
     'AprobacionTramiteService',
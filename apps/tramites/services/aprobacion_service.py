@@ -1,10 +1,14 @@
 """
 Servicio para que los tramitadores aprueben o rechacen trámites asignados.
 """
+import logging
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.utils import timezone
 from django.db import transaction
 from apps.tramites.models import Tramite, HistorialCambios
+from .instrumentacion import medir_etapa
+
+logger = logging.getLogger(__name__)
 
 
 class AprobacionTramiteService:
@@ -62,7 +66,10 @@ class AprobacionTramiteService:
             ValidationError: Si el trámite no se puede aprobar
         """
         try:
-            tramite = Tramite.objects.select_related('tramitador_asignado', 'solicitante').get(id=tramite_id)
+            # Fila bloqueada: el estado validado es el que cambian las señales de los contadores
+            tramite = Tramite.objects.select_for_update(of=('self',)).select_related(
+                'tramitador_asignado', 'solicitante'
+            ).get(id=tramite_id)
         except Tramite.DoesNotExist:
             raise ValidationError(f"El trámite #{tramite_id} no existe.")
 
@@ -85,17 +92,16 @@ class AprobacionTramiteService:
         tramite.save(update_fields=['estado', 'fecha_aprobacion', 'motivo_rechazo'])
 
         # Registrar historial
-        HistorialCambios.objects.create(
-            tramite=tramite,
-            descripcion=f"Trámite aprobado por {tramitador.nombre}",
-            usuario=tramitador,
-            estado_anterior=estado_anterior,
-            estado_nuevo='APROBADO'
-        )
-
-        print(f"✅ Trámite #{tramite.id} APROBADO por tramitador {tramitador.email}")
-        print(f"   Solicitante: {tramite.solicitante.email}")
-        print(f"   Fecha aprobación: {tramite.fecha_aprobacion}")
+        with medir_etapa('historial'):
+            HistorialCambios.objects.create(
+                tramite=tramite,
+                descripcion=f"Trámite aprobado por {tramitador.nombre}",
+                usuario=tramitador,
+                estado_anterior=estado_anterior,
+                estado_nuevo='APROBADO'
+            )
+
+        logger.info("Trámite #%s APROBADO por tramitador %s", tramite.id, tramitador.email)
 
         return tramite
 
@@ -121,7 +127,10 @@ class AprobacionTramiteService:
             raise ValidationError("Debe proporcionar un motivo para rechazar el trámite.")
 
         try:
-            tramite = Tramite.objects.select_related('tramitador_asignado', 'solicitante').get(id=tramite_id)
+            # Fila bloqueada: el estado validado es el que cambian las señales de los contadores
+            tramite = Tramite.objects.select_for_update(of=('self',)).select_related(
+                'tramitador_asignado', 'solicitante'
+            ).get(id=tramite_id)
         except Tramite.DoesNotExist:
             raise ValidationError(f"El trámite #{tramite_id} no existe.")
 
@@ -145,18 +154,16 @@ class AprobacionTramiteService:
         tramite.save(update_fields=['estado', 'fecha_rechazo', 'motivo_rechazo', 'fecha_aprobacion'])
 
         # Registrar historial
-        HistorialCambios.objects.create(
-            tramite=tramite,
-            descripcion=f"Trámite rechazado por {tramitador.nombre}. Motivo: {motivo.strip()}",
-            usuario=tramitador,
-            estado_anterior=estado_anterior,
-            estado_nuevo='RECHAZADO'
-        )
-
-        print(f"❌ Trámite #{tramite.id} RECHAZADO por tramitador {tramitador.email}")
-        print(f"   Solicitante: {tramite.solicitante.email}")
-        print(f"   Motivo: {motivo}")
-        print(f"   Fecha rechazo: {tramite.fecha_rechazo}")
+        with medir_etapa('historial'):
+            HistorialCambios.objects.create(
+                tramite=tramite,
+                descripcion=f"Trámite rechazado por {tramitador.nombre}. Motivo: {motivo.strip()}",
+                usuario=tramitador,
+                estado_anterior=estado_anterior,
+                estado_nuevo='RECHAZADO'
+            )
+
+        logger.info("Trámite #%s RECHAZADO por tramitador %s. Motivo: %s", tramite.id, tramitador.email, motivo)
 
         return tramite
 
@@ -1,32 +1,217 @@
 """
 Servicio para asignar tramitadores a trámites de manera automática.
-Usa algoritmo round-robin para distribuir equitativamente la carga de trabajo.
+
+La elección del tramitador la hace una estrategia (settings.ASIGNACION_TRAMITADORES['MODO']):
+- 'contador': round-robin con un contador atómico (secuencia de PostgreSQL) que indexa con
+  módulo una lista cacheada de los tramitadores activos. Las creaciones concurrentes no se
+  esperan entre sí y el reparto queda equilibrado a ±1 mientras la lista no cambie.
+- 'menor_carga': el tramitador con menos trámites abiertos según CargaTramitador; los
+  empates se resuelven en round-robin (el que hace más tiempo que no recibe uno).
+- 'registro': el algoritmo original, que bloquea la fila única de UltimaAsignacion.
+MODO también acepta la ruta de importación de una subclase de EstrategiaAsignacion.
 """
-from django.db.models import Count, Q
-from django.db import transaction
+import heapq
+import logging
+from bisect import bisect_right
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db import connection, transaction
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from apps.tramites.models import Tramite, UltimaAsignacion
+from django.utils.module_loading import import_string
+from apps.tramites.models import CargaTramitador, HistorialCambios, Tramite, UltimaAsignacion
+from .estadisticas_tramitadores import asegurar_filas_carga, sumar_contadores
+from .instrumentacion import medir_etapa
+
+logger = logging.getLogger(__name__)
 
 # Obtener el modelo de usuario configurado
 Usuario = get_user_model()
 
+SECUENCIA_TURNOS = 'tramites_asignacion_turno_seq'
+CLAVE_ROSTER = 'asignacion:roster_tramitadores'
+# Trámites por transacción en la asignación en bloque
+TAMANO_LOTE_ASIGNACION = 500
 
-class AsignacionTramitadorService:
+
+def _config_asignacion() -> dict:
+    return getattr(settings, 'ASIGNACION_TRAMITADORES', {})
+
+
+def obtener_roster_tramitadores() -> tuple:
     """
-    Servicio para asignar tramitadores a trámites automáticamente.
+    IDs de los tramitadores activos en orden (cacheado; se invalida al guardar un tramitador).
     """
+    roster = cache.get(CLAVE_ROSTER)
+    if roster is None:
+        roster = tuple(
+            Usuario.objects.filter(rol='TRAMITADOR', is_active=True).order_by('id').values_list('id', flat=True)
+        )
+        cache.set(CLAVE_ROSTER, roster, _config_asignacion().get('ROSTER_TTL', 300))
+    return roster
 
-    @staticmethod
-    def obtener_tramitador_disponible():
+
+def invalidar_roster_tramitadores():
+    cache.delete(CLAVE_ROSTER)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(CLAVE_ROSTER))
+
+
+def reservar_turnos(cantidad: int) -> list:
+    """
+    Los siguientes `cantidad` valores del contador global de asignaciones, en orden.
+
+    En PostgreSQL son nextval() de una secuencia: no participa en transacciones ni bloquea.
+    En otros motores se incrementa con F() la fila de UltimaAsignacion (en SQLite la
+    escritura ya serializa toda la base de datos).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [SECUENCIA_TURNOS, cantidad])
+            return [fila[0] for fila in cursor.fetchall()]
+
+    with transaction.atomic():
+        if not UltimaAsignacion.objects.filter(id=1).update(contador=F('contador') + cantidad):
+            UltimaAsignacion.objects.get_or_create(id=1)
+            UltimaAsignacion.objects.filter(id=1).update(contador=F('contador') + cantidad)
+        ultimo = UltimaAsignacion.objects.values_list('contador', flat=True).get(id=1)
+    return list(range(ultimo - cantidad + 1, ultimo + 1))
+
+
+def siguiente_turno() -> int:
+    """
+    Siguiente valor del contador global de asignaciones (1, 2, 3, ...).
+    """
+    return reservar_turnos(1)[0]
+
+
+def _asegurar_filas_roster(roster: tuple):
+    # Filas de carga de los tramitadores nuevos: una vez por versión de la lista
+    clave_filas = f"{CLAVE_ROSTER}:carga:{hash(roster)}"
+    if cache.get(clave_filas) is None:
+        asegurar_filas_carga(roster)
+        # Marcar solo tras el commit: si la transacción se revierte las filas no llegan a existir
+        timeout = _config_asignacion().get('ROSTER_TTL', 300)
+        transaction.on_commit(lambda: cache.set(clave_filas, True, timeout))
+
+
+class EstrategiaAsignacion:
+    """
+    Elige el tramitador de la siguiente asignación.
+    Se ejecuta dentro de la transacción que guarda la asignación, por lo que los bloqueos
+    que tome duran hasta que el trámite queda asignado.
+    """
+    nombre = None
+
+    def seleccionar(self):
         """
-        Obtiene el siguiente tramitador disponible usando un algoritmo Round-Robin (circular).
-        Garantiza una distribución equitativa y consistente.
-        
-        El ciclo es: Tramitador1 -> Tramitador2 -> ... -> TramitadorN -> Tramitador1
+        Returns:
+            ID del tramitador seleccionado, o None si no hay tramitadores
+        """
+        raise NotImplementedError
+
+    def planificar(self, cantidad: int) -> list:
+        """
+        IDs de tramitador para `cantidad` asignaciones seguidas (asignación en bloque).
+        Por defecto llama a seleccionar() una vez por asignación; las estrategias incluidas
+        calculan el plan completo en memoria.
 
         Returns:
-            Usuario (tramitador) seleccionado, o None si no hay tramitadores
+            Lista con un ID por asignación (más corta, o vacía, si no hay tramitadores)
         """
+        plan = []
+        for _ in range(cantidad):
+            tramitador_id = self.seleccionar()
+            if tramitador_id is None:
+                break
+            plan.append(tramitador_id)
+        return plan
+
+
+class EstrategiaContador(EstrategiaAsignacion):
+    nombre = 'contador'
+
+    def seleccionar(self):
+        roster = obtener_roster_tramitadores()
+        if not roster:
+            return None
+        return roster[(siguiente_turno() - 1) % len(roster)]
+
+    def planificar(self, cantidad):
+        roster = obtener_roster_tramitadores()
+        if not roster:
+            return []
+        return [roster[(turno - 1) % len(roster)] for turno in reservar_turnos(cantidad)]
+
+
+class EstrategiaMenorCarga(EstrategiaAsignacion):
+    nombre = 'menor_carga'
+
+    def seleccionar(self):
+        roster = obtener_roster_tramitadores()
+        if not roster:
+            return None
+
+        _asegurar_filas_roster(roster)
+
+        # Sin esperas: una asignación concurrente que ya bloqueó al más libre hace que esta
+        # tome el siguiente (en motores sin SELECT ... FOR UPDATE es una lectura normal)
+        candidatos = CargaTramitador.objects.filter(tramitador_id__in=roster).order_by('abiertos', 'ultimo_turno', 'tramitador_id')
+        carga = candidatos.select_for_update(skip_locked=True).first() or candidatos.first()
+        if carga is None:
+            # La caché dice que las filas existen pero no están (ej: las creó otra petición
+            # cuya transacción se revirtió): crearlas y reintentar
+            asegurar_filas_carga(roster)
+            carga = candidatos.first()
+            if carga is None:
+                return None
+        CargaTramitador.objects.filter(pk=carga.pk).update(ultimo_turno=siguiente_turno())
+        return carga.tramitador_id
+
+    def planificar(self, cantidad):
+        roster = obtener_roster_tramitadores()
+        if not roster:
+            return []
+        _asegurar_filas_roster(roster)
+
+        # Montículo de (abiertos, último turno, id): cada asignación suma un trámite abierto
+        filas = CargaTramitador.objects.select_for_update().filter(tramitador_id__in=roster)
+        monticulo = list(filas.values_list('abiertos', 'ultimo_turno', 'tramitador_id'))
+        if len(monticulo) < len(roster):
+            # Filas marcadas en caché que no existen (transacción revertida): crearlas
+            asegurar_filas_carga(roster)
+            monticulo = list(filas.values_list('abiertos', 'ultimo_turno', 'tramitador_id'))
+        if not monticulo:
+            return []
+        heapq.heapify(monticulo)
+        plan = []
+        ultimos_turnos = {}
+        for turno in reservar_turnos(cantidad):
+            abiertos, _, tramitador_id = heapq.heappop(monticulo)
+            plan.append(tramitador_id)
+            ultimos_turnos[tramitador_id] = turno
+            heapq.heappush(monticulo, (abiertos + 1, turno, tramitador_id))
+
+        CargaTramitador.objects.bulk_update(
+            [CargaTramitador(tramitador_id=tramitador_id, ultimo_turno=turno) for tramitador_id, turno in ultimos_turnos.items()],
+            ['ultimo_turno'],
+        )
+        return plan
+
+
+class EstrategiaRegistro(EstrategiaAsignacion):
+    """
+    Round-Robin (circular) sobre el último tramitador asignado, guardado en UltimaAsignacion.
+
+    El ciclo es: Tramitador1 -> Tramitador2 -> ... -> TramitadorN -> Tramitador1
+    """
+    nombre = 'registro'
+
+    def seleccionar(self):
         try:
             with transaction.atomic():
                 # Obtener o crear el registro de última asignación y bloquearlo para evitar condiciones de carrera
@@ -42,7 +227,6 @@ class AsignacionTramitadorService:
                 ).order_by('id')
 
                 if not tramitadores.exists():
-                    print("⚠️ No hay tramitadores disponibles para asignar")
                     return None
 
                 tramitador_seleccionado = None
@@ -58,17 +242,89 @@ class AsignacionTramitadorService:
                     tramitador_seleccionado = tramitadores.first()
 
                 # Actualizar el registro de última asignación
-                if tramitador_seleccionado:
-                    registro_asignacion.ultimo_tramitador_id = tramitador_seleccionado.id
-                    registro_asignacion.save()
-                    print(f"✅ Tramitador asignado (Round-Robin): {tramitador_seleccionado.email} (ID: {tramitador_seleccionado.id})")
-                    return tramitador_seleccionado
-                
-                return None
+                registro_asignacion.ultimo_tramitador_id = tramitador_seleccionado.id
+                registro_asignacion.save()
+                return tramitador_seleccionado.id
         except Exception as e:
-            print(f"❌ Error en algoritmo de asignación: {e}")
+            logger.exception("Error en algoritmo de asignación: %s", e)
             # Fallback: intentar obtener el primero disponible sin bloqueo si falla la transacción
-            return Usuario.objects.filter(rol='TRAMITADOR', is_active=True).first()
+            return Usuario.objects.filter(rol='TRAMITADOR', is_active=True).values_list('id', flat=True).first()
+
+    def planificar(self, cantidad):
+        with transaction.atomic():
+            registro_asignacion, created = UltimaAsignacion.objects.select_for_update().get_or_create(id=1)
+            tramitadores = list(
+                Usuario.objects.filter(rol='TRAMITADOR', is_active=True).order_by('id').values_list('id', flat=True)
+            )
+            if not tramitadores:
+                return []
+
+            # El ciclo continúa tras el último asignado
+            inicio = bisect_right(tramitadores, registro_asignacion.ultimo_tramitador_id or 0)
+            plan = [tramitadores[(inicio + i) % len(tramitadores)] for i in range(cantidad)]
+            registro_asignacion.ultimo_tramitador_id = plan[-1]
+            registro_asignacion.save()
+            return plan
+
+
+ESTRATEGIAS = {
+    estrategia.nombre: estrategia
+    for estrategia in (EstrategiaContador, EstrategiaMenorCarga, EstrategiaRegistro)
+}
+
+_estrategia = None
+
+
+def obtener_estrategia() -> EstrategiaAsignacion:
+    """
+    Estrategia configurada en settings (se instancia una vez por proceso).
+    """
+    global _estrategia
+    if _estrategia is None:
+        modo = _config_asignacion().get('MODO', 'contador')
+        clase = ESTRATEGIAS[modo] if modo in ESTRATEGIAS else import_string(modo)
+        _estrategia = clase()
+    return _estrategia
+
+
+@receiver(setting_changed)
+def _reiniciar_estrategia(setting, **kwargs):
+    global _estrategia
+    if setting == 'ASIGNACION_TRAMITADORES':
+        _estrategia = None
+
+
+class AsignacionTramitadorService:
+    """
+    Servicio para asignar tramitadores a trámites automáticamente.
+    """
+
+    @staticmethod
+    def obtener_id_tramitador_disponible():
+        """
+        ID del siguiente tramitador según la estrategia configurada, sin cargar el usuario.
+
+        Returns:
+            ID del tramitador seleccionado, o None si no hay tramitadores
+        """
+        estrategia = obtener_estrategia()
+        tramitador_id = estrategia.seleccionar()
+        if tramitador_id is None:
+            logger.warning("No hay tramitadores disponibles para asignar")
+        else:
+            logger.debug("Tramitador seleccionado (%s): #%s", estrategia.nombre, tramitador_id)
+        return tramitador_id
+
+    @staticmethod
+    def obtener_tramitador_disponible():
+        """
+        Obtiene el siguiente tramitador disponible según la estrategia configurada.
+
+        Returns:
+            Usuario (tramitador) seleccionado, o None si no hay tramitadores
+        """
+        tramitador_id = AsignacionTramitadorService.obtener_id_tramitador_disponible()
+        return Usuario.objects.filter(id=tramitador_id).first() if tramitador_id else None
 
     @staticmethod
     def asignar_tramitador_a_tramite(tramite: Tramite) -> bool:
@@ -82,19 +338,78 @@ class AsignacionTramitadorService:
             True si se asignó exitosamente, False si no hay tramitadores disponibles
         """
         if tramite.tramitador_asignado:
-            print(f"⚠️ El trámite #{tramite.id} ya tiene tramitador asignado: {tramite.tramitador_asignado.email}")
+            logger.debug("El trámite #%s ya tiene tramitador asignado (#%s)", tramite.id, tramite.tramitador_asignado_id)
             return True
 
-        tramitador = AsignacionTramitadorService.obtener_tramitador_disponible()
+        # Una sola transacción: los bloqueos de la estrategia cubren hasta que la asignación
+        # (y la carga del tramitador, que actualizan las señales) queda guardada
+        with medir_etapa('asignar'), transaction.atomic():
+            tramitador_id = AsignacionTramitadorService.obtener_id_tramitador_disponible()
 
-        if tramitador:
-            tramite.tramitador_asignado = tramitador
-            tramite.save(update_fields=['tramitador_asignado'])
-            print(f"✅ Trámite #{tramite.id} asignado a tramitador {tramitador.email}")
-            return True
-        else:
-            print(f"❌ No se pudo asignar tramitador al trámite #{tramite.id}")
-            return False
+            if tramitador_id:
+                tramite.tramitador_asignado_id = tramitador_id
+                tramite.save(update_fields=['tramitador_asignado'])
+                logger.info("Trámite #%s asignado a tramitador #%s", tramite.id, tramitador_id)
+                return True
+            else:
+                logger.warning("No se pudo asignar tramitador al trámite #%s", tramite.id)
+                return False
+
+    @staticmethod
+    def asignar_tramites_sin_tramitador(tamano_lote: int = TAMANO_LOTE_ASIGNACION) -> int:
+        """
+        Asigna en bloque los trámites activos sin tramitador (ej: los creados mientras no
+        había ningún tramitador activo), del más antiguo al más reciente.
+
+        Por lote: un plan de la estrategia calculado en memoria, un bulk_update de los
+        trámites, un bulk_create del historial y una actualización de los contadores por
+        tramitador (bulk_update no envía señales).
+
+        Returns:
+            Número de trámites asignados
+        """
+        estrategia = obtener_estrategia()
+        asignados = 0
+        while True:
+            with transaction.atomic():
+                # skip_locked: no competir con asignaciones en curso de esos mismos trámites
+                lote = list(
+                    Tramite.objects.select_for_update(skip_locked=True)
+                    .filter(tramitador_asignado__isnull=True, estado__in=Tramite.ESTADOS_ACTIVOS)
+                    .only('id', 'estado', 'tramitador_asignado')
+                    .order_by('fecha_inicio', 'id')[:tamano_lote]
+                )
+                if not lote:
+                    break
+
+                plan = estrategia.planificar(len(lote))
+                if not plan:
+                    logger.warning("No hay tramitadores disponibles: %d trámites siguen sin asignar", len(lote))
+                    break
+
+                lote = lote[:len(plan)]
+                for tramite, tramitador_id in zip(lote, plan):
+                    tramite.tramitador_asignado_id = tramitador_id
+                Tramite.objects.bulk_update(lote, ['tramitador_asignado'])
+
+                nombres = dict(Usuario.objects.filter(id__in=set(plan)).values_list('id', 'nombre'))
+                HistorialCambios.objects.bulk_create([
+                    HistorialCambios(
+                        tramite=tramite,
+                        descripcion=f"Trámite asignado a {nombres.get(tramite.tramitador_asignado_id)} (asignación en bloque)",
+                        estado_anterior=tramite.estado,
+                        estado_nuevo=tramite.estado,
+                    )
+                    for tramite in lote
+                ])
+
+                sumar_contadores(Counter((tramite.tramitador_asignado_id, tramite.estado) for tramite in lote))
+
+            asignados += len(lote)
+            logger.info("Asignación en bloque: %d trámites asignados", asignados)
+            if len(lote) < tamano_lote:
+                break
+        return asignados
 
     @staticmethod
     def reasignar_tramitador_a_tramite(tramite: Tramite, nuevo_tramitador: Usuario) -> bool:
@@ -112,46 +427,41 @@ class AsignacionTramitadorService:
         if nuevo_tramitador.rol != 'TRAMITADOR':
             raise ValueError(f"El usuario {nuevo_tramitador.email} no es un tramitador")
 
-        tramitador_anterior = tramite.tramitador_asignado
-        tramite.tramitador_asignado = nuevo_tramitador
-        tramite.save(update_fields=['tramitador_asignado'])
+        with transaction.atomic():
+            # El tramitador anterior es el de la fila bloqueada, no el de una lectura previa
+            tramite.bloquear_para_cambio()
+            tramitador_anterior_id = tramite.tramitador_asignado_id
+            tramite.tramitador_asignado = nuevo_tramitador
+            # Las señales mueven el trámite en los contadores de ambos tramitadores
+            tramite.save(update_fields=['tramitador_asignado'])
 
-        print(f"✅ Trámite #{tramite.id} reasignado de {tramitador_anterior} a {nuevo_tramitador.email}")
+        logger.info("Trámite #%s reasignado del tramitador #%s a %s", tramite.id, tramitador_anterior_id, nuevo_tramitador.email)
         return True
 
     @staticmethod
     def obtener_estadisticas_tramitadores():
         """
         Obtiene estadísticas de carga de trabajo de todos los tramitadores.
+        Lee los contadores de EstadisticaTramitador (a lo sumo una fila por estado y
+        tramitador), sin recorrer la tabla de trámites.
 
         Returns:
             QuerySet con estadísticas de cada tramitador
         """
+        def total_en(estado=None):
+            filtro = Q(estadisticas_trabajo__estado=estado) if estado else None
+            return Coalesce(Sum('estadisticas_trabajo__total', filter=filtro), 0)
+
         tramitadores_stats = Usuario.objects.filter(
             rol='TRAMITADOR',
             is_active=True
         ).annotate(
-            total_tramites=Count('tramites_asignados'),
-            tramites_pendientes=Count(
-                'tramites_asignados',
-                filter=Q(tramites_asignados__estado='PENDIENTE')
-            ),
-            tramites_aprobados=Count(
-                'tramites_asignados',
-                filter=Q(tramites_asignados__estado='APROBADO')
-            ),
-            tramites_rechazados=Count(
-                'tramites_asignados',
-                filter=Q(tramites_asignados__estado='RECHAZADO')
-            ),
-            tramites_en_proceso=Count(
-                'tramites_asignados',
-                filter=Q(tramites_asignados__estado='EN_PROCESO')
-            ),
-            tramites_completados=Count(
-                'tramites_asignados',
-                filter=Q(tramites_asignados__estado='COMPLETADO')
-            )
+            total_tramites=total_en(),
+            tramites_pendientes=total_en('PENDIENTE'),
+            tramites_aprobados=total_en('APROBADO'),
+            tramites_rechazados=total_en('RECHAZADO'),
+            tramites_en_proceso=total_en('EN_PROCESO'),
+            tramites_completados=total_en('COMPLETADO'),
         ).order_by('-total_tramites')
 
         return tramitadores_stats
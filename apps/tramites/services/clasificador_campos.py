@@ -0,0 +1,152 @@
+"""
+Clasificador compilado de nombres de campos PDF.
+
+Sustituye las cadenas de comprobaciones `in` y de `str.replace` por una expresión
+regular precompilada por tipo de campo (alternancia de las palabras clave) y otra
+para las abreviaturas. Las tablas de palabras clave son por idioma: las de este
+módulo se combinan con las de settings.CLASIFICADOR_CAMPOS, por lo que se puede
+añadir un idioma o palabras nuevas sin tocar el código.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Orden de prioridad: el primer tipo cuya palabra clave aparece en el nombre gana
+ORDEN_TIPOS = ('email', 'date', 'number', 'checkbox', 'textarea')
+TIPO_POR_DEFECTO = 'text'
+
+# La clasificación se hace en dos pasadas:
+# 1. Palabras completas del nombre (separadas por '_', '-', espacios o mayúsculas), con las
+#    palabras de 'text' primero: 'lugar_nacimiento' es un texto aunque contenga 'nacimiento',
+#    y 'numero_pasaporte' es alfanumérico aunque contenga 'numero'.
+# 2. Si ninguna palabra coincide, subcadenas del nombre ('birthdate', 'telefonocasa').
+ORDEN_TIPOS_PALABRA = (TIPO_POR_DEFECTO,) + ORDEN_TIPOS
+
+PALABRAS_CLAVE_POR_IDIOMA = {
+    'es': {
+        'text': ['lugar', 'ciudad', 'pais', 'localidad', 'provincia', 'nacionalidad',
+                 'pasaporte', 'documento', 'cedula', 'dni', 'identificacion'],
+        'email': ['correo'],
+        'date': ['fecha', 'nacimiento'],
+        'number': ['numero', 'cantidad', 'telefono'],
+        'checkbox': ['acepto', 'acepta', 'terminos'],
+        'textarea': ['descripcion', 'comentario', 'direccion', 'proposito'],
+    },
+    'en': {
+        'text': ['place', 'city', 'country', 'nationality', 'passport'],
+        'email': ['email', 'mail'],
+        'date': ['date', 'birth'],
+        'number': ['number', 'phone'],
+        'checkbox': ['agree', 'check'],
+        'textarea': ['description', 'comment', 'address', 'purpose'],
+    },
+}
+
+# Abreviaturas (palabras completas tras title()) y su forma legible
+ABREVIATURAS_POR_IDIOMA = {
+    'es': {'Dni': 'DNI', 'Nro': 'Número', 'Tel': 'Teléfono', 'Dir': 'Dirección'},
+    'en': {'Id': 'ID'},
+}
+
+
+_PATRON_MAYUSCULA = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+_PATRON_PALABRA = re.compile(r'[a-z0-9]+')
+
+
+def _alternancia(palabras) -> str:
+    # Las más largas primero para que la alternancia no se detenga en un prefijo
+    return '|'.join(re.escape(palabra) for palabra in sorted(set(palabras), key=len, reverse=True))
+
+
+class ClasificadorCampos:
+    """
+    Detecta el tipo de campo y el nombre legible a partir del nombre técnico del PDF.
+
+    Args:
+        palabras_clave: {tipo: [palabras en minúsculas]}
+        abreviaturas: {abreviatura: reemplazo}
+    """
+
+    def __init__(self, palabras_clave: dict, abreviaturas: dict):
+        self._palabras = [
+            (tipo, frozenset(palabras_clave[tipo]))
+            for tipo in ORDEN_TIPOS_PALABRA if palabras_clave.get(tipo)
+        ]
+        self._patrones = [
+            (tipo, re.compile(_alternancia(palabras_clave[tipo])))
+            for tipo in ORDEN_TIPOS if palabras_clave.get(tipo)
+        ]
+        self._abreviaturas = dict(abreviaturas)
+        self._patron_abreviaturas = (
+            re.compile(r'\b(?:%s)\b' % _alternancia(self._abreviaturas)) if self._abreviaturas else None
+        )
+
+    def tipo(self, nombre: str) -> str:
+        palabras = set(_PATRON_PALABRA.findall(_PATRON_MAYUSCULA.sub('_', nombre).lower()))
+        for tipo, claves in self._palabras:
+            if not palabras.isdisjoint(claves):
+                return tipo
+
+        nombre_lower = nombre.lower()
+        for tipo, patron in self._patrones:
+            if patron.search(nombre_lower):
+                return tipo
+        return TIPO_POR_DEFECTO
+
+    def nombre_legible(self, nombre: str) -> str:
+        nombre = nombre.replace('_', ' ').replace('-', ' ').title()
+        if self._patron_abreviaturas is None:
+            return nombre
+        return self._patron_abreviaturas.sub(lambda m: self._abreviaturas[m.group(0)], nombre)
+
+    def clasificar_lote(self, nombres) -> dict:
+        """
+        Clasifica todos los nombres de una plantilla: {nombre: (nombre_legible, tipo)}.
+        """
+        return {nombre: (self.nombre_legible(nombre), self.tipo(nombre)) for nombre in nombres}
+
+
+def _combinar_tablas(predeterminadas: dict, configuradas: dict, idiomas) -> dict:
+    """
+    Une las tablas de los idiomas activos; las de settings amplían las del módulo.
+    """
+    combinada = {}
+    for idioma in idiomas:
+        for tabla in (predeterminadas.get(idioma, {}), configuradas.get(idioma, {})):
+            for clave, valor in tabla.items():
+                if isinstance(valor, (list, tuple)):
+                    combinada.setdefault(clave, []).extend(valor)
+                else:
+                    combinada[clave] = valor
+    return combinada
+
+
+_clasificador = None
+_clasificador_lock = threading.Lock()
+
+
+def obtener_clasificador() -> ClasificadorCampos:
+    """
+    Clasificador compilado a partir de la configuración (se construye una vez por proceso).
+    """
+    global _clasificador
+    if _clasificador is None:
+        with _clasificador_lock:
+            if _clasificador is None:
+                config = getattr(settings, 'CLASIFICADOR_CAMPOS', {})
+                idiomas = config.get('IDIOMAS') or list(PALABRAS_CLAVE_POR_IDIOMA)
+                _clasificador = ClasificadorCampos(
+                    _combinar_tablas(PALABRAS_CLAVE_POR_IDIOMA, config.get('PALABRAS_CLAVE', {}), idiomas),
+                    _combinar_tablas(ABREVIATURAS_POR_IDIOMA, config.get('ABREVIATURAS', {}), idiomas),
+                )
+    return _clasificador
+
+
+@receiver(setting_changed)
+def _reiniciar_clasificador(setting, **kwargs):
+    global _clasificador
+    if setting == 'CLASIFICADOR_CAMPOS':
+        _clasificador = None
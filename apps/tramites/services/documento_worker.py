@@ -0,0 +1,43 @@
+"""
+Worker local en segundo plano para la generación diferida de documentos de trámites.
+
+El trámite se confirma en la petición HTTP con estado_documento='PENDIENTE'; el PDF
+y la versión del Documento se generan aquí, fuera del ciclo de la petición.
+Los trabajos se encolan con transaction.on_commit para que el worker nunca lea
+un trámite que todavía no fue confirmado en la base de datos.
+"""
+from datetime import timedelta
+
+from .trabajos_segundo_plano import ColaTrabajos, reclamar_trabajos_abandonados, registrar_cola
+
+cola_documentos = registrar_cola(ColaTrabajos(
+    'documentos-tramite',
+    'apps.tramites.services.tramite_service.generar_documento_tramite',
+    'TRAMITE_DOCUMENTO_WORKERS', 2,
+))
+
+
+def encolar_generacion_documento(tramite_id: int):
+    """
+    Programa la generación del documento del trámite para después del commit actual.
+    """
+    cola_documentos.encolar(tramite_id)
+
+
+def recuperar_documentos_pendientes(antiguedad: timedelta) -> list:
+    """
+    Genera los documentos que llevan más de `antiguedad` en PENDIENTE o GENERANDO
+    (trabajos perdidos al reiniciarse el proceso que los tenía en cola).
+
+    Returns:
+        IDs de los trámites reprocesados
+    """
+    from apps.tramites.models import Tramite
+
+    reclamados = reclamar_trabajos_abandonados(
+        Tramite.objects.all(), 'estado_documento', ('PENDIENTE', 'GENERANDO'), 'PENDIENTE',
+        'estado_documento_desde', antiguedad,
+    )
+    for tramite_id in reclamados:
+        cola_documentos.ejecutar(tramite_id)
+    return reclamados
@@ -0,0 +1,308 @@
+"""
+Esquema compilado del formulario de una plantilla.
+
+Reúne en un solo objeto lo que la validación de datos y el renderizado del formulario
+calculaban por separado en cada petición: los campos en orden, agrupados por sección,
+el conjunto de campos requeridos y los validadores de cada campo.
+
+La validación es tipada (según tipo_campo) y funciona con un envío o con un lote de
+miles (importaciones masivas); los errores se devuelven por campo.
+
+El esquema se guarda en una caché por proceso y en la caché de Django, bajo una versión
+por plantilla. Las señales de CampoPlantilla y PlantillaDocumento (apps/tramites/signals.py)
+incrementan la versión, por lo que cada proceso detecta el cambio sin consultar la BD.
+"""
+import re
+import threading
+import time
+from datetime import date, datetime
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+PREFIJO_CACHE = 'esquema_formulario'
+TIMEOUT_CACHE = 60 * 60 * 24
+
+
+VALORES_CASILLA_MARCADA = {'on', 'true', '1', 'si', 'sí', 'yes', 'x'}
+VALORES_CASILLA_DESMARCADA = {'off', 'false', '0', 'no'}
+
+# Fechas aceptadas además de ISO (AAAA-MM-DD, lo que envía <input type="date">)
+FORMATOS_FECHA = ('%d/%m/%Y', '%d-%m-%Y')
+
+# Campos 'number': cantidades y teléfonos. Grupos de dígitos (o de dígitos entre paréntesis)
+# con signo opcional, separados por espacios, puntos, comas, guiones o barras
+# (ej: '3', '-1,5', '+593 99 123 4567', '(02) 234-5678'). Los números de documento con
+# letras (pasaporte 'P123456') se clasifican como texto (ver clasificador_campos).
+_PATRON_NUMERO = re.compile(r'[+-]?(?:\(\d+\)|\d+)(?:[\s.,\-/]?(?:\(\d+\)|\d+))*', re.ASCII)
+
+
+def _limpiar_texto(valor: str) -> str:
+    return valor.strip()
+
+
+def _validar_email(valor: str) -> str:
+    try:
+        validate_email(valor)
+    except ValidationError:
+        raise ValidationError("El campo '%(campo)s' debe ser un correo electrónico válido.")
+    return valor
+
+
+def _validar_fecha(valor: str) -> str:
+    try:
+        date.fromisoformat(valor)
+        return valor
+    except ValueError:
+        pass
+    for formato in FORMATOS_FECHA:
+        try:
+            datetime.strptime(valor, formato)
+            return valor
+        except ValueError:
+            continue
+    raise ValidationError("El campo '%(campo)s' debe ser una fecha válida (AAAA-MM-DD o DD/MM/AAAA).")
+
+
+def _validar_numero(valor: str) -> str:
+    if not _PATRON_NUMERO.fullmatch(valor):
+        raise ValidationError("El campo '%(campo)s' debe contener un número válido.")
+    return valor
+
+
+def _validar_casilla(valor: str) -> str:
+    normalizado = valor.lower()
+    if normalizado not in VALORES_CASILLA_MARCADA and normalizado not in VALORES_CASILLA_DESMARCADA:
+        raise ValidationError("El campo '%(campo)s' debe estar marcado o desmarcado.")
+    return valor
+
+
+# Validadores aplicados a cada valor según el tipo del campo (en orden).
+# Cada validador recibe el valor (str) y devuelve el valor limpio o lanza ValidationError;
+# '%(campo)s' en el mensaje se reemplaza por el nombre legible del campo.
+VALIDADORES_POR_TIPO = {
+    'text': (_limpiar_texto,),
+    'textarea': (_limpiar_texto,),
+    'email': (_limpiar_texto, _validar_email),
+    'date': (_limpiar_texto, _validar_fecha),
+    'number': (_limpiar_texto, _validar_numero),
+    'checkbox': (_limpiar_texto, _validar_casilla),
+}
+
+
+class CampoEsquema:
+    """
+    Copia inmutable de un CampoPlantilla, sin acceso a la BD (se puede serializar en la caché).
+    """
+    __slots__ = ('nombre_campo', 'nombre_tecnico', 'tipo_campo', 'es_requerido', 'seccion', 'orden', 'validadores')
+
+    def __init__(self, nombre_campo, nombre_tecnico, tipo_campo, es_requerido, seccion, orden):
+        self.nombre_campo = nombre_campo
+        self.nombre_tecnico = nombre_tecnico
+        self.tipo_campo = tipo_campo
+        self.es_requerido = es_requerido
+        self.seccion = seccion
+        self.orden = orden
+        self.validadores = VALIDADORES_POR_TIPO.get(tipo_campo, (_limpiar_texto,))
+
+    def __getstate__(self):
+        # Los validadores se resuelven al cargar: la caché guarda solo los datos del campo
+        return tuple(getattr(self, atributo) for atributo in self.__slots__[:-1])
+
+    def __setstate__(self, estado):
+        self.__init__(*estado)
+
+
+class EsquemaFormulario:
+    """
+    Campos de una plantilla listos para validar y renderizar.
+
+    Atributos:
+        plantilla_id, version
+        campos: Lista de CampoEsquema en orden (sección, orden)
+        secciones: Lista ordenada de (sección, [CampoEsquema])
+        requeridos: frozenset con los nombre_tecnico requeridos
+    """
+
+    def __init__(self, plantilla_id: int, version: int, campos: list):
+        self.plantilla_id = plantilla_id
+        self.version = version
+        self.campos = campos
+        self.secciones = []
+        for campo in campos:
+            if not self.secciones or self.secciones[-1][0] != campo.seccion:
+                self.secciones.append((campo.seccion, []))
+            self.secciones[-1][1].append(campo)
+        self.requeridos = frozenset(campo.nombre_tecnico for campo in campos if campo.es_requerido)
+
+    @property
+    def campos_por_seccion(self) -> dict:
+        """
+        {sección: [campos]} en orden, como lo espera la plantilla HTML del formulario.
+        """
+        return dict(self.secciones)
+
+    def _validar_fila(self, form_data: dict):
+        """
+        Valida un envío sin lanzar excepciones: (datos_limpios, {nombre_tecnico: [mensajes]}).
+        """
+        datos_limpios = {}
+        errores = {}
+
+        for campo in self.campos:
+            valor = form_data.get(campo.nombre_tecnico)
+
+            # Validar campos requeridos (un valor con solo espacios cuenta como vacío)
+            if valor is not None:
+                valor = str(valor)
+            if not valor or valor.isspace():
+                if campo.es_requerido:
+                    errores[campo.nombre_tecnico] = [f"El campo '{campo.nombre_campo}' es requerido."]
+                continue
+
+            try:
+                for validador in campo.validadores:
+                    valor = validador(valor)
+            except ValidationError as e:
+                errores[campo.nombre_tecnico] = [mensaje % {'campo': campo.nombre_campo} for mensaje in e.messages]
+                continue
+            datos_limpios[campo.nombre_tecnico] = valor
+
+        return datos_limpios, errores
+
+    def validar(self, form_data: dict) -> dict:
+        """
+        Valida los datos contra el esquema y devuelve solo los campos definidos, ya limpios.
+
+        Raises:
+            ValidationError: Con los mensajes por campo (e.message_dict) en el orden del formulario
+        """
+        datos_limpios, errores = self._validar_fila(form_data)
+        if errores:
+            raise ValidationError(errores)
+        return datos_limpios
+
+    def validar_lote(self, filas) -> 'ResultadoLote':
+        """
+        Valida muchos envíos en una sola llamada (ej: importaciones masivas).
+        No lanza ValidationError: las filas inválidas quedan en ResultadoLote.errores.
+        """
+        resultado = ResultadoLote()
+        validar_fila = self._validar_fila
+        for indice, form_data in enumerate(filas):
+            datos_limpios, errores = validar_fila(form_data)
+            if errores:
+                resultado.errores[indice] = errores
+            else:
+                resultado.validos.append((indice, datos_limpios))
+        return resultado
+
+
+class ResultadoLote:
+    """
+    Resultado de EsquemaFormulario.validar_lote.
+
+    Atributos:
+        validos: Lista de (índice de la fila, datos limpios)
+        errores: {índice de la fila: {nombre_tecnico: [mensajes]}}
+    """
+    __slots__ = ('validos', 'errores')
+
+    def __init__(self):
+        self.validos = []
+        self.errores = {}
+
+    @property
+    def total(self) -> int:
+        return len(self.validos) + len(self.errores)
+
+
+_esquemas = {}
+_esquemas_lock = threading.Lock()
+
+
+def _clave_version(plantilla_id: int) -> str:
+    return f"{PREFIJO_CACHE}:{plantilla_id}:version"
+
+
+def _clave_esquema(plantilla_id: int, version: int) -> str:
+    return f"{PREFIJO_CACHE}:{plantilla_id}:v{version}"
+
+
+def _version_inicial() -> int:
+    # Distinta en cada arranque de la caché: si se vacía, ninguna copia local vuelve a ser válida
+    return time.time_ns()
+
+
+def _version_actual(plantilla_id: int) -> int:
+    clave = _clave_version(plantilla_id)
+    version = cache.get(clave)
+    if version is None:
+        version = _version_inicial()
+        cache.add(clave, version, None)
+        version = cache.get(clave, version)
+    return version
+
+
+def compilar_esquema(plantilla_id: int, version: int = 0) -> EsquemaFormulario:
+    """
+    Construye el esquema desde la BD (una sola consulta de campos).
+    """
+    from apps.tramites.models import CampoPlantilla
+
+    campos = [
+        CampoEsquema(*fila) for fila in
+        CampoPlantilla.objects.filter(plantilla_id=plantilla_id)
+        .order_by('seccion', 'orden', 'id')
+        .values_list('nombre_campo', 'nombre_tecnico', 'tipo_campo', 'es_requerido', 'seccion', 'orden')
+    ]
+    return EsquemaFormulario(plantilla_id, version, campos)
+
+
+def obtener_esquema_formulario(plantilla) -> EsquemaFormulario:
+    """
+    Esquema compilado de la plantilla (PlantillaDocumento o su id).
+    Busca primero en la caché del proceso, luego en la caché de Django y solo si
+    ambas fallan consulta los campos en la BD.
+    """
+    plantilla_id = getattr(plantilla, 'id', plantilla)
+    version = _version_actual(plantilla_id)
+
+    esquema = _esquemas.get(plantilla_id)
+    if esquema is not None and esquema.version == version:
+        return esquema
+
+    esquema = cache.get(_clave_esquema(plantilla_id, version))
+    if esquema is None:
+        esquema = compilar_esquema(plantilla_id, version)
+        cache.set(_clave_esquema(plantilla_id, version), esquema, TIMEOUT_CACHE)
+
+    with _esquemas_lock:
+        _esquemas[plantilla_id] = esquema
+    return esquema
+
+
+def invalidar_esquema_formulario(plantilla_id: int):
+    """
+    Pasa la plantilla a una nueva versión del esquema: todos los procesos que compartan
+    la caché de Django recompilan en su siguiente acceso.
+
+    Dentro de una transacción se invalida de nuevo tras el commit, para descartar un
+    esquema compilado por otro proceso antes de que los cambios fueran visibles.
+    """
+    _incrementar_version(plantilla_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _incrementar_version(plantilla_id))
+
+
+def _incrementar_version(plantilla_id: int):
+    clave = _clave_version(plantilla_id)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # Sin versión registrada: la siguiente lectura parte de una versión nueva
+        cache.set(clave, _version_inicial(), None)
+    with _esquemas_lock:
+        _esquemas.pop(plantilla_id, None)
@@ -0,0 +1,113 @@
+"""
+Contadores materializados del trabajo de cada tramitador.
+
+EstadisticaTramitador guarda cuántos trámites tiene cada tramitador en cada estado y
+CargaTramitador.abiertos cuántos tiene abiertos (lo usa la estrategia 'menor_carga').
+Las señales de Tramite los actualizan con F() dentro de la transacción que cambia el
+trámite; las operaciones en bloque (bulk_update no envía señales) llaman a
+sumar_contadores. reconstruir_estadisticas los recalcula desde cero.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F
+
+from apps.tramites.models import CargaTramitador, EstadisticaTramitador, Tramite
+
+TAMANO_LOTE = 1000
+
+
+def asegurar_filas_carga(tramitador_ids):
+    CargaTramitador.objects.bulk_create(
+        [CargaTramitador(tramitador_id=tramitador_id) for tramitador_id in tramitador_ids],
+        ignore_conflicts=True,
+    )
+
+
+def sumar_contadores(conteos: Counter):
+    """
+    Aplica diferencias a los contadores: {(tramitador_id, estado): diferencia}.
+    """
+    abiertos = Counter()
+    for (tramitador_id, estado), diferencia in conteos.items():
+        if not diferencia:
+            continue
+        filas = EstadisticaTramitador.objects.filter(tramitador_id=tramitador_id, estado=estado)
+        if not filas.update(total=F('total') + diferencia) and diferencia > 0:
+            EstadisticaTramitador.objects.bulk_create(
+                [EstadisticaTramitador(tramitador_id=tramitador_id, estado=estado)], ignore_conflicts=True
+            )
+            filas.update(total=F('total') + diferencia)
+        if estado in Tramite.ESTADOS_ABIERTOS:
+            abiertos[tramitador_id] += diferencia
+
+    for tramitador_id, diferencia in abiertos.items():
+        if not diferencia:
+            continue
+        filas = CargaTramitador.objects.filter(tramitador_id=tramitador_id)
+        if not filas.update(abiertos=F('abiertos') + diferencia) and diferencia > 0:
+            asegurar_filas_carga([tramitador_id])
+            filas.update(abiertos=F('abiertos') + diferencia)
+
+
+def registrar_cambio_tramite(anterior: tuple, actual: tuple):
+    """
+    Actualiza los contadores tras un cambio de un trámite.
+
+    Args:
+        anterior, actual: (estado, tramitador_asignado_id) antes y después del cambio;
+            (None, None) para un trámite nuevo o borrado
+    """
+    conteos = Counter()
+    if anterior[1]:
+        conteos[(anterior[1], anterior[0])] -= 1
+    if actual[1]:
+        conteos[(actual[1], actual[0])] += 1
+    sumar_contadores(conteos)
+
+
+def reconstruir_estadisticas() -> dict:
+    """
+    Recalcula EstadisticaTramitador y CargaTramitador.abiertos desde tramites_tramite
+    (una consulta agregada).
+
+    En PostgreSQL bloquea ambas tablas contra escritura mientras dura: los cambios de
+    trámites concurrentes esperan a que termine y aplican su diferencia sobre el resultado.
+
+    Returns:
+        {'tramitadores': tramitadores con trámites, 'filas': filas de EstadisticaTramitador}
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {EstadisticaTramitador._meta.db_table}, {CargaTramitador._meta.db_table} "
+                    "IN SHARE ROW EXCLUSIVE MODE"
+                )
+
+        conteos = list(
+            Tramite.objects.filter(tramitador_asignado__isnull=False)
+            .values_list('tramitador_asignado', 'estado')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+
+        EstadisticaTramitador.objects.all().delete()
+        EstadisticaTramitador.objects.bulk_create(
+            [EstadisticaTramitador(tramitador_id=tramitador_id, estado=estado, total=total) for tramitador_id, estado, total in conteos],
+            batch_size=TAMANO_LOTE,
+        )
+
+        abiertos = Counter()
+        for tramitador_id, estado, total in conteos:
+            if estado in Tramite.ESTADOS_ABIERTOS:
+                abiertos[tramitador_id] += total
+        CargaTramitador.objects.exclude(tramitador_id__in=abiertos).exclude(abiertos=0).update(abiertos=0)
+        asegurar_filas_carga(abiertos)
+        CargaTramitador.objects.bulk_update(
+            [CargaTramitador(tramitador_id=tramitador_id, abiertos=total) for tramitador_id, total in abiertos.items()],
+            ['abiertos'],
+            batch_size=TAMANO_LOTE,
+        )
+
+    return {'tramitadores': len({tramitador_id for tramitador_id, _, _ in conteos}), 'filas': len(conteos)}
@@ -0,0 +1,69 @@
+"""
+Fragmento HTML cacheado del formulario de una plantilla.
+
+El HTML de tramites/formulario_dinamico.html solo depende de la plantilla (versión de
+esquema, nombre y archivo base) y del token CSRF del usuario. Se renderiza una vez por
+versión con un marcador en lugar del token, se guarda en la caché de Django y en cada
+petición solo se sustituye el marcador por el token de la petición.
+
+El nombre y el archivo base forman parte de la clave y de la ETag en lugar de depender de
+una invalidación: así un cambio hecho con update() (sin señales) tampoco sirve HTML viejo.
+La ETag combina además el secreto CSRF (sin máscara), por lo que es estable entre
+peticiones del mismo usuario mientras la plantilla no cambie.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from .esquema_formulario import obtener_esquema_formulario
+
+PREFIJO_CACHE = 'fragmento_formulario'
+TIMEOUT_CACHE = 60 * 60 * 24
+MARCADOR_CSRF = '__csrf_token_fragmento__'
+
+
+def _huella_presentacion(plantilla) -> str:
+    """
+    Huella de los atributos de la plantilla que muestra el formulario fuera del esquema.
+    """
+    return hashlib.sha256(f"{plantilla.nombre}\0{plantilla.archivo_base.name or ''}".encode()).hexdigest()[:16]
+
+
+def _clave_fragmento(plantilla, version: int) -> str:
+    return f"{PREFIJO_CACHE}:{plantilla.id}:v{version}:{_huella_presentacion(plantilla)}"
+
+
+def _fragmento_sin_token(plantilla, esquema) -> str:
+    clave = _clave_fragmento(plantilla, esquema.version)
+    fragmento = cache.get(clave)
+    if fragmento is None:
+        # Sin request: el HTML no debe depender del usuario, solo del token (marcador)
+        fragmento = render_to_string('tramites/formulario_dinamico.html', {
+            'plantilla': plantilla,
+            'campos_por_seccion': esquema.campos_por_seccion,
+            'csrf_token': MARCADOR_CSRF,
+        })
+        cache.set(clave, fragmento, TIMEOUT_CACHE)
+    return fragmento
+
+
+def etag_formulario(request, plantilla) -> str:
+    """
+    ETag fuerte del formulario para esta petición (entre comillas, lista para la cabecera).
+    """
+    esquema = obtener_esquema_formulario(plantilla)
+    get_token(request)  # Asegura el secreto CSRF (y la cookie) de la petición
+    huella = hashlib.sha256(
+        f"{_clave_fragmento(plantilla, esquema.version)}:{request.META['CSRF_COOKIE']}".encode()
+    ).hexdigest()
+    return f'"{huella[:32]}"'
+
+
+def renderizar_formulario(request, plantilla) -> str:
+    """
+    HTML del formulario de la plantilla con el token CSRF de la petición.
+    """
+    esquema = obtener_esquema_formulario(plantilla)
+    return _fragmento_sin_token(plantilla, esquema).replace(MARCADOR_CSRF, get_token(request))
@@ -0,0 +1,199 @@
+"""
+Instrumentación de tiempos por etapa de la capa de servicios.
+
+Cada etapa (validar, asignar, renderizar, almacenar, historial, ...) se mide con
+`medir_etapa` y su duración se acumula en un histograma en memoria del proceso.
+Los histogramas se pueden volcar como diccionario o exportar en el formato de texto
+de Prometheus (ver MetricasServicioView). La exportación Prometheus incluye además los
+contadores de aciertos y fallos de las cachés de plantillas y de PDFs renderizados.
+
+Configuración en settings.INSTRUMENTACION:
+- ACTIVO: desactiva por completo la medición (coste de una consulta a settings).
+- MUESTREO: fracción de ejecuciones medidas (1.0 = todas, 0.1 = una de cada diez).
+Las duraciones también se emiten como registros DEBUG del logger
+'apps.tramites.instrumentacion', formateados solo si ese nivel está habilitado.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('apps.tramites.instrumentacion')
+
+# Límites superiores (ms) de los buckets de los histogramas
+LIMITES_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histograma:
+    """
+    Histograma acumulado de duraciones de una etapa.
+    """
+
+    def __init__(self, limites=LIMITES_MS):
+        self.limites = limites
+        self.buckets = [0] * (len(limites) + 1)  # El último bucket es +Inf
+        self.total = 0
+        self.errores = 0
+        self.suma_ms = 0.0
+        self.max_ms = 0.0
+
+    def registrar(self, duracion_ms: float, error: bool = False):
+        indice = len(self.limites)
+        for i, limite in enumerate(self.limites):
+            if duracion_ms <= limite:
+                indice = i
+                break
+        self.buckets[indice] += 1
+        self.total += 1
+        self.errores += int(error)
+        self.suma_ms += duracion_ms
+        self.max_ms = max(self.max_ms, duracion_ms)
+
+    def a_dict(self) -> dict:
+        return {
+            'total': self.total,
+            'errores': self.errores,
+            'suma_ms': round(self.suma_ms, 3),
+            'media_ms': round(self.suma_ms / self.total, 3) if self.total else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': {
+                **{str(limite): conteo for limite, conteo in zip(self.limites, self.buckets)},
+                '+Inf': self.buckets[-1],
+            },
+        }
+
+
+_histogramas = {}
+_lock = threading.Lock()
+
+
+def _registrar(etapa: str, duracion_ms: float, error: bool):
+    with _lock:
+        histograma = _histogramas.get(etapa)
+        if histograma is None:
+            histograma = _histogramas[etapa] = Histograma()
+        histograma.registrar(duracion_ms, error)
+
+
+class _Medicion:
+    """
+    Context manager que mide una ejecución de una etapa.
+    """
+    __slots__ = ('etapa', 'inicio')
+
+    def __init__(self, etapa: str):
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        duracion_ms = (time.perf_counter() - self.inicio) * 1000
+        _registrar(self.etapa, duracion_ms, tipo_excepcion is not None)
+        logger.debug("etapa=%s duracion_ms=%.3f error=%s", self.etapa, duracion_ms, tipo_excepcion is not None)
+        return False
+
+
+class _SinMedicion:
+    """
+    Context manager vacío para ejecuciones no muestreadas.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        return False
+
+
+_SIN_MEDICION = _SinMedicion()
+
+
+def medir_etapa(etapa: str):
+    """
+    Mide la duración del bloque y la acumula en el histograma de la etapa.
+
+    Uso:
+        with medir_etapa('renderizar'):
+            ...
+    """
+    config = getattr(settings, 'INSTRUMENTACION', {})
+    if not config.get('ACTIVO', True):
+        return _SIN_MEDICION
+    muestreo = config.get('MUESTREO', 1.0)
+    if muestreo < 1.0 and random.random() >= muestreo:
+        return _SIN_MEDICION
+    return _Medicion(etapa)
+
+
+def volcar_histogramas() -> dict:
+    """
+    Copia de los histogramas de este proceso: {etapa: {total, errores, suma_ms, media_ms, max_ms, buckets}}.
+    """
+    with _lock:
+        return {etapa: histograma.a_dict() for etapa, histograma in sorted(_histogramas.items())}
+
+
+def reiniciar_histogramas():
+    """
+    Descarta todos los histogramas acumulados en este proceso.
+    """
+    with _lock:
+        _histogramas.clear()
+
+
+def exportar_prometheus() -> str:
+    """
+    Histogramas en el formato de texto de exposición de Prometheus (buckets acumulados, en segundos).
+    """
+    nombre = 'tramites_etapa_duracion_segundos'
+    lineas = [
+        f"# HELP {nombre} Duración de las etapas de la capa de servicios de trámites.",
+        f"# TYPE {nombre} histogram",
+    ]
+    errores = []
+    with _lock:
+        for etapa, histograma in sorted(_histogramas.items()):
+            acumulado = 0
+            for limite, conteo in zip(histograma.limites, histograma.buckets):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="{limite / 1000:g}"}} {acumulado}')
+            lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="+Inf"}} {histograma.total}')
+            lineas.append(f'{nombre}_sum{{etapa="{etapa}"}} {histograma.suma_ms / 1000:.6f}')
+            lineas.append(f'{nombre}_count{{etapa="{etapa}"}} {histograma.total}')
+            errores.append(f'tramites_etapa_errores_total{{etapa="{etapa}"}} {histograma.errores}')
+
+    lineas.append("# HELP tramites_etapa_errores_total Ejecuciones de etapa que terminaron con excepción.")
+    lineas.append("# TYPE tramites_etapa_errores_total counter")
+    lineas.extend(errores)
+    lineas.extend(_exportar_caches())
+    return "\n".join(lineas) + "\n"
+
+
+def _exportar_caches() -> list:
+    """
+    Contadores de las cachés de PDF de este proceso. Cada worker del servidor lleva los suyos,
+    por eso se etiquetan con el PID: sumarlos por `cache` da el total del despliegue.
+    """
+    # Importación diferida: los servicios de PDF importan este módulo para medir sus etapas
+    from .pdf_render_cache import estadisticas_cache_renderizado
+    from .pdf_template_cache import estadisticas_cache
+
+    caches = {'plantillas': estadisticas_cache(), 'renderizados': estadisticas_cache_renderizado()}
+    proceso = os.getpid()
+    lineas = []
+    for campo, descripcion in (('aciertos', 'Consultas resueltas'), ('fallos', 'Consultas no resueltas')):
+        nombre = f'tramites_cache_{campo}_total'
+        lineas.append(f"# HELP {nombre} {descripcion} por las cachés de PDF de cada proceso.")
+        lineas.append(f"# TYPE {nombre} counter")
+        for cache, estadisticas in caches.items():
+            lineas.append(f'{nombre}{{cache="{cache}",proceso="{proceso}"}} {estadisticas[campo]}')
+    lineas.append("# HELP tramites_cache_plantillas_entradas Plantillas parseadas en la caché de cada proceso.")
+    lineas.append("# TYPE tramites_cache_plantillas_entradas gauge")
+    lineas.append(f'tramites_cache_plantillas_entradas{{proceso="{proceso}"}} {caches["plantillas"]["entradas"]}')
+    return lineas
@@ -0,0 +1,135 @@
+"""
+Menú lateral de plantillas de las páginas del solicitante.
+
+El catálogo (plantillas activas agrupadas por segmento, sin tipos repetidos) es igual
+para todos los usuarios: se construye una vez por versión del catálogo y se guarda en
+la caché de Django. Por usuario solo se calcula el conjunto de segmentos bloqueados
+(una consulta agregada sobre sus trámites activos), que también se cachea y se
+superpone al catálogo.
+
+Las señales de PlantillaDocumento incrementan la versión del catálogo (lo que también
+descarta los conjuntos de todos los usuarios) y las de Tramite borran el conjunto de
+su solicitante (apps/tramites/signals.py).
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIJO_CACHE = 'menu_plantillas'
+TIMEOUT_CACHE = 60 * 60 * 24
+CLAVE_VERSION = f"{PREFIJO_CACHE}:version"
+
+
+def _version_catalogo() -> int:
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Distinta en cada arranque de la caché (como en esquema_formulario)
+        version = time.time_ns()
+        cache.add(CLAVE_VERSION, version, None)
+        version = cache.get(CLAVE_VERSION, version)
+    return version
+
+
+def _clave_bloqueados(usuario_id: int, version: int) -> str:
+    return f"{PREFIJO_CACHE}:bloqueados:{usuario_id}:v{version}"
+
+
+def _construir_catalogo() -> list:
+    """
+    [(segmento, [{'id', 'tipo'}])] de las plantillas activas, un elemento por tipo_especifico.
+    """
+    from apps.tramites.models import PlantillaDocumento
+
+    catalogo = []
+    tipos_vistos = set()  # Para evitar duplicados de tipo_especifico
+    for plantilla_id, segmento, tipo in (
+        PlantillaDocumento.objects.filter(activo=True)
+        .order_by('segmento', 'tipo_especifico')
+        .values_list('id', 'segmento', 'tipo_especifico')
+    ):
+        if tipo in tipos_vistos:
+            continue
+        tipos_vistos.add(tipo)
+        if not catalogo or catalogo[-1][0] != segmento:
+            catalogo.append((segmento, []))
+        catalogo[-1][1].append({'id': plantilla_id, 'tipo': tipo})
+    return catalogo
+
+
+def obtener_catalogo(version: int = None) -> list:
+    if version is None:
+        version = _version_catalogo()
+    clave = f"{PREFIJO_CACHE}:catalogo:v{version}"
+    catalogo = cache.get(clave)
+    if catalogo is None:
+        catalogo = _construir_catalogo()
+        cache.set(clave, catalogo, TIMEOUT_CACHE)
+    return catalogo
+
+
+def obtener_segmentos_bloqueados(usuario, version: int = None) -> frozenset:
+    """
+    Segmentos en los que el usuario tiene un trámite activo (una consulta DISTINCT).
+    """
+    from apps.tramites.models import Tramite
+
+    if version is None:
+        version = _version_catalogo()
+    clave = _clave_bloqueados(usuario.id, version)
+    bloqueados = cache.get(clave)
+    if bloqueados is None:
+        bloqueados = frozenset(
+            Tramite.objects.filter(solicitante=usuario, estado__in=Tramite.ESTADOS_ACTIVOS)
+            .exclude(segmento='')
+            .values_list('segmento', flat=True)
+            .distinct()
+        )
+        cache.set(clave, bloqueados, TIMEOUT_CACHE)
+    return bloqueados
+
+
+def construir_menu_plantillas(usuario):
+    """
+    Menú lateral del solicitante.
+
+    Returns:
+        (menu_plantillas, segmentos_bloqueados): {segmento: [{'id', 'tipo', 'bloqueado'}]}
+        en el orden del catálogo, y el conjunto de segmentos bloqueados del usuario
+    """
+    version = _version_catalogo()
+    bloqueados = obtener_segmentos_bloqueados(usuario, version)
+    menu_plantillas = {
+        segmento: [{**entrada, 'bloqueado': segmento in bloqueados} for entrada in entradas]
+        for segmento, entradas in obtener_catalogo(version)
+    }
+    return menu_plantillas, bloqueados
+
+
+def _ahora_y_tras_commit(funcion, *args):
+    # Repetir tras el commit descarta lo que otro proceso cacheó antes de ver los cambios
+    funcion(*args)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: funcion(*args))
+
+
+def _incrementar_version_catalogo():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, time.time_ns(), None)
+
+
+def _borrar_segmentos_bloqueados(usuario_id: int):
+    cache.delete(_clave_bloqueados(usuario_id, _version_catalogo()))
+
+
+def invalidar_catalogo():
+    """
+    Nueva versión del catálogo: todos los procesos (con caché compartida) reconstruyen el menú.
+    """
+    _ahora_y_tras_commit(_incrementar_version_catalogo)
+
+
+def invalidar_segmentos_bloqueados(usuario_id: int):
+    _ahora_y_tras_commit(_borrar_segmentos_bloqueados, usuario_id)
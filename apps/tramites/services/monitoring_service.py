@@ -1,5 +1,6 @@
 from apps.tramites.models import Tramite, Alerta, HistorialCambios
 from apps.usuarios.models import UsuarioCRM as Usuario
+from django.db import transaction
 from django.utils import timezone
 
 def detectar_retrasos():
@@ -7,14 +8,19 @@ def detectar_retrasos():
     administradores = Usuario.objects.filter(rol='ADMINISTRADOR')
 
     for tramite in tramites_retrasados:
-        tramite.estado = 'RETRASADO'
-        tramite.save()
+        # El cambio de estado, su historial y los contadores del tramitador (señales) juntos
+        with transaction.atomic():
+            tramite.bloquear_para_cambio()
+            if tramite.estado != 'EN_PROCESO':
+                continue  # Otra petición lo cambió (aprobado, reasignado...) desde la consulta
+            tramite.estado = 'RETRASADO'
+            tramite.save(update_fields=['estado'])
 
-        # Crear historial de cambios
-        HistorialCambios.objects.create(
-            tramite=tramite,
-            descripcion=f"El trámite '{tramite.nombre}' ha sido marcado como retrasado."
-        )
+            # Crear historial de cambios
+            HistorialCambios.objects.create(
+                tramite=tramite,
+                descripcion=f"El trámite '{tramite.nombre}' ha sido marcado como retrasado."
+            )
 
         # Enviar alerta a todos los administradores
         for admin in administradores:
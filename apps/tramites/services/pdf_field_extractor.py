@@ -3,20 +3,41 @@ Servicio para extraer campos de formularios PDF automáticamente
 """
 import PyPDF2
 from django.core.files.storage import default_storage
+from django.db import transaction
 from apps.tramites.models import CampoPlantilla
+from .clasificador_campos import obtener_clasificador
+from .esquema_formulario import invalidar_esquema_formulario
+from .instrumentacion import medir_etapa
+import hashlib
+import io
+import logging
 import os
 import re
 
+logger = logging.getLogger(__name__)
+
+# Versión del formato del índice de layout persistido en PlantillaDocumento.indice_campos
+VERSION_INDICE_LAYOUT = 1
+
+# Tipos de campo AcroForm (/FT) que no son botones
+TIPOS_ACROFORM = {'/Tx': 'text', '/Ch': 'choice', '/Sig': 'signature'}
+
+# Tipos del índice que no reciben datos del solicitante
+TIPOS_SIN_DATOS = {'pushbutton', 'signature'}
+
+# Atributos que la extracción recalcula; sección y orden se personalizan en el admin y se conservan
+ATRIBUTOS_EXTRAIDOS = ('nombre_campo', 'tipo_campo', 'es_requerido')
+
 
 def extraer_campos_pdf(plantilla):
     """
-    Extrae los campos de un formulario PDF y crea objetos CampoPlantilla automáticamente.
+    Extrae los campos de un formulario PDF y sincroniza los CampoPlantilla de la plantilla.
 
     Args:
         plantilla: Instancia de PlantillaDocumento
 
     Returns:
-        int: Número de campos creados
+        int: Número de campos de la plantilla tras la extracción
     """
     if not plantilla.archivo_base:
         return 0
@@ -26,68 +47,184 @@ def extraer_campos_pdf(plantilla):
 
     try:
         # Abrir el PDF
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+        with medir_etapa('extraer_campos'), open(pdf_path, 'rb') as pdf_file:
+            contenido = pdf_file.read()
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(contenido))
+
+            # Calcular y persistir el índice de layout (todas las páginas y tipos de campo)
+            indice = guardar_indice_layout(plantilla, pdf_reader, contenido)
 
             # Verificar si el PDF tiene campos de formulario
             if '/AcroForm' not in pdf_reader.trailer['/Root']:
-                print(f"⚠️ El PDF '{plantilla.nombre}' no tiene campos de formulario.")
+                logger.warning("El PDF '%s' no tiene campos de formulario", plantilla.nombre)
                 return crear_campos_genericos(plantilla)
 
-            # Obtener los campos del formulario
-            fields = pdf_reader.get_form_text_fields()
+            # Obtener los campos del formulario desde el índice (en orden de aparición);
+            # si no hay widgets localizables, usar los campos de texto de PyPDF2
+            fields = {
+                nombre: datos['tipo'] for nombre, datos in indice['campos'].items()
+                if datos['tipo'] not in TIPOS_SIN_DATOS
+            } or {nombre: 'text' for nombre in pdf_reader.get_form_text_fields()}
 
             if not fields:
-                print(f"⚠️ No se encontraron campos en el PDF '{plantilla.nombre}'.")
+                logger.warning("No se encontraron campos en el PDF '%s'", plantilla.nombre)
                 return crear_campos_genericos(plantilla)
 
-            # Eliminar campos existentes para evitar duplicados
-            plantilla.campos.all().delete()
-
-            campos_creados = 0
-            orden = 1
+            # Nombre legible y tipo de todos los campos en una sola llamada al clasificador
+            clasificados = obtener_clasificador().clasificar_lote(fields)
 
-            for field_name, field_value in fields.items():
-                # Limpiar el nombre del campo para mostrarlo al usuario
-                nombre_campo = limpiar_nombre_campo(field_name)
+            campos = []
+            for orden, (field_name, tipo_pdf) in enumerate(fields.items(), start=1):
+                nombre_campo, tipo_detectado = clasificados[field_name]
                 # IMPORTANTE: Usar el nombre REAL del campo PDF como nombre_tecnico
                 # Esto permite que el rellenado funcione correctamente
                 nombre_tecnico = field_name  # Mantener el nombre original del PDF
-                tipo_campo = detectar_tipo_campo(field_name)
-
-                # Crear el campo
-                CampoPlantilla.objects.create(
-                    plantilla=plantilla,
-                    nombre_campo=nombre_campo,
-                    nombre_tecnico=nombre_tecnico,  # Nombre real del campo en el PDF
-                    tipo_campo=tipo_campo,
-                    es_requerido=True,
-                    orden=orden
-                )
-
-                campos_creados += 1
-                orden += 1
+                tipo_campo = 'checkbox' if tipo_pdf == 'checkbox' else tipo_detectado
 
-                print(f"  ✅ Campo extraído: {nombre_campo} -> {nombre_tecnico} ({tipo_campo})")
+                campos.append({
+                    'nombre_campo': nombre_campo,
+                    'nombre_tecnico': nombre_tecnico,  # Nombre real del campo en el PDF
+                    'tipo_campo': tipo_campo,
+                    'es_requerido': tipo_campo != 'checkbox',  # Una casilla sin marcar es un valor válido
+                    'orden': orden,
+                })
+                logger.debug("Campo extraído: %s -> %s (%s)", nombre_campo, nombre_tecnico, tipo_campo)
 
-            return campos_creados
+            sincronizar_campos_plantilla(plantilla, campos)
+            return len(campos)
 
     except FileNotFoundError:
-        print(f"❌ Error: No se encontró el archivo PDF en {pdf_path}")
+        logger.error("No se encontró el archivo PDF en %s", pdf_path)
         return crear_campos_genericos(plantilla)
     except Exception as e:
-        print(f"❌ Error al extraer campos del PDF: {e}")
+        logger.exception("Error al extraer campos del PDF '%s': %s", plantilla.nombre, e)
         return crear_campos_genericos(plantilla)
 
 
+def calcular_huella_pdf(contenido: bytes) -> str:
+    """
+    Huella SHA-256 del contenido de un PDF de plantilla.
+    """
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def _atributo_heredado(campo, clave):
+    """
+    Busca un atributo de campo AcroForm subiendo por la cadena de /Parent (atributos heredables).
+    """
+    actual = campo
+    while actual is not None:
+        if clave in actual:
+            return actual[clave]
+        padre = actual.get('/Parent')
+        actual = padre.get_object() if padre is not None else None
+    return None
+
+
+def _nombre_calificado(widget):
+    """
+    Nombre completo del campo (ej: 'datos.nombre'), igual al que usa PyPDF2 en get_fields().
+    """
+    partes = []
+    actual = widget
+    while actual is not None:
+        if '/T' in actual:
+            partes.append(str(actual['/T']))
+        padre = actual.get('/Parent')
+        actual = padre.get_object() if padre is not None else None
+    return '.'.join(reversed(partes))
+
+
+def _tipo_widget(widget):
+    """
+    Traduce /FT y /Ff del campo a un tipo del índice: text, choice, signature,
+    checkbox, radio o pushbutton.
+    """
+    tipo_pdf = _atributo_heredado(widget, '/FT')
+    if tipo_pdf == '/Btn':
+        flags = int(_atributo_heredado(widget, '/Ff') or 0)
+        if flags & (1 << 16):
+            return 'pushbutton'
+        if flags & (1 << 15):
+            return 'radio'
+        return 'checkbox'
+    return TIPOS_ACROFORM.get(tipo_pdf)
+
+
+def _estado_activo(widget):
+    """
+    Nombre de la apariencia "encendida" de una casilla o radio (ej: '/Yes', '/Opcion1').
+    """
+    apariencias = widget.get('/AP')
+    if apariencias is None:
+        return None
+    normal = apariencias.get_object().get('/N')
+    if normal is None:
+        return None
+    for estado in normal.get_object().keys():
+        if estado != '/Off':
+            return str(estado)
+    return None
+
+
+def construir_indice_layout(pdf_reader) -> dict:
+    """
+    Recorre una sola vez las anotaciones de todas las páginas y construye el índice
+    nombre de campo -> widgets. Cada widget guarda su página, su posición en /Annots
+    (estable al copiar páginas a un PdfWriter), el id de objeto, el rectángulo y,
+    para casillas/radios, el nombre del estado activo.
+
+    Returns:
+        dict: {'version', 'paginas', 'campos': {nombre: {'tipo', 'widgets': [...]}}}
+    """
+    campos = {}
+    for num_pagina, pagina in enumerate(pdf_reader.pages):
+        for num_anotacion, referencia in enumerate(pagina.get('/Annots') or []):
+            widget = referencia.get_object()
+            if widget.get('/Subtype') != '/Widget':
+                continue
+
+            nombre = _nombre_calificado(widget)
+            tipo = _tipo_widget(widget)
+            if not nombre or tipo is None:
+                continue
+
+            entrada = campos.setdefault(nombre, {'tipo': tipo, 'widgets': []})
+            entrada['widgets'].append({
+                'pagina': num_pagina,
+                'anotacion': num_anotacion,
+                'objeto': [referencia.idnum, referencia.generation] if hasattr(referencia, 'idnum') else None,
+                'rect': [float(valor) for valor in widget.get('/Rect', [])],
+                'estado_on': _estado_activo(widget) if tipo in ('checkbox', 'radio') else None,
+            })
+
+    return {
+        'version': VERSION_INDICE_LAYOUT,
+        'paginas': len(pdf_reader.pages),
+        'campos': campos,
+    }
+
+
+def guardar_indice_layout(plantilla, pdf_reader, contenido: bytes) -> dict:
+    """
+    Calcula el índice de layout de la plantilla y lo persiste en plantilla.indice_campos,
+    junto con la huella del archivo para detectar si quedó desactualizado.
+    """
+    indice = construir_indice_layout(pdf_reader)
+    indice['huella'] = calcular_huella_pdf(contenido)
+
+    plantilla.indice_campos = indice
+    plantilla.save(update_fields=['indice_campos'])
+
+    logger.debug("Índice de layout: %d campos en %d páginas", len(indice['campos']), indice['paginas'])
+    return indice
+
+
 def crear_campos_genericos(plantilla):
     """
     Crea campos genéricos basados en el tipo de trámite cuando no se pueden extraer del PDF.
     """
-    print(f"📝 Creando campos genéricos para '{plantilla.nombre}'...")
-
-    # Eliminar campos existentes
-    plantilla.campos.all().delete()
+    logger.info("Creando campos genéricos para '%s'", plantilla.nombre)
 
     # Definir campos genéricos comunes para cualquier trámite
     campos_genericos = [
@@ -188,43 +325,76 @@ def crear_campos_genericos(plantilla):
         'orden': 99
     })
 
-    # Crear los campos
-    for campo_data in campos_genericos:
-        CampoPlantilla.objects.create(
-            plantilla=plantilla,
-            **campo_data
-        )
-
+    sincronizar_campos_plantilla(plantilla, campos_genericos)
     return len(campos_genericos)
 
 
+def sincronizar_campos_plantilla(plantilla, campos: list) -> dict:
+    """
+    Sincroniza los CampoPlantilla de la plantilla con los campos extraídos, comparando por nombre_tecnico.
+
+    En lugar de borrar y recrear todos los campos, aplica solo la diferencia en una transacción:
+    un bulk_create de los nuevos, un bulk_update de los modificados y un único delete de los que
+    ya no existen. Los campos que se mantienen conservan su id, su sección y su orden.
+
+    Args:
+        plantilla: Instancia de PlantillaDocumento
+        campos: Lista de dicts con nombre_tecnico, nombre_campo, tipo_campo, es_requerido y orden
+
+    Returns:
+        dict: {'creados', 'actualizados', 'eliminados', 'sin_cambios'}
+    """
+    with transaction.atomic():
+        existentes = {campo.nombre_tecnico: campo for campo in plantilla.campos.select_for_update()}
+
+        nuevos = []
+        modificados = []
+        for datos in campos:
+            campo = existentes.get(datos['nombre_tecnico'])
+            if campo is None:
+                nuevos.append(CampoPlantilla(plantilla=plantilla, **datos))
+                continue
+            cambiados = [atributo for atributo in ATRIBUTOS_EXTRAIDOS if getattr(campo, atributo) != datos[atributo]]
+            if cambiados:
+                for atributo in cambiados:
+                    setattr(campo, atributo, datos[atributo])
+                modificados.append(campo)
+
+        if nuevos:
+            CampoPlantilla.objects.bulk_create(nuevos)
+        if modificados:
+            CampoPlantilla.objects.bulk_update(modificados, ATRIBUTOS_EXTRAIDOS)
+
+        vigentes = {datos['nombre_tecnico'] for datos in campos}
+        obsoletos = [campo.id for nombre, campo in existentes.items() if nombre not in vigentes]
+        if obsoletos:
+            CampoPlantilla.objects.filter(id__in=obsoletos).delete()
+
+        # bulk_create y bulk_update no emiten señales: invalidar el esquema compilado aquí
+        invalidar_esquema_formulario(plantilla.id)
+
+    resultado = {
+        'creados': len(nuevos),
+        'actualizados': len(modificados),
+        'eliminados': len(obsoletos),
+        'sin_cambios': len(campos) - len(nuevos) - len(modificados),
+    }
+    logger.info(
+        "Campos de '%s' sincronizados: %d creados, %d actualizados, %d eliminados, %d sin cambios",
+        plantilla.nombre, resultado['creados'], resultado['actualizados'], resultado['eliminados'], resultado['sin_cambios']
+    )
+    return resultado
+
+
 def limpiar_nombre_campo(nombre):
     """
     Convierte el nombre técnico del campo PDF en un nombre legible.
     Ejemplos:
         'nombre_completo' -> 'Nombre Completo'
-        'fecha_nacimiento' -> 'Fecha de Nacimiento'
+        'nro_dni' -> 'Número DNI'
         'PASSPORT_NUMBER' -> 'Passport Number'
     """
-    # Reemplazar guiones bajos y guiones por espacios
-    nombre = nombre.replace('_', ' ').replace('-', ' ')
-
-    # Capitalizar cada palabra
-    nombre = nombre.title()
-
-    # Reemplazar abreviaturas comunes
-    reemplazos = {
-        'Id': 'ID',
-        'Dni': 'DNI',
-        'Nro': 'Número',
-        'Tel': 'Teléfono',
-        'Dir': 'Dirección',
-    }
-
-    for old, new in reemplazos.items():
-        nombre = nombre.replace(old, new)
-
-    return nombre
+    return obtener_clasificador().nombre_legible(nombre)
 
 
 def crear_nombre_tecnico(nombre):
@@ -247,29 +417,6 @@ def crear_nombre_tecnico(nombre):
 
 def detectar_tipo_campo(nombre_campo):
     """
-    Detecta el tipo de campo basándose en el nombre.
+    Detecta el tipo de campo basándose en el nombre (ver clasificador_campos).
     """
-    nombre_lower = nombre_campo.lower()
-
-    # Detectar email
-    if 'email' in nombre_lower or 'correo' in nombre_lower or 'mail' in nombre_lower:
-        return 'email'
-
-    # Detectar fecha
-    if 'fecha' in nombre_lower or 'date' in nombre_lower or 'birth' in nombre_lower or 'nacimiento' in nombre_lower:
-        return 'date'
-
-    # Detectar número
-    if 'numero' in nombre_lower or 'number' in nombre_lower or 'cantidad' in nombre_lower or 'phone' in nombre_lower or 'telefono' in nombre_lower:
-        return 'number'
-
-    # Detectar checkbox
-    if 'acepto' in nombre_lower or 'acepta' in nombre_lower or 'agree' in nombre_lower or 'check' in nombre_lower or 'terminos' in nombre_lower:
-        return 'checkbox'
-
-    # Detectar textarea (campos largos)
-    if 'descripcion' in nombre_lower or 'description' in nombre_lower or 'comentario' in nombre_lower or 'comment' in nombre_lower or 'direccion' in nombre_lower or 'address' in nombre_lower or 'proposito' in nombre_lower or 'purpose' in nombre_lower:
-        return 'textarea'
-
-    # Por defecto, texto corto
-    return 'text'
+    return obtener_clasificador().tipo(nombre_campo)
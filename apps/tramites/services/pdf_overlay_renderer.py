@@ -0,0 +1,158 @@
+"""
+Renderizador de superposición para plantillas PDF sin campos de formulario (AcroForm).
+
+Sustituye el camino canvas de reportlab -> PdfReader del paquete -> merge_page por
+flujos de contenido PDF escritos directamente sobre las páginas clonadas:
+- la fuente (Helvetica, WinAnsi) es un único objeto por documento,
+- las posiciones de cada línea se calculan una vez y se reutilizan,
+- el contenido original de la página no se vuelve a parsear (se envuelve en q/Q),
+- el renderizador se cachea con la plantilla parseada y se reutiliza entre rellenos.
+"""
+import io
+
+import PyPDF2
+from PyPDF2 import PageObject
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject
+
+# Disposición del texto superpuesto (puntos PDF, origen abajo a la izquierda)
+X_TEXTO = 100
+Y_INICIAL = 700
+Y_MINIMO = 100
+INTERLINEADO = 20
+TAMANO_FUENTE = 12
+
+NOMBRE_FUENTE = '/FSuperpuesta'
+
+
+def _escapar_texto_pdf(texto: str) -> bytes:
+    """
+    Codifica un texto como string literal PDF en WinAnsi (cp1252), escapando delimitadores.
+    """
+    texto = texto.replace('\r', ' ').replace('\n', ' ')
+    codificado = texto.encode('cp1252', errors='replace')
+    return codificado.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _flujo(datos: bytes) -> DecodedStreamObject:
+    flujo = DecodedStreamObject()
+    flujo.set_data(datos)
+    return flujo
+
+
+class RenderizadorSuperpuesto:
+    """
+    Superpone los datos de un formulario sobre las páginas de una plantilla ya parseada.
+
+    No es seguro entre hilos por sí mismo: se usa bajo el lock de la PlantillaParseada.
+    """
+
+    def __init__(self, paginas):
+        self.paginas = paginas
+        self._posiciones = []  # Índice de línea -> (página, x, y)
+        self._etiquetas = {}   # Nombre técnico -> etiqueta legible ya codificada
+
+    def _posicion(self, indice_linea: int) -> tuple:
+        """
+        Posición precalculada de la línea N (se amplía la tabla solo la primera vez).
+        """
+        while len(self._posiciones) <= indice_linea:
+            if not self._posiciones:
+                self._posiciones.append((0, X_TEXTO, Y_INICIAL))
+                continue
+            pagina, x, y = self._posiciones[-1]
+            y -= INTERLINEADO
+            if y < Y_MINIMO:
+                pagina, y = pagina + 1, Y_INICIAL
+            self._posiciones.append((pagina, x, y))
+        return self._posiciones[indice_linea]
+
+    def _etiqueta(self, nombre: str) -> bytes:
+        etiqueta = self._etiquetas.get(nombre)
+        if etiqueta is None:
+            etiqueta = _escapar_texto_pdf(nombre.replace('_', ' ').title() + ': ')
+            self._etiquetas[nombre] = etiqueta
+        return etiqueta
+
+    def _contenido_por_pagina(self, form_data: dict) -> dict:
+        """
+        Construye los operadores de texto de cada página: {indice_pagina: bytes}.
+        """
+        lineas = {}
+        indice_linea = 0
+        for nombre, valor in form_data.items():
+            if nombre == 'csrfmiddlewaretoken':
+                continue
+            pagina, x, y = self._posicion(indice_linea)
+            indice_linea += 1
+            lineas.setdefault(pagina, []).append(
+                b"1 0 0 1 %d %d Tm (%s%s) Tj" % (x, y, self._etiqueta(nombre), _escapar_texto_pdf(str(valor)))
+            )
+
+        return {
+            pagina: b"Q q BT 0 g %s %d Tf " % (NOMBRE_FUENTE.encode('ascii'), TAMANO_FUENTE)
+                    + b" ".join(operadores) + b" ET Q"
+            for pagina, operadores in lineas.items()
+        }
+
+    @staticmethod
+    def _superponer(writer, pagina_salida, fuente, apertura, datos: bytes):
+        """
+        Añade el flujo de texto a una página ya agregada al writer.
+        """
+        recursos = pagina_salida.get('/Resources')
+        recursos = recursos.get_object() if recursos is not None else DictionaryObject()
+        fuentes = recursos.get('/Font')
+        fuentes = fuentes.get_object() if fuentes is not None else DictionaryObject()
+        fuentes[NameObject(NOMBRE_FUENTE)] = fuente
+        recursos[NameObject('/Font')] = fuentes
+        pagina_salida[NameObject('/Resources')] = recursos
+
+        # El contenido original queda entre q/Q para que su estado gráfico no afecte al texto
+        originales = pagina_salida.get('/Contents')
+        originales = originales.get_object() if originales is not None else ArrayObject()
+        if not isinstance(originales, ArrayObject):
+            originales = ArrayObject([pagina_salida.raw_get('/Contents')])
+        superpuesto = writer._add_object(_flujo(datos))
+        pagina_salida[NameObject('/Contents')] = ArrayObject([apertura, *originales, superpuesto])
+
+    def renderizar(self, form_data: dict, salida=None):
+        """
+        Genera el PDF de la plantilla con los datos superpuestos.
+        Las líneas que no caben en una página continúan en la siguiente página de la plantilla;
+        pasada la última, en páginas en blanco del mismo tamaño añadidas al final.
+
+        Args:
+            salida: Archivo binario donde escribir el PDF. Si es None se usa un BytesIO.
+
+        Returns:
+            El objeto de salida (posicionado al inicio si es un BytesIO)
+        """
+        contenido = self._contenido_por_pagina(form_data)
+
+        writer = PyPDF2.PdfWriter()
+        fuente = writer._add_object(DictionaryObject({
+            NameObject('/Type'): NameObject('/Font'),
+            NameObject('/Subtype'): NameObject('/Type1'),
+            NameObject('/BaseFont'): NameObject('/Helvetica'),
+            NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+        }))
+        apertura = writer._add_object(_flujo(b"q"))
+
+        for indice_pagina, pagina in enumerate(self.paginas):
+            # add_page clona la página: el lector cacheado no se modifica
+            pagina_salida = writer.add_page(pagina)
+            if indice_pagina in contenido:
+                self._superponer(writer, pagina_salida, fuente, apertura, contenido[indice_pagina])
+
+        for indice_pagina in range(len(self.paginas), max(contenido, default=-1) + 1):
+            # add_blank_page devuelve la página original, no la agregada: se agrega con add_page
+            ultima = self.paginas[-1].mediabox
+            pagina_salida = writer.add_page(PageObject.create_blank_page(width=ultima.width, height=ultima.height))
+            self._superponer(writer, pagina_salida, fuente, apertura, contenido[indice_pagina])
+
+        if salida is None:
+            salida = io.BytesIO()
+        writer.write(salida)
+        if isinstance(salida, io.BytesIO):
+            salida.seek(0)
+        return salida
@@ -0,0 +1,233 @@
+"""
+Caché en disco, direccionada por contenido, de PDFs ya renderizados.
+
+La clave es (versión del renderizador, huella del archivo de la plantilla, huella canónica
+de los datos): un mismo formulario rellenado con los mismos datos produce siempre el mismo
+PDF, por lo que se devuelven los bytes guardados sin volver a pasar por PyPDF2/reportlab.
+El tamaño total del directorio está acotado; se desalojan primero los archivos usados
+hace más tiempo (el mtime se actualiza en cada acierto).
+
+Los PDFs renderizados a archivo se cachean con un enlace duro al archivo publicado, no con
+una copia: el directorio de la caché debe estar en el mismo sistema de archivos que
+MEDIA_ROOT (si no, esos renderizados simplemente no se cachean).
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+
+# Incrementar al cambiar el resultado del relleno (tramite_service._rellenar_pdf_plantilla,
+# pdf_overlay_renderer): los PDFs cacheados con la versión anterior dejan de servirse
+VERSION_RENDERIZADO = 2
+
+_lock = threading.Lock()
+_bytes_estimados = None  # Tamaño del directorio conocido por este proceso (None = sin medir)
+_estadisticas = {'aciertos': 0, 'fallos': 0, 'desalojos': 0}
+
+
+def _configuracion() -> dict:
+    config = getattr(settings, 'PDF_RENDER_CACHE', {})
+    return {
+        'activo': config.get('ACTIVO', True),
+        'directorio': str(config.get('DIRECTORIO', os.path.join(settings.BASE_DIR, 'var', 'pdf_render_cache'))),
+        'max_bytes': config.get('MAX_BYTES', 256 * 1024 * 1024),
+    }
+
+
+def calcular_huella_datos(datos: dict) -> str:
+    """
+    Huella SHA-256 canónica de los datos de un formulario (independiente del orden de las claves).
+    """
+    canonico = json.dumps(datos or {}, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+def _ruta_entrada(directorio: str, huella_plantilla: str, huella_datos: str) -> str:
+    clave = hashlib.sha256(f"{VERSION_RENDERIZADO}:{huella_plantilla}:{huella_datos}".encode('ascii')).hexdigest()
+    return os.path.join(directorio, clave[:2], f"{clave}.pdf")
+
+
+def _medir_directorio(directorio: str) -> list:
+    """
+    Lista (mtime, tamaño, ruta) de todas las entradas del directorio de caché.
+    """
+    entradas = []
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            if not nombre.endswith('.pdf'):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            try:
+                stat = os.stat(ruta)
+            except FileNotFoundError:
+                continue  # Desalojada por otro proceso
+            entradas.append((stat.st_mtime, stat.st_size, ruta))
+    return entradas
+
+
+def _desalojar(directorio: str, max_bytes: int):
+    """
+    Elimina las entradas menos usadas recientemente hasta quedar bajo el límite.
+    Debe llamarse con _lock tomado.
+    """
+    global _bytes_estimados
+    entradas = sorted(_medir_directorio(directorio))
+    total = sum(tamano for _, tamano, _ in entradas)
+    for _, tamano, ruta in entradas:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(ruta)
+            _estadisticas['desalojos'] += 1
+        except FileNotFoundError:
+            pass
+        total -= tamano
+    _bytes_estimados = total
+
+
+def _entrada_vigente(huella_plantilla: str, form_data: dict):
+    """
+    Devuelve la ruta de la entrada cacheada (marcándola como usada) o None, contando aciertos y fallos.
+    """
+    config = _configuracion()
+    if not config['activo']:
+        return None
+
+    ruta = _ruta_entrada(config['directorio'], huella_plantilla, calcular_huella_datos(form_data))
+    try:
+        os.utime(ruta)  # Marcar como usado recientemente para el LRU
+    except FileNotFoundError:
+        with _lock:
+            _estadisticas['fallos'] += 1
+        return None
+
+    with _lock:
+        _estadisticas['aciertos'] += 1
+    return ruta
+
+
+def obtener_pdf_cacheado(huella_plantilla: str, form_data: dict):
+    """
+    Devuelve los bytes del PDF renderizado para esta plantilla y estos datos, o None.
+    """
+    ruta = _entrada_vigente(huella_plantilla, form_data)
+    if ruta is None:
+        return None
+    try:
+        with open(ruta, 'rb') as archivo:
+            return archivo.read()
+    except FileNotFoundError:
+        return None  # Desalojada por otro proceso entre utime y open
+
+
+def _enlazar(origen: str, destino: str) -> bool:
+    """
+    Hace de destino un enlace duro a origen, reemplazándolo de forma atómica.
+
+    Returns:
+        False si el sistema de archivos no lo permite (p. ej. directorios en dispositivos distintos)
+    """
+    temporal = f"{destino}.{os.getpid()}-{threading.get_ident()}.enlace"
+    try:
+        os.link(origen, temporal)
+    except OSError:
+        return False
+    os.replace(temporal, destino)
+    return True
+
+
+def copiar_pdf_cacheado(huella_plantilla: str, form_data: dict, ruta_destino: str) -> bool:
+    """
+    Publica el PDF cacheado en ruta_destino sin cargarlo en memoria: con un enlace duro
+    o, entre sistemas de archivos distintos, copiándolo por bloques.
+
+    Returns:
+        True si había entrada en caché y se publicó
+    """
+    ruta = _entrada_vigente(huella_plantilla, form_data)
+    if ruta is None:
+        return False
+    try:
+        if not _enlazar(ruta, ruta_destino):
+            shutil.copyfile(ruta, ruta_destino)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _guardar_entrada(huella_plantilla: str, form_data: dict, tamano: int, publicar):
+    """
+    Crea una entrada y aplica el límite de tamaño. `publicar(ruta)` crea el archivo de la
+    entrada de forma atómica y devuelve False si no pudo hacerlo.
+    """
+    global _bytes_estimados
+    config = _configuracion()
+    if not config['activo'] or tamano > config['max_bytes']:
+        return
+
+    ruta = _ruta_entrada(config['directorio'], huella_plantilla, calcular_huella_datos(form_data))
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    if not publicar(ruta):
+        return
+
+    with _lock:
+        if _bytes_estimados is None:
+            _desalojar(config['directorio'], config['max_bytes'])
+        else:
+            _bytes_estimados += tamano
+            # Otros procesos escriben en el mismo directorio: medir de nuevo antes de desalojar
+            if _bytes_estimados > config['max_bytes']:
+                _desalojar(config['directorio'], config['max_bytes'])
+
+
+def guardar_pdf_cacheado(huella_plantilla: str, form_data: dict, contenido: bytes):
+    """
+    Guarda en la caché el PDF renderizado en memoria (archivo temporal + rename).
+    """
+    def publicar(ruta):
+        descriptor, ruta_temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                archivo.write(contenido)
+            os.replace(ruta_temporal, ruta)
+        except OSError:
+            if os.path.exists(ruta_temporal):
+                os.remove(ruta_temporal)
+            raise
+        return True
+
+    _guardar_entrada(huella_plantilla, form_data, len(contenido), publicar)
+
+
+def guardar_archivo_cacheado(huella_plantilla: str, form_data: dict, ruta_origen: str):
+    """
+    Guarda en la caché el PDF ya renderizado en ruta_origen como un enlace duro: la entrada
+    comparte los bytes con el documento publicado en lugar de duplicarlos en disco.
+    """
+    _guardar_entrada(
+        huella_plantilla, form_data, os.path.getsize(ruta_origen),
+        lambda ruta: _enlazar(ruta_origen, ruta),
+    )
+
+
+def estadisticas_cache_renderizado() -> dict:
+    """
+    Retorna los contadores de aciertos/fallos/desalojos de este proceso.
+    """
+    with _lock:
+        return dict(_estadisticas, bytes_estimados=_bytes_estimados)
+
+
+def limpiar_cache_renderizado():
+    """
+    Reinicia los contadores de este proceso (no borra el directorio compartido).
+    """
+    global _bytes_estimados
+    with _lock:
+        _bytes_estimados = None
+        for clave in _estadisticas:
+            _estadisticas[clave] = 0
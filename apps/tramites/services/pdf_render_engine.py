@@ -0,0 +1,295 @@
+"""
+Motor de renderizado de PDFs en un pool de procesos.
+
+El relleno de plantillas (PyPDF2/reportlab) es trabajo de CPU en Python puro; ejecutarlo
+en el hilo de la petición bloquea un worker WSGI durante todo el renderizado.
+Este motor lo envía a un ProcessPoolExecutor (los puntos de entrada de los workers
+están en apps/tramites/pdf_worker.py) con:
+- cola de envío acotada (backpressure en lugar de acumular trabajos sin límite),
+- timeout por trabajo,
+- reciclado de los procesos worker cada N trabajos.
+"""
+import atexit
+import io
+import multiprocessing
+import os
+import tempfile
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from apps.tramites.pdf_worker import (
+    _inicializar_worker, _renderizar_en_worker, _renderizar_en_worker_a_archivo,
+    _renderizar_lote_a_archivos_en_worker,
+)
+from .pdf_render_cache import (
+    copiar_pdf_cacheado, guardar_archivo_cacheado, guardar_pdf_cacheado, obtener_pdf_cacheado,
+)
+from .pdf_template_cache import obtener_huella_plantilla
+
+logger = logging.getLogger(__name__)
+
+
+class RenderizadoPDFError(Exception):
+    """
+    Error al renderizar un PDF en el motor (cola llena o tiempo agotado).
+    """
+
+
+class MotorRenderizadoPDF:
+    """
+    Ejecuta los rellenos de PDF en un pool de procesos acotado.
+    """
+
+    def __init__(self, max_workers=None, max_cola=32, timeout=30, trabajos_por_worker=200, contexto='spawn'):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_cola = max_cola
+        self.timeout = timeout
+        # Reciclar el pool completo cada (workers * trabajos_por_worker) envíos
+        self.trabajos_por_pool = self.max_workers * trabajos_por_worker
+        self.contexto = contexto
+
+        self._lock = threading.Lock()
+        self._cupos = threading.BoundedSemaphore(self.max_workers + self.max_cola)
+        self._executor = None
+        self._trabajos_en_pool = 0
+        # Trabajos que se renderizaron en el proceso actual porque el pool estaba averiado
+        self.renderizados_locales = 0
+
+    def _nuevo_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(self.contexto),
+            initializer=_inicializar_worker,
+        )
+
+    def _obtener_executor(self, trabajos: int = 1):
+        """
+        Devuelve el executor vigente, reciclándolo si ya atendió su cupo de trabajos.
+        """
+        with self._lock:
+            if self._executor is not None and self._trabajos_en_pool >= self.trabajos_por_pool:
+                # Los trabajos en curso terminan en el pool viejo; sus procesos salen al acabar
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = self._nuevo_executor()
+                self._trabajos_en_pool = 0
+            self._trabajos_en_pool += trabajos
+            return self._executor
+
+    def _descartar_executor(self, executor, terminar=False):
+        """
+        Retira un executor averiado o con trabajos colgados para que el siguiente envío cree otro.
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        if terminar:
+            # ProcessPoolExecutor no permite cancelar un trabajo en ejecución: se terminan sus procesos
+            for proceso in list((getattr(executor, '_processes', None) or {}).values()):
+                proceso.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def renderizar(self, plantilla, form_data: dict) -> io.BytesIO:
+        """
+        Rellena la plantilla en un proceso worker y devuelve el PDF en memoria.
+
+        Raises:
+            RenderizadoPDFError: Si la cola está llena o el trabajo supera el timeout
+        """
+        return io.BytesIO(self._ejecutar(_renderizar_en_worker, plantilla, dict(form_data)))
+
+    def renderizar_a_archivo(self, plantilla, form_data: dict, ruta_destino: str) -> str:
+        """
+        Rellena la plantilla en un proceso worker escribiendo el PDF en ruta_destino.
+
+        Raises:
+            RenderizadoPDFError: Si la cola está llena o el trabajo supera el timeout
+        """
+        return self._ejecutar(_renderizar_en_worker_a_archivo, plantilla, dict(form_data), ruta_destino)
+
+    def renderizar_lote_a_archivos(self, plantilla, trabajos: list) -> list:
+        """
+        Rellena la plantilla con cada conjunto de datos escribiendo cada PDF en su ruta de
+        destino dentro del worker. El lote se reparte en un trabajo por worker del pool, que
+        se ejecutan en paralelo; el timeout de cada trabajo se escala con su tamaño.
+
+        Args:
+            trabajos: Lista de (form_data, ruta_destino)
+
+        Returns:
+            Lista con None por cada PDF escrito o el mensaje de error
+        """
+        lote = [(dict(form_data), ruta) for form_data, ruta in trabajos]
+        if not lote:
+            return []
+        tamano_sublote = -(-len(lote) // self.max_workers)
+        sublotes = [(lote[i:i + tamano_sublote],) for i in range(0, len(lote), tamano_sublote)]
+        resultados = self._ejecutar_varios(
+            _renderizar_lote_a_archivos_en_worker, plantilla, sublotes, timeout=self.timeout * tamano_sublote
+        )
+        return [resultado for parcial in resultados for resultado in parcial]
+
+    def _ejecutar(self, funcion, plantilla, *args, timeout=None):
+        """
+        Envía un trabajo de renderizado al pool respetando la cola acotada y el timeout.
+        """
+        return self._ejecutar_varios(funcion, plantilla, [args], timeout=timeout)[0]
+
+    def _ejecutar_varios(self, funcion, plantilla, lista_args: list, timeout=None) -> list:
+        """
+        Envía a la vez un trabajo por cada tupla de argumentos y espera todos los resultados,
+        en el mismo orden. Cada trabajo ocupa un cupo de la cola acotada.
+        """
+        timeout = timeout or self.timeout
+        cupos = 0
+        try:
+            for _ in lista_args:
+                if not self._cupos.acquire(timeout=self.timeout):
+                    raise RenderizadoPDFError("La cola de generación de PDFs está llena. Intente nuevamente.")
+                cupos += 1
+
+            executor = self._obtener_executor(len(lista_args))
+            try:
+                futuros = [executor.submit(funcion, plantilla, *args) for args in lista_args]
+                resultados = [futuro.result(timeout=timeout) for futuro in futuros]
+            except FuturesTimeoutError:
+                logger.error("Renderizado de '%s' superó %ss; reciclando pool", plantilla.nombre, timeout)
+                self._descartar_executor(executor, terminar=True)
+                raise RenderizadoPDFError(f"La generación del PDF superó el tiempo límite de {timeout}s.")
+            except BrokenProcessPool:
+                logger.warning("Pool de renderizado averiado; renderizando en el proceso actual")
+                self._descartar_executor(executor)
+                with self._lock:
+                    self.renderizados_locales += len(lista_args)
+                resultados = [funcion(plantilla, *args) for args in lista_args]
+        finally:
+            for _ in range(cupos):
+                self._cupos.release()
+
+        return resultados
+
+    def apagar(self):
+        """
+        Detiene el pool de procesos (se llama automáticamente al salir del intérprete).
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_motor = None
+_motor_lock = threading.Lock()
+
+
+def obtener_motor():
+    """
+    Devuelve el motor de renderizado del proceso, creándolo según settings.PDF_RENDER_ENGINE.
+    Retorna None si el modo configurado es 'inline'.
+    """
+    global _motor
+    config = getattr(settings, 'PDF_RENDER_ENGINE', {})
+    if config.get('MODO', 'procesos') == 'inline':
+        return None
+
+    if _motor is None:
+        with _motor_lock:
+            if _motor is None:
+                _motor = MotorRenderizadoPDF(
+                    max_workers=config.get('MAX_WORKERS'),
+                    max_cola=config.get('MAX_COLA', 32),
+                    timeout=config.get('TIMEOUT', 30),
+                    trabajos_por_worker=config.get('TRABAJOS_POR_WORKER', 200),
+                    contexto=config.get('CONTEXTO', 'spawn'),
+                )
+                atexit.register(_motor.apagar)
+    return _motor
+
+
+@receiver(setting_changed)
+def _reiniciar_motor(setting, **kwargs):
+    global _motor
+    if setting == 'PDF_RENDER_ENGINE':
+        with _motor_lock:
+            motor, _motor = _motor, None
+        if motor is not None:
+            motor.apagar()
+
+
+def renderizar_pdf(plantilla, form_data: dict) -> io.BytesIO:
+    """
+    Punto de entrada único para generar el PDF de un trámite.
+    Devuelve el PDF desde la caché de renderizados si la misma plantilla ya se rellenó
+    con los mismos datos; si no, usa el pool de procesos salvo que el modo sea 'inline'.
+    """
+    huella_plantilla = obtener_huella_plantilla(plantilla)
+    contenido = obtener_pdf_cacheado(huella_plantilla, form_data)
+    if contenido is not None:
+        return io.BytesIO(contenido)
+
+    motor = obtener_motor()
+    if motor is None:
+        from .tramite_service import _rellenar_pdf_plantilla
+        pdf_buffer = _rellenar_pdf_plantilla(plantilla, form_data)
+    else:
+        pdf_buffer = motor.renderizar(plantilla, form_data)
+
+    guardar_pdf_cacheado(huella_plantilla, form_data, pdf_buffer.getvalue())
+    pdf_buffer.seek(0)
+    return pdf_buffer
+
+
+def renderizar_pdf_a_archivo(plantilla, form_data: dict, directorio: str) -> str:
+    """
+    Genera el PDF de un trámite en un archivo temporal dentro de `directorio`, sin
+    mantener el documento completo en memoria. Pensado para crear el temporal en el
+    mismo directorio que el destino final y luego publicarlo con un rename atómico.
+
+    Returns:
+        Ruta del archivo temporal (el llamador debe renombrarlo o eliminarlo)
+    """
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, ruta_temporal = tempfile.mkstemp(dir=directorio, prefix='.renderizado-', suffix='.pdf.tmp')
+    os.close(descriptor)
+
+    try:
+        huella_plantilla = obtener_huella_plantilla(plantilla)
+        if copiar_pdf_cacheado(huella_plantilla, form_data, ruta_temporal):
+            return ruta_temporal
+
+        motor = obtener_motor()
+        if motor is None:
+            _renderizar_en_worker_a_archivo(plantilla, form_data, ruta_temporal)
+        else:
+            motor.renderizar_a_archivo(plantilla, form_data, ruta_temporal)
+
+        guardar_archivo_cacheado(huella_plantilla, form_data, ruta_temporal)
+    except BaseException:
+        os.remove(ruta_temporal)
+        raise
+
+    return ruta_temporal
+
+
+def renderizar_lote_a_archivos(plantilla, trabajos: list) -> list:
+    """
+    Genera varios PDFs de la misma plantilla, repartidos entre los workers del pool,
+    escribiendo cada uno en su ruta.
+
+    Args:
+        trabajos: Lista de (form_data, ruta_destino absoluta)
+
+    Returns:
+        Lista con None por cada PDF escrito o el mensaje de error, en el mismo orden
+    """
+    motor = obtener_motor()
+    if motor is None:
+        return _renderizar_lote_a_archivos_en_worker(plantilla, trabajos)
+    return motor.renderizar_lote_a_archivos(plantilla, trabajos)
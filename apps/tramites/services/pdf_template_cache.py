@@ -0,0 +1,207 @@
+"""
+Caché LRU por proceso de plantillas PDF ya parseadas.
+
+Evita reabrir el archivo base y volver a construir el PdfReader de PyPDF2
+(y recorrer /AcroForm y /Annots) en cada relleno de una plantilla.
+La clave incluye el id de la plantilla y la firma del archivo (mtime + tamaño),
+por lo que un archivo reemplazado en disco nunca se sirve desde la caché.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import PyPDF2
+from django.conf import settings
+
+from .pdf_field_extractor import calcular_huella_pdf, construir_indice_layout
+from .pdf_overlay_renderer import RenderizadorSuperpuesto
+
+
+class PlantillaParseada:
+    """
+    Estructura parseada de un PDF de plantilla, lista para reutilizarse entre rellenos.
+
+    El PdfReader de PyPDF2 resuelve objetos de forma perezosa sobre un stream compartido,
+    por lo que no es seguro entre hilos: quien lea de `reader` o `paginas` debe tomar `lock`.
+    """
+
+    def __init__(self, contenido: bytes):
+        self.contenido = contenido
+        self.reader = PyPDF2.PdfReader(io.BytesIO(contenido))
+        self.lock = threading.RLock()
+        self.tiene_acroform = '/AcroForm' in self.reader.trailer['/Root']
+        self.paginas = list(self.reader.pages)
+        self.huella = calcular_huella_pdf(contenido)
+        # Índice de layout calculado una sola vez por proceso (respaldo del persistido)
+        self.indice_layout = construir_indice_layout(self.reader)
+        self._renderizador_superpuesto = None
+
+    def obtener_renderizador_superpuesto(self) -> RenderizadorSuperpuesto:
+        """
+        Renderizador de superposición de esta plantilla, creado la primera vez que se usa.
+        Se debe llamar (y usar) con `lock` tomado.
+        """
+        if self._renderizador_superpuesto is None:
+            self._renderizador_superpuesto = RenderizadorSuperpuesto(self.paginas)
+        return self._renderizador_superpuesto
+
+    def obtener_indice(self, plantilla) -> dict:
+        """
+        Devuelve el índice de layout persistido en la plantilla si corresponde a este
+        archivo; si falta o está desactualizado, el calculado al parsear.
+        """
+        indice = getattr(plantilla, 'indice_campos', None) or {}
+        if indice.get('huella') == self.huella:
+            return indice
+        return self.indice_layout
+
+
+class _CacheLRU:
+    """
+    Caché LRU acotada y segura entre hilos, con contadores de aciertos y fallos.
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            valor = self._entradas.get(clave)
+            if valor is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            # Una plantilla solo puede tener una versión de archivo vigente
+            for clave_existente in [c for c in self._entradas if c[0] == clave[0]]:
+                del self._entradas[clave_existente]
+            self._entradas[clave] = valor
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, plantilla_id):
+        with self._lock:
+            for clave in [c for c in self._entradas if c[0] == plantilla_id]:
+                del self._entradas[clave]
+                self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = 0
+            self.fallos = 0
+            self.invalidaciones = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'invalidaciones': self.invalidaciones,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'tasa_aciertos': (self.aciertos / total) if total else 0.0,
+            }
+
+
+_cache = _CacheLRU(getattr(settings, 'PDF_TEMPLATE_CACHE_MAX', 32))
+
+# Huellas SHA-256 de archivos base ya leídos, por firma del archivo (ruta, mtime, tamaño)
+_huellas = {}
+_huellas_lock = threading.Lock()
+
+
+def _clave_plantilla(plantilla_id, pdf_path: str) -> tuple:
+    """
+    Construye la clave de caché: id de la plantilla + firma del archivo en disco.
+    """
+    stat = os.stat(pdf_path)
+    return (plantilla_id, pdf_path, stat.st_mtime_ns, stat.st_size)
+
+
+def obtener_plantilla_parseada(plantilla) -> PlantillaParseada:
+    """
+    Devuelve la estructura parseada del PDF base de la plantilla, desde la caché si es posible.
+
+    Args:
+        plantilla: PlantillaDocumento (o cualquier objeto con `id` y `archivo_base.path`)
+
+    Returns:
+        PlantillaParseada
+
+    Raises:
+        FileNotFoundError: Si el archivo base no existe en disco
+    """
+    pdf_path = plantilla.archivo_base.path
+    clave = _clave_plantilla(plantilla.id, pdf_path)
+
+    parseada = _cache.obtener(clave)
+    if parseada is not None:
+        return parseada
+
+    with open(pdf_path, 'rb') as pdf_file:
+        parseada = PlantillaParseada(pdf_file.read())
+
+    _cache.guardar(clave, parseada)
+    return parseada
+
+
+def obtener_huella_plantilla(plantilla) -> str:
+    """
+    Devuelve la huella SHA-256 del archivo base de la plantilla sin parsear el PDF.
+    Se recalcula solo cuando cambia la firma del archivo en disco.
+    """
+    pdf_path = plantilla.archivo_base.path
+    clave = _clave_plantilla(plantilla.id, pdf_path)
+
+    with _huellas_lock:
+        huella = _huellas.get(clave)
+    if huella is not None:
+        return huella
+
+    with open(pdf_path, 'rb') as pdf_file:
+        huella = calcular_huella_pdf(pdf_file.read())
+
+    with _huellas_lock:
+        if len(_huellas) >= _cache.max_entradas * 4:
+            _huellas.clear()
+        _huellas[clave] = huella
+    return huella
+
+
+def invalidar_plantilla(plantilla_id):
+    """
+    Descarta de la caché de este proceso cualquier versión parseada de la plantilla.
+    Los demás procesos la descartan solos al detectar el cambio de mtime/tamaño.
+    """
+    _cache.invalidar(plantilla_id)
+    with _huellas_lock:
+        for clave in [c for c in _huellas if c[0] == plantilla_id]:
+            del _huellas[clave]
+
+
+def limpiar_cache():
+    """
+    Vacía la caché y reinicia sus contadores.
+    """
+    _cache.limpiar()
+    with _huellas_lock:
+        _huellas.clear()
+
+
+def estadisticas_cache() -> dict:
+    """
+    Retorna los contadores de aciertos/fallos de la caché de este proceso.
+    """
+    return _cache.estadisticas()
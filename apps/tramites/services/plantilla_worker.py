@@ -0,0 +1,43 @@
+"""
+Worker local en segundo plano para la ingesta de plantillas de documentos.
+
+La petición del administrador solo guarda el archivo y crea la plantilla con
+estado_procesamiento='PENDIENTE'; la validación del PDF, la extracción de campos
+y del índice de layout y la activación se ejecutan aquí, fuera del ciclo de la petición.
+Igual que en documento_worker, los trabajos se encolan con transaction.on_commit.
+"""
+from datetime import timedelta
+
+from .trabajos_segundo_plano import ColaTrabajos, reclamar_trabajos_abandonados, registrar_cola
+
+cola_plantillas = registrar_cola(ColaTrabajos(
+    'ingesta-plantillas',
+    'apps.tramites.services.storage_service.procesar_plantilla_documento',
+    'PLANTILLA_INGESTA_WORKERS', 1,
+))
+
+
+def encolar_procesamiento_plantilla(plantilla_id: int):
+    """
+    Programa el procesamiento de la plantilla para después del commit actual.
+    """
+    cola_plantillas.encolar(plantilla_id)
+
+
+def recuperar_plantillas_pendientes(antiguedad: timedelta) -> list:
+    """
+    Procesa las plantillas que llevan más de `antiguedad` en PENDIENTE o PROCESANDO
+    (trabajos perdidos al reiniciarse el proceso que los tenía en cola).
+
+    Returns:
+        IDs de las plantillas reprocesadas
+    """
+    from apps.tramites.models import PlantillaDocumento
+
+    reclamadas = reclamar_trabajos_abandonados(
+        PlantillaDocumento.objects.all(), 'estado_procesamiento', ('PENDIENTE', 'PROCESANDO'), 'PENDIENTE',
+        'estado_procesamiento_desde', antiguedad,
+    )
+    for plantilla_id in reclamadas:
+        cola_plantillas.ejecutar(plantilla_id)
+    return reclamadas
@@ -1,7 +1,22 @@
+import hashlib
+import logging
 import os
+import PyPDF2
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from apps.tramites.models import Documento, HistorialCambios, PlantillaDocumento
+from django.utils import timezone
+from apps.tramites.models import CampoPlantilla, Documento, HistorialCambios, PlantillaDocumento, carpeta_segmento
+from .esquema_formulario import invalidar_esquema_formulario
+from .menu_plantillas import invalidar_catalogo
 from .pdf_field_extractor import extraer_campos_pdf
+from .pdf_template_cache import invalidar_plantilla
+from .plantilla_worker import encolar_procesamiento_plantilla
+
+logger = logging.getLogger(__name__)
+
+# Almacén de archivos de plantillas direccionado por contenido (SHA-256)
+DIRECTORIO_PLANTILLAS_POR_HUELLA = 'plantillas_maestras/sha256'
 
 # --- Funciones para Documentos de Solicitantes ---
 
@@ -30,20 +45,7 @@ def _generar_ruta_archivo(tramite, nombre_documento, version, filename):
     new_filename = f"{documento_nombre_clean}_v{version}{ext}"
 
     # Segmento
-    segmento = 'general'
-
-    # Intentar obtener la plantilla para determinar el segmento correcto
-    plantilla = getattr(tramite, 'plantilla', None)
-    if not plantilla and hasattr(tramite, 'nombre'):
-        try:
-            plantilla = PlantillaDocumento.objects.filter(tipo_especifico=tramite.nombre).first()
-        except Exception:
-            pass
-
-    if plantilla:
-        segmento = plantilla.segmento.lower().replace(' ', '_')
-    elif hasattr(tramite, 'nombre'):
-         segmento = tramite.nombre.split()[0].lower()
+    segmento = carpeta_segmento(tramite)
 
     return f"solicitante/solicitante_{solicitante_id:04d}/{segmento}/{new_filename}"
 
@@ -84,36 +86,218 @@ def guardar_documento(tramite, archivo_subido):
 
 # --- Funciones para Plantillas de Documentos (Admin) ---
 
-def crear_plantilla_documento(nombre, segmento, tipo_especifico, archivo, administrador):
+def crear_plantilla_documento(nombre, segmento, tipo_especifico, archivo, administrador, asincrono: bool = None):
     """
-    Crea una nueva plantilla de documento en la base de datos y extrae automáticamente
-    los campos del PDF.
+    Guarda una nueva plantilla de documento y programa su procesamiento (ver procesar_plantilla_documento).
+
+    La plantilla se crea inactiva con estado_procesamiento='PENDIENTE' y la petición termina en
+    cuanto el archivo queda almacenado; el panel de plantillas consulta el estado periódicamente.
+    Si ya existe una plantilla procesada con un archivo idéntico (misma huella), se reutilizan su
+    archivo almacenado, su índice de layout y sus campos, y la nueva queda lista sin procesar nada.
+
+    Args:
+        asincrono: Procesar en el worker de plantillas. None = settings.PLANTILLA_INGESTA_ASINCRONA
     """
     if not all([nombre, segmento, tipo_especifico, archivo, administrador]):
         raise ValueError("Todos los campos son requeridos para crear la plantilla.")
 
-    plantilla = PlantillaDocumento.objects.create(
+    if asincrono is None:
+        asincrono = getattr(settings, 'PLANTILLA_INGESTA_ASINCRONA', False)
+
+    huella = calcular_huella_archivo(archivo)
+    gemela = PlantillaDocumento.objects.filter(
+        huella_archivo=huella, estado_procesamiento='LISTA'
+    ).exclude(archivo_base='').order_by('id').first()
+
+    plantilla = PlantillaDocumento(
         nombre=nombre,
         segmento=segmento,
         tipo_especifico=tipo_especifico,
-        archivo_base=archivo,
-        administrador=administrador
+        administrador=administrador,
+        huella_archivo=huella,
+        activo=False,  # No se ofrece a los solicitantes hasta terminar el procesamiento
+        estado_procesamiento='PENDIENTE',
+        estado_procesamiento_desde=timezone.now(),
     )
 
-    # Extraer campos automáticamente del PDF
+    if gemela is not None:
+        return _crear_plantilla_desde_gemela(plantilla, gemela)
+
+    # El archivo se guarda una sola vez por contenido: otra subida idéntica reutiliza el nombre
+    plantilla.archivo_base.name = _guardar_archivo_plantilla(archivo, huella)
+    plantilla.save()
+
+    programar_procesamiento_plantilla(plantilla, asincrono)
+    return plantilla
+
+def preparar_reemplazo_archivo_plantilla(plantilla, archivo):
+    """
+    Prepara (sin guardar) una plantilla existente cuyo archivo base se reemplaza, p. ej. desde
+    el admin: el archivo nuevo va al almacén direccionado por contenido y la plantilla queda
+    inactiva en 'PENDIENTE' hasta que programar_procesamiento_plantilla vuelva a extraer
+    sus campos y su índice de layout.
+    """
+    plantilla.huella_archivo = calcular_huella_archivo(archivo)
+    plantilla.archivo_base = _guardar_archivo_plantilla(archivo, plantilla.huella_archivo)
+    plantilla.activo = False
+    plantilla.estado_procesamiento = 'PENDIENTE'
+    plantilla.estado_procesamiento_desde = timezone.now()
+    plantilla.error_procesamiento = ''
+
+def programar_procesamiento_plantilla(plantilla, asincrono: bool = None):
+    """
+    Procesa una plantilla guardada en 'PENDIENTE': en el worker de plantillas tras el commit
+    o, si no es asíncrono, en el acto.
+
+    Args:
+        asincrono: Procesar en el worker de plantillas. None = settings.PLANTILLA_INGESTA_ASINCRONA
+    """
+    if asincrono is None:
+        asincrono = getattr(settings, 'PLANTILLA_INGESTA_ASINCRONA', False)
+
+    # Descartar cualquier estructura parseada previa asociada a este id
+    invalidar_plantilla(plantilla.id)
+
+    if asincrono:
+        encolar_procesamiento_plantilla(plantilla.id)
+    else:
+        try:
+            procesar_plantilla_documento(plantilla.id)
+        except Exception:
+            pass  # El motivo queda en error_procesamiento
+        plantilla.refresh_from_db()
+
+def calcular_huella_archivo(archivo) -> str:
+    """
+    SHA-256 del archivo subido, leído por bloques (mismo valor que calcular_huella_pdf).
+    """
+    huella = hashlib.sha256()
+    for bloque in archivo.chunks():
+        huella.update(bloque)
+    archivo.seek(0)
+    return huella.hexdigest()
+
+def _guardar_archivo_plantilla(archivo, huella: str) -> str:
+    """
+    Guarda el archivo en el almacén direccionado por contenido y devuelve su nombre en el storage.
+    """
+    storage = PlantillaDocumento._meta.get_field('archivo_base').storage
+    nombre = f"{DIRECTORIO_PLANTILLAS_POR_HUELLA}/{huella[:2]}/{huella}.pdf"
+    if storage.exists(nombre):
+        return nombre
+    return storage.save(nombre, archivo)
+
+@transaction.atomic
+def _crear_plantilla_desde_gemela(plantilla, gemela):
+    """
+    Crea la plantilla compartiendo el archivo, el índice de layout y los campos de una
+    plantilla ya procesada con el mismo contenido: solo se insertan filas.
+    """
+    plantilla.archivo_base.name = gemela.archivo_base.name
+    plantilla.indice_campos = gemela.indice_campos
+    plantilla.estado_procesamiento = 'LISTA'
+    plantilla.activo = True
+    plantilla.save()
+
+    CampoPlantilla.objects.bulk_create([
+        CampoPlantilla(
+            plantilla=plantilla,
+            seccion=campo.seccion,
+            nombre_campo=campo.nombre_campo,
+            nombre_tecnico=campo.nombre_tecnico,
+            tipo_campo=campo.tipo_campo,
+            es_requerido=campo.es_requerido,
+            orden=campo.orden,
+        )
+        for campo in gemela.campos.all()
+    ])
+    invalidar_esquema_formulario(plantilla.id)  # bulk_create no emite señales
+
+    logger.info("Plantilla #%s creada reutilizando el archivo y los campos de la plantilla #%s", plantilla.id, gemela.id)
+    return plantilla
+
+def _validar_pdf_plantilla(plantilla):
+    """
+    Comprueba que el archivo base sea un PDF legible, sin cifrar y con al menos una página.
+
+    Raises:
+        ValidationError: Con el motivo, que se muestra al administrador
+    """
+    with plantilla.archivo_base.open('rb') as archivo:
+        if archivo.read(5) != b'%PDF-':
+            raise ValidationError("El archivo subido no es un PDF.")
+        archivo.seek(0)
+        try:
+            reader = PyPDF2.PdfReader(archivo)
+            cifrado = reader.is_encrypted
+            paginas = 0 if cifrado else len(reader.pages)
+        except Exception as e:
+            raise ValidationError(f"El PDF está dañado o no se puede leer: {e}")
+
+    if cifrado:
+        raise ValidationError("El PDF está protegido con contraseña.")
+    if paginas == 0:
+        raise ValidationError("El PDF no tiene páginas.")
+
+def procesar_plantilla_documento(plantilla_id: int):
+    """
+    Pipeline de ingesta de una plantilla subida. Lo ejecuta el worker de plantillas:
+    1. Validar el PDF (legible, sin cifrar, con páginas)
+    2. Calcular la huella y el índice de layout y extraer los campos (extraer_campos_pdf)
+    3. Verificar que la plantilla quedó con campos
+    4. Marcarla como activa
+
+    Actualiza estado_procesamiento en cada etapa. Si una etapa falla la plantilla queda
+    inactiva en 'ERROR', con el motivo en error_procesamiento, y se relanza la excepción.
+    El trabajo se reclama pasando de PENDIENTE a PROCESANDO con un UPDATE condicionado: si la
+    plantilla ya no está PENDIENTE (la procesó otro worker o el comando
+    recuperar_trabajos_pendientes) no se hace nada.
+    """
+    if not PlantillaDocumento.objects.filter(id=plantilla_id, estado_procesamiento='PENDIENTE').update(
+        estado_procesamiento='PROCESANDO', estado_procesamiento_desde=timezone.now(), error_procesamiento=''
+    ):
+        logger.info("La plantilla #%s ya no está pendiente de procesar; se omite", plantilla_id)
+        return
+
     try:
-        campos_creados = extraer_campos_pdf(plantilla)
-        print(f"✅ Se crearon {campos_creados} campos automáticamente para la plantilla '{nombre}'")
+        plantilla = PlantillaDocumento.objects.get(id=plantilla_id)
+
+        # 1. Validar el archivo antes de extraer: un PDF ilegible no debe acabar con campos genéricos
+        _validar_pdf_plantilla(plantilla)
+
+        # 2. Huella + índice de layout + sincronización de CampoPlantilla
+        total_campos = extraer_campos_pdf(plantilla)
+
+        # 3. Validar el resultado
+        if not total_campos or not plantilla.campos.exists():
+            raise ValidationError("No se pudo obtener ningún campo para el formulario de la plantilla.")
     except Exception as e:
-        print(f"⚠️ No se pudieron extraer campos automáticamente: {e}")
+        mensaje = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+        logger.error("Error al procesar la plantilla #%s: %s", plantilla_id, mensaje)
+        PlantillaDocumento.objects.filter(id=plantilla_id).update(
+            estado_procesamiento='ERROR', estado_procesamiento_desde=timezone.now(),
+            error_procesamiento=mensaje, activo=False
+        )
+        invalidar_catalogo()  # update() no emite señales
+        raise
 
-    return plantilla
+    # 4. Activar la plantilla
+    PlantillaDocumento.objects.filter(id=plantilla_id).update(
+        estado_procesamiento='LISTA', estado_procesamiento_desde=timezone.now(), activo=True
+    )
+    invalidar_catalogo()  # update() no emite señales
+    logger.info("Plantilla #%s procesada: %d campos", plantilla_id, total_campos)
 
 def eliminar_plantilla_documento(plantilla_id: int):
     """
     Elimina una plantilla de documento por su ID.
+    El archivo base solo se borra si ninguna otra plantilla lo comparte.
     """
     plantilla = PlantillaDocumento.objects.get(id=plantilla_id)
-    if plantilla.archivo_base:
+    invalidar_plantilla(plantilla.id)
+    compartido = PlantillaDocumento.objects.filter(
+        archivo_base=plantilla.archivo_base.name
+    ).exclude(id=plantilla.id).exists()
+    if plantilla.archivo_base and not compartido:
         plantilla.archivo_base.delete(save=False)
     plantilla.delete()
@@ -0,0 +1,141 @@
+"""
+Cola local de trabajos en segundo plano para los workers de documentos y plantillas.
+
+Cada cola ejecuta una función de servicio (ej: generar_documento_tramite) en un pool de
+hilos del proceso web. Los trabajos se encolan con transaction.on_commit para que el worker
+nunca lea una fila que todavía no fue confirmada en la base de datos.
+
+El pool vive en memoria: si el proceso se reinicia con trabajos en cola, las filas quedan en
+su estado de espera. Por eso cada fila registra desde cuándo está en ese estado y
+recuperar_trabajos_pendientes (comando del mismo nombre) vuelve a ejecutar las que llevan
+demasiado tiempo sin avanzar.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class ColaTrabajos:
+    """
+    Pool de hilos de un tipo de trabajo, creado en el primer envío.
+
+    Args:
+        nombre: Prefijo de los hilos y de los mensajes de log
+        funcion: Ruta importable de la función que procesa un ID (se resuelve al ejecutar
+                 para no importar los servicios al cargar el módulo)
+        ajuste_workers: Setting con el número de hilos. 0 = ejecutar el trabajo en el mismo
+                        hilo al confirmar la transacción (pruebas, depuración)
+        workers_por_defecto: Hilos si el setting no está definido
+    """
+
+    def __init__(self, nombre: str, funcion: str, ajuste_workers: str, workers_por_defecto: int):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.ajuste_workers = ajuste_workers
+        self.workers_por_defecto = workers_por_defecto
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self) -> int:
+        return getattr(settings, self.ajuste_workers, self.workers_por_defecto)
+
+    def _obtener_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.nombre,
+                    )
+        return self._executor
+
+    def reiniciar(self):
+        """
+        Descarta el pool actual (los trabajos ya enviados terminan en sus hilos).
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def ejecutar(self, objeto_id: int) -> bool:
+        """
+        Procesa un trabajo en el hilo actual. Devuelve False si la función falló; el motivo
+        ya quedó registrado por la propia función en el estado de la fila.
+        """
+        try:
+            import_string(self.funcion)(objeto_id)
+            return True
+        except Exception:
+            logger.exception("Falló el trabajo %s #%s", self.nombre, objeto_id)
+            return False
+
+    def _ejecutar_en_hilo(self, objeto_id: int):
+        try:
+            self.ejecutar(objeto_id)
+        finally:
+            # Cada hilo abre su propia conexión: cerrarla para no agotar el pool de la BD
+            connection.close()
+
+    def encolar(self, objeto_id: int):
+        """
+        Programa el trabajo para después del commit actual.
+        """
+        if self.max_workers <= 0:
+            transaction.on_commit(lambda: self.ejecutar(objeto_id))
+        else:
+            transaction.on_commit(lambda: self._obtener_executor().submit(self._ejecutar_en_hilo, objeto_id))
+
+
+def reclamar_trabajos_abandonados(queryset, campo_estado: str, estados: tuple, estado_espera: str,
+                                  campo_desde: str, antiguedad: timedelta) -> list:
+    """
+    Devuelve a estado_espera las filas que llevan más de `antiguedad` en alguno de `estados`
+    (o sin fecha, de antes de registrarla) y devuelve sus IDs.
+
+    Cada fila se reclama con un UPDATE condicionado a su estado y fecha leídos: si un worker
+    la tomó entre la lectura y el UPDATE no se cuenta, así dos barridos simultáneos no
+    ejecutan el mismo trabajo.
+    """
+    limite = timezone.now() - antiguedad
+    candidatas = queryset.filter(**{f'{campo_estado}__in': estados}).filter(
+        Q(**{f'{campo_desde}__lt': limite}) | Q(**{f'{campo_desde}__isnull': True})
+    ).values_list('id', campo_estado, campo_desde)
+
+    reclamados = []
+    for objeto_id, estado, desde in candidatas:
+        filtro = {'id': objeto_id, campo_estado: estado}
+        if desde is None:
+            filtro[f'{campo_desde}__isnull'] = True
+        else:
+            filtro[campo_desde] = desde
+        if queryset.filter(**filtro).update(**{campo_estado: estado_espera, campo_desde: timezone.now()}):
+            reclamados.append(objeto_id)
+    return reclamados
+
+
+COLAS = []
+
+
+def registrar_cola(cola: ColaTrabajos) -> ColaTrabajos:
+    COLAS.append(cola)
+    return cola
+
+
+@receiver(setting_changed)
+def _reiniciar_colas(setting, **kwargs):
+    # El número de hilos se lee al crear cada pool: recrearlo si cambia el ajuste
+    for cola in COLAS:
+        if setting == cola.ajuste_workers:
+            cola.reiniciar()
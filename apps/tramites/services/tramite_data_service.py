@@ -5,6 +5,7 @@ Garantiza que solo el solicitante propietario pueda modificar sus datos.
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import transaction
 from apps.tramites.models import Tramite, PlantillaDocumento, CampoPlantilla
+from .esquema_formulario import obtener_esquema_formulario
 
 
 class TramiteDataService:
@@ -29,28 +30,19 @@ class TramiteDataService:
         """
         Valida que los datos del formulario correspondan a los campos definidos en la plantilla.
         Retorna un diccionario limpio con solo los campos válidos.
+        Usa el esquema compilado de la plantilla: no consulta los campos en la BD.
         """
-        campos_validos = plantilla.campos.all()
-        datos_limpios = {}
-        errores = []
+        return obtener_esquema_formulario(plantilla).validar(form_data)
 
-        for campo in campos_validos:
-            nombre_tecnico = campo.nombre_tecnico
-            valor = form_data.get(nombre_tecnico)
-
-            # Validar campos requeridos
-            if campo.es_requerido and not valor:
-                errores.append(f"El campo '{campo.nombre_campo}' es requerido.")
-                continue
-
-            # Agregar solo si existe el valor
-            if valor:
-                datos_limpios[nombre_tecnico] = str(valor).strip()
-
-        if errores:
-            raise ValidationError(errores)
+    @staticmethod
+    def validar_lote_datos_formulario(filas, plantilla: PlantillaDocumento):
+        """
+        Valida muchos envíos contra la misma plantilla (ej: importación masiva) en una llamada.
 
-        return datos_limpios
+        Returns:
+            ResultadoLote con `validos` [(índice, datos_limpios)] y `errores` {índice: {campo: [mensajes]}}
+        """
+        return obtener_esquema_formulario(plantilla).validar_lote(filas)
 
     @staticmethod
     @transaction.atomic
@@ -77,17 +69,16 @@ class TramiteDataService:
         """
         try:
             # 1. Obtener el trámite y validar que existe
-            tramite = Tramite.objects.select_related('solicitante').get(id=tramite_id)
+            tramite = Tramite.objects.select_related('solicitante', 'plantilla').get(id=tramite_id)
         except Tramite.DoesNotExist:
             raise ValidationError(f"El trámite #{tramite_id} no existe.")
 
         # 2. Validar propiedad del trámite
         TramiteDataService.validar_propiedad_tramite(tramite, usuario)
 
-        # 3. Obtener la plantilla asociada (a través del nombre del trámite)
-        try:
-            plantilla = PlantillaDocumento.objects.get(tipo_especifico=tramite.nombre, activo=True)
-        except PlantillaDocumento.DoesNotExist:
+        # 3. Obtener la plantilla asociada al trámite
+        plantilla = tramite.obtener_plantilla_vigente()
+        if plantilla is None:
             raise ValidationError(f"No se encontró plantilla activa para el trámite '{tramite.nombre}'")
 
         # 4. Validar y limpiar datos
@@ -141,7 +132,7 @@ class TramiteDataService:
             ValidationError: Si el trámite no existe o no pertenece al solicitante
         """
         try:
-            tramite = Tramite.objects.select_related('solicitante').get(
+            tramite = Tramite.objects.select_related('solicitante', 'plantilla').get(
                 id=tramite_id,
                 solicitante_id=solicitante_id
             )
@@ -1,37 +1,58 @@
 import io
+import logging
 import os
+import tempfile
 from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
-from django.core.files.uploadedfile import SimpleUploadedFile
-from django.core.files.storage import default_storage
+from django.core.files import File
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.db import IntegrityError, transaction
 import PyPDF2
 from apps.tramites.models import Tramite, Documento, PlantillaDocumento
 from .tramite_data_service import TramiteDataService
 from .asignacion_service import AsignacionTramitadorService
 from .storage_service import _generar_ruta_archivo
+from .pdf_template_cache import obtener_huella_plantilla, obtener_plantilla_parseada
+from .pdf_render_engine import renderizar_pdf, renderizar_pdf_a_archivo
+from .pdf_render_cache import calcular_huella_datos
+from .documento_worker import encolar_generacion_documento
+from .instrumentacion import medir_etapa
+from .esquema_formulario import VALORES_CASILLA_MARCADA
 
+logger = logging.getLogger(__name__)
 
-def _rellenar_pdf_plantilla(plantilla: PlantillaDocumento, form_data: dict) -> io.BytesIO:
+
+class SegmentoOcupadoError(ValidationError):
+    """
+    El solicitante ya tiene un trámite activo en el segmento de la plantilla
+    (violación del índice único parcial tramite_un_activo_por_segmento).
+    """
+
+
+def _rellenar_pdf_plantilla(plantilla: PlantillaDocumento, form_data: dict, salida=None):
     """
     Rellena el PDF original de la plantilla con los datos del formulario.
     Inyecta los valores directamente en los campos del PDF usando PyPDF2.
+    La estructura parseada de la plantilla se obtiene de la caché por proceso.
+
+    Args:
+        salida: Archivo binario abierto donde escribir el PDF. Si es None se usa un BytesIO.
+
+    Returns:
+        El objeto de salida (posicionado al inicio si es un BytesIO)
     """
     try:
-        # Abrir el PDF de la plantilla
-        pdf_path = plantilla.archivo_base.path
+        # Obtener la plantilla ya parseada (caché LRU por proceso)
+        parseada = obtener_plantilla_parseada(plantilla)
 
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+        with parseada.lock:
             pdf_writer = PyPDF2.PdfWriter()
 
             # Verificar si el PDF tiene campos de formulario
-            if '/AcroForm' in pdf_reader.trailer['/Root']:
-                print(f"✅ PDF tiene campos de formulario. Rellenando...")
-
+            if parseada.tiene_acroform:
                 # Copiar todas las páginas
-                for page in pdf_reader.pages:
+                for page in parseada.paginas:
                     pdf_writer.add_page(page)
 
                 # Limpiar datos: remover csrfmiddlewaretoken y convertir todos a string
@@ -40,129 +61,142 @@ def _rellenar_pdf_plantilla(plantilla: PlantillaDocumento, form_data: dict) -> i
                     if key != 'csrfmiddlewaretoken':
                         datos_limpios[key] = str(value) if value else ''
 
-                print(f"📝 Rellenando {len(datos_limpios)} campos...")
-
-                # Rellenar los campos usando el método correcto de PyPDF2 3.x
+                # Rellenar los campos saltando directamente a sus widgets (todas las páginas)
                 try:
-                    # Método para PyPDF2 3.x - actualizar campos por página
-                    if hasattr(pdf_writer, 'update_page_form_field_values'):
-                        pdf_writer.update_page_form_field_values(
-                            pdf_writer.pages[0],
-                            datos_limpios
-                        )
-                        print(f"✅ Campos rellenados usando update_page_form_field_values")
-                    else:
-                        # Método alternativo: manipular directamente las anotaciones
-                        page = pdf_writer.pages[0]
-                        if '/Annots' in page:
-                            annotations = page['/Annots']
-                            for annotation in annotations:
-                                annotation_obj = annotation.get_object()
-                                if annotation_obj.get('/T'):  # Campo tiene nombre
-                                    field_name = annotation_obj.get('/T')
-                                    if field_name in datos_limpios:
-                                        # Actualizar el valor del campo
-                                        annotation_obj.update({
-                                            PyPDF2.generic.NameObject('/V'): PyPDF2.generic.TextStringObject(datos_limpios[field_name])
-                                        })
-                        print(f"✅ Campos rellenados usando manipulación directa de anotaciones")
+                    indice = parseada.obtener_indice(plantilla)
+                    rellenados = _aplicar_valores_con_indice(pdf_writer, indice, datos_limpios)
+                    logger.debug("%d de %d campos rellenados usando el índice de layout", rellenados, len(datos_limpios))
 
                 except Exception as e_fill:
-                    print(f"⚠️ Error al rellenar campos: {e_fill}")
-                    print("📝 Intentando método de superposición...")
-                    return _generar_pdf_con_datos_superpuestos(plantilla, form_data, pdf_reader)
+                    logger.warning("Error al rellenar campos de '%s' (%s); se usa la superposición", plantilla.nombre, e_fill)
+                    return _generar_pdf_con_datos_superpuestos(plantilla, form_data, parseada, salida)
 
                 # NO aplanar para que se puedan ver los datos
                 # if hasattr(pdf_writer, 'flatten'):
                 #     pdf_writer.flatten()
             else:
-                print(f"⚠️ El PDF no tiene campos de formulario")
-                # Usar el método de texto superpuesto
-                return _generar_pdf_con_datos_superpuestos(plantilla, form_data, pdf_reader)
+                # Sin campos de formulario: usar el método de texto superpuesto
+                return _generar_pdf_con_datos_superpuestos(plantilla, form_data, parseada, salida)
 
-            # Guardar el PDF rellenado en memoria
-            buffer = io.BytesIO()
-            pdf_writer.write(buffer)
-            buffer.seek(0)
-            print(f"✅ PDF generado exitosamente")
-            return buffer
+            # Escribir el PDF rellenado directamente en la salida (sin copias intermedias)
+            salida = _preparar_salida(salida)
+            pdf_writer.write(salida)
+            return _rebobinar_salida(salida)
 
     except Exception as e:
-        print(f"❌ Error al rellenar el PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error al rellenar el PDF de la plantilla '%s': %s", plantilla.nombre, e)
         # Si falla, intentar con el método alternativo
-        return _generar_pdf_con_datos_superpuestos(plantilla, form_data)
+        return _generar_pdf_con_datos_superpuestos(plantilla, form_data, salida=salida)
+
+
+def _preparar_salida(salida):
+    """
+    Devuelve la salida lista para escribir desde el inicio. Un intento fallido puede
+    haber dejado bytes a medias, por lo que se trunca antes de reintentar.
+    """
+    if salida is None:
+        return io.BytesIO()
+    salida.seek(0)
+    salida.truncate()
+    return salida
+
+
+def _rebobinar_salida(salida):
+    """
+    Deja los buffers en memoria posicionados al inicio, como esperan los llamadores.
+    """
+    if isinstance(salida, io.BytesIO):
+        salida.seek(0)
+    return salida
+
+
+def _aplicar_valores_con_indice(pdf_writer, indice: dict, datos: dict) -> int:
+    """
+    Escribe los valores del formulario en los widgets indicados por el índice de layout.
+    Solo se visitan los widgets de los campos enviados: O(campos enviados), no O(anotaciones × páginas).
+
+    Returns:
+        Número de widgets actualizados
+    """
+    campos_indice = indice.get('campos', {})
+    rellenados = 0
+
+    for nombre, valor in datos.items():
+        campo = campos_indice.get(nombre)
+        if not campo:
+            continue
+
+        for widget_info in campo['widgets']:
+            pagina = pdf_writer.pages[widget_info['pagina']]
+            widget = pagina['/Annots'][widget_info['anotacion']].get_object()
+            _aplicar_valor_widget(widget, campo['tipo'], widget_info, valor)
+            rellenados += 1
+
+    # Pedir al visor que regenere las apariencias de los campos modificados
+    pdf_writer.set_need_appearances_writer()
+    return rellenados
+
+
+def _aplicar_valor_widget(widget, tipo: str, widget_info: dict, valor: str):
+    """
+    Escribe un valor en un widget según su tipo de campo.
+
+    Returns:
+        El objeto donde se escribió /V (el propio widget o su /Parent)
+    """
+    from PyPDF2.generic import NameObject, TextStringObject
+
+    # El valor vive en el campo: el propio widget o su /Parent (widgets sin /T)
+    destino = widget if '/T' in widget or '/Parent' not in widget else widget['/Parent'].get_object()
+    estado_on = widget_info.get('estado_on') or '/Yes'
+
+    if tipo == 'checkbox':
+        estado = estado_on if valor.strip().lower() in VALORES_CASILLA_MARCADA else '/Off'
+        widget[NameObject('/AS')] = NameObject(estado)
+        destino[NameObject('/V')] = NameObject(estado)
+    elif tipo == 'radio':
+        seleccionado = estado_on.lstrip('/') == valor
+        widget[NameObject('/AS')] = NameObject(estado_on if seleccionado else '/Off')
+        if seleccionado:
+            destino[NameObject('/V')] = NameObject(estado_on)
+        elif destino is widget:
+            # Widget sin campo padre: su propio /V no debe conservar una selección anterior
+            destino[NameObject('/V')] = NameObject('/Off')
+    else:
+        destino[NameObject('/V')] = TextStringObject(valor)
+    return destino
 
 
-def _generar_pdf_con_datos_superpuestos(plantilla: PlantillaDocumento, form_data: dict, pdf_reader=None) -> io.BytesIO:
+def _generar_pdf_con_datos_superpuestos(plantilla: PlantillaDocumento, form_data: dict, parseada=None, salida=None):
     """
     Método alternativo: Superpone los datos sobre el PDF original.
     Se usa cuando el PDF no tiene campos de formulario o falla el método de inyección.
+    El renderizador (páginas, fuente, posiciones) se reutiliza desde la caché de plantillas.
     """
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter
-    from PyPDF2 import PdfWriter, PdfReader
-
     try:
-        if pdf_reader is None:
-            pdf_path = plantilla.archivo_base.path
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_reader = PdfReader(pdf_file)
-
-        # Crear un PDF con los datos en reportlab
-        packet = io.BytesIO()
-        can = canvas.Canvas(packet, pagesize=letter)
-
-        # Posicionar los datos en el PDF
-        # Esto es un ejemplo básico - necesitarás ajustar las coordenadas
-        y_position = 700
-        x_position = 100
-
-        for key, value in form_data.items():
-            if key != 'csrfmiddlewaretoken':
-                campo_legible = key.replace('_', ' ').title()
-                can.drawString(x_position, y_position, f"{campo_legible}: {value}")
-                y_position -= 20
-                if y_position < 100:
-                    can.showPage()
-                    y_position = 700
-
-        can.save()
-        packet.seek(0)
-
-        # Crear un nuevo PDF que combine la plantilla con los datos
-        overlay_pdf = PdfReader(packet)
-        output = PdfWriter()
-
-        # Agregar todas las páginas de la plantilla
-        for i, page in enumerate(pdf_reader.pages):
-            if i == 0 and len(overlay_pdf.pages) > 0:
-                # Superponer los datos en la primera página
-                page.merge_page(overlay_pdf.pages[0])
-            output.add_page(page)
-
-        # Guardar el resultado
-        buffer = io.BytesIO()
-        output.write(buffer)
-        buffer.seek(0)
-        return buffer
+        if parseada is None:
+            parseada = obtener_plantilla_parseada(plantilla)
+
+        # RLock: reentrante cuando el llamador ya tiene el lock de la plantilla
+        with parseada.lock:
+            renderizador = parseada.obtener_renderizador_superpuesto()
+            return renderizador.renderizar(form_data, _preparar_salida(salida))
 
     except Exception as e:
-        print(f"Error al superponer datos en el PDF: {e}")
+        logger.warning("Error al superponer datos en el PDF de '%s': %s", plantilla.nombre, e)
         # Último recurso: crear un PDF simple con los datos
-        return _generar_pdf_simple_fallback(plantilla, form_data)
+        return _generar_pdf_simple_fallback(plantilla, form_data, salida)
 
 
-def _generar_pdf_simple_fallback(plantilla: PlantillaDocumento, form_data: dict) -> io.BytesIO:
+def _generar_pdf_simple_fallback(plantilla: PlantillaDocumento, form_data: dict, salida=None):
     """
     Último recurso: Genera un PDF simple con los datos del formulario.
     """
     from reportlab.pdfgen import canvas
     from reportlab.lib.pagesizes import letter
 
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
+    salida = _preparar_salida(salida)
+    p = canvas.Canvas(salida, pagesize=letter)
     width, height = letter
 
     # Título del documento
@@ -181,10 +215,105 @@ def _generar_pdf_simple_fallback(plantilla: PlantillaDocumento, form_data: dict)
                 y_position = height - 72
 
     p.save()
-    buffer.seek(0)
-    return buffer
+    return _rebobinar_salida(salida)
 
-def iniciar_nuevo_tramite(solicitante, plantilla: PlantillaDocumento, form_data: dict):
+def _storage_documentos():
+    """
+    Storage donde viven los archivos de Documento.
+    """
+    return Documento._meta.get_field('archivo').storage
+
+
+def _nombre_base_documento(plantilla: PlantillaDocumento) -> str:
+    tipo_limpio = plantilla.tipo_especifico.lower().replace(' ', '_')
+    return f"{tipo_limpio}.pdf"
+
+
+def _directorio_temporal_documentos(tramite, plantilla: PlantillaDocumento) -> str:
+    """
+    Directorio donde renderizar el PDF antes de publicarlo: el mismo directorio del
+    destino final si el storage es local (rename atómico), o el temporal del sistema.
+    """
+    ruta_relativa = _generar_ruta_archivo(tramite, plantilla.tipo_especifico, 1, _nombre_base_documento(plantilla))
+    try:
+        return os.path.dirname(_storage_documentos().path(ruta_relativa))
+    except NotImplementedError:
+        return tempfile.gettempdir()
+
+
+def _guardar_nueva_version_documento(tramite, plantilla: PlantillaDocumento, datos: dict) -> Documento:
+    """
+    Renderiza el PDF completo del trámite y lo guarda como la siguiente versión de su Documento.
+    """
+    # Renderizar fuera del bloqueo de versión: puede tardar y no necesita la versión
+    with medir_etapa('renderizar'):
+        ruta_temporal = renderizar_pdf_a_archivo(plantilla, datos, _directorio_temporal_documentos(tramite, plantilla))
+    return _publicar_version_documento(
+        tramite, plantilla, ruta_temporal,
+        huella_plantilla=obtener_huella_plantilla(plantilla),
+        huella_datos=calcular_huella_datos(datos),
+    )
+
+
+def _publicar_version_documento(tramite, plantilla: PlantillaDocumento, ruta_temporal: str, **campos) -> Documento:
+    """
+    Publica un PDF ya escrito en un archivo temporal como la siguiente versión del Documento.
+
+    El archivo se mueve con un rename atómico a su ruta versionada: no se copia en memoria
+    ni en disco. La versión se calcula bajo bloqueo para evitar condiciones de carrera.
+    """
+    nombre_base = _nombre_base_documento(plantilla)
+    storage = _storage_documentos()
+
+    try:
+        with medir_etapa('almacenar'), transaction.atomic():
+            # Bloquear para obtener la última versión real y evitar condiciones de carrera
+            ultimo_documento = Documento.objects.select_for_update().filter(
+                tramite=tramite,
+                nombre=plantilla.tipo_especifico
+            ).order_by('-version').first()
+
+            nueva_version = (ultimo_documento.version + 1) if ultimo_documento else 1
+
+            # Verificar existencia física para evitar colisiones y sufijos aleatorios
+            while True:
+                ruta_archivo = _generar_ruta_archivo(tramite, plantilla.tipo_especifico, nueva_version, nombre_base)
+                if not storage.exists(ruta_archivo):
+                    break
+                nueva_version += 1
+
+            documento = Documento(
+                tramite=tramite,
+                nombre=plantilla.tipo_especifico,  # El nombre del documento es el tipo de trámite
+                version=nueva_version,
+                **campos
+            )
+
+            try:
+                # Storage local: publicar el temporal con un rename atómico
+                ruta_final = storage.path(ruta_archivo)
+                permisos = getattr(storage, 'file_permissions_mode', None)
+                if permisos is not None:
+                    os.chmod(ruta_temporal, permisos)  # mkstemp crea el archivo con 0600
+                os.replace(ruta_temporal, ruta_final)
+            except NotImplementedError:
+                # Storage remoto: Django lo sube por bloques desde el archivo temporal
+                with open(ruta_temporal, 'rb') as pdf_file:
+                    ruta_archivo = storage.save(ruta_archivo, File(pdf_file))
+
+            # El archivo ya está en su ruta final: solo se registra su nombre
+            documento.archivo.name = ruta_archivo
+            documento.save()
+    finally:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+
+    logger.info("Documento generado: %s", ruta_archivo)
+    return documento
+
+
+def iniciar_nuevo_tramite(solicitante, plantilla: PlantillaDocumento, form_data: dict,
+                          generar_documento: bool = True, asincrono: bool = None):
     """
     Orquesta la creación de un nuevo trámite, su documento PDF inicial y las entradas en la BD.
     ASIGNA AUTOMÁTICAMENTE un tramitador disponible al trámite.
@@ -193,98 +322,111 @@ def iniciar_nuevo_tramite(solicitante, plantilla: PlantillaDocumento, form_data:
     media/solicitante/solicitante_0001/[segmento]/[tipo_tramite]_v1.pdf
 
     El PDF se genera rellenando la plantilla original con los datos del formulario.
+    En modo asíncrono el trámite se confirma de inmediato con estado_documento='PENDIENTE'
+    y el PDF se genera en el worker de documentos después del commit.
 
     Args:
         solicitante: Usuario solicitante (propietario del trámite)
         plantilla: PlantillaDocumento a usar
         form_data: Datos del formulario enviados por el usuario
+        generar_documento: Si es False no se genera PDF (el solicitante sube sus propios archivos)
+        asincrono: Generar el PDF en segundo plano. None = settings.TRAMITE_DOCUMENTO_ASINCRONO
 
     Returns:
         Tramite creado
+
+    Raises:
+        SegmentoOcupadoError: Si el solicitante ya tiene un trámite activo en el segmento
     """
+    if asincrono is None:
+        asincrono = getattr(settings, 'TRAMITE_DOCUMENTO_ASINCRONO', False)
+    diferido = generar_documento and asincrono
+
     # 1. Validar y limpiar datos del formulario
     # Si form_data está vacío (flujo de subida de PDF), no validamos campos requeridos
     if form_data:
-        datos_limpios = TramiteDataService.validar_datos_formulario(form_data, plantilla)
+        with medir_etapa('validar'):
+            datos_limpios = TramiteDataService.validar_datos_formulario(form_data, plantilla)
     else:
         datos_limpios = {}
 
     # 2. Crear el Trámite en la base de datos con los datos validados
+    # El índice único parcial garantiza un solo trámite activo por segmento aunque lleguen
+    # dos peticiones a la vez; el savepoint deja usable la transacción del llamador
     fecha_limite = timezone.now() + timedelta(days=90)  # Fecha límite por defecto de 90 días
-    tramite = Tramite.objects.create(
-        solicitante=solicitante,
-        nombre=plantilla.tipo_especifico,  # El nombre del trámite es el tipo de la plantilla
-        estado='PENDIENTE',  # Estado inicial: Pendiente de aprobación
-        fecha_limite=fecha_limite,
-        datos_formulario=datos_limpios  # Guardar los datos validados en el campo JSON
-    )
-    
-    # Asignar la plantilla al trámite (temporalmente como atributo para _generar_ruta_archivo)
-    tramite.plantilla = plantilla
+    try:
+        with transaction.atomic():
+            tramite = Tramite.objects.create(
+                solicitante=solicitante,
+                nombre=plantilla.tipo_especifico,  # El nombre del trámite es el tipo de la plantilla
+                estado='PENDIENTE',  # Estado inicial: Pendiente de aprobación
+                fecha_limite=fecha_limite,
+                datos_formulario=datos_limpios,  # Guardar los datos validados en el campo JSON
+                estado_documento='PENDIENTE' if diferido else 'LISTO',
+                estado_documento_desde=timezone.now(),
+                plantilla=plantilla,
+                segmento=plantilla.segmento,  # Desnormalizado para el bloqueo por segmento
+            )
+    except IntegrityError:
+        raise SegmentoOcupadoError(
+            f"Ya tienes un trámite en curso en el segmento '{plantilla.segmento}'."
+        )
 
-    print(f"✅ Trámite #{tramite.id} creado para solicitante #{solicitante.id}")
-    print(f"📋 Datos guardados: {len(datos_limpios)} campos")
+    logger.info("Trámite #%s creado para solicitante #%s (%d campos)", tramite.id, solicitante.id, len(datos_limpios))
 
     # 3. ASIGNAR TRAMITADOR AUTOMÁTICAMENTE (NUEVO)
-    asignado = AsignacionTramitadorService.asignar_tramitador_a_tramite(tramite)
-    if asignado:
-        print(f"👤 Tramitador asignado: {tramite.tramitador_asignado.email}")
-    else:
-        print("⚠️ No se pudo asignar tramitador (no hay tramitadores disponibles)")
+    if not AsignacionTramitadorService.asignar_tramitador_a_tramite(tramite):
+        logger.warning("No se pudo asignar tramitador al trámite #%s (no hay tramitadores disponibles; "
+                       "lo asignará el comando asignar_tramites_pendientes)", tramite.id)
 
-    # 4. Rellenar el PDF de la plantilla con los datos del formulario
-    pdf_buffer = _rellenar_pdf_plantilla(plantilla, datos_limpios)
+    if not generar_documento:
+        return tramite
 
-    # 5. Definir el nombre base del archivo
-    tipo_limpio = plantilla.tipo_especifico.lower().replace(' ', '_')
-    nombre_base = f"{tipo_limpio}.pdf"
-
-    # 6. Crear el objeto Documento y guardar el archivo
-    # Usamos transacción para asegurar consistencia en la versión
-    with transaction.atomic():
-        # Bloquear registros para evitar condiciones de carrera en la versión
-        # Aunque es el primer documento, es buena práctica si hubiera reintentos rápidos
-        last_doc = Documento.objects.select_for_update().filter(
-            tramite=tramite, 
-            nombre=plantilla.tipo_especifico
-        ).order_by('-version').first()
-        
-        version_actual = (last_doc.version + 1) if last_doc else 1
-
-        # Verificar existencia física para evitar colisiones y sufijos aleatorios
-        while True:
-            ruta_archivo = _generar_ruta_archivo(tramite, plantilla.tipo_especifico, version_actual, nombre_base)
-            if not default_storage.exists(ruta_archivo):
-                break
-            version_actual += 1
-
-        documento = Documento(
-            tramite=tramite,
-            nombre=plantilla.tipo_especifico,  # El nombre del documento es el tipo de trámite
-            version=version_actual
-        )
-        
-        # Envolvemos el PDF en memoria para que Django lo pueda guardar
-        archivo_django = SimpleUploadedFile(nombre_base, pdf_buffer.read(), content_type='application/pdf')
-        
-        # Guardar usando la ruta explícita para evitar hash aleatorio
-        # NOTA: Al usar upload_to dinámico en el modelo, save() usará esa función.
-        # Pero si pasamos el nombre aquí, Django podría usarlo.
-        # Sin embargo, el modelo Documento ahora tiene upload_to=documento_upload_to.
-        # Si pasamos solo el archivo, Django usará la función del modelo.
-        # Pero aquí queremos forzar el nombre que ya calculamos para asegurar consistencia.
-        # La función del modelo recalculará lo mismo.
-        
-        # Para evitar duplicidad de lógica, confiamos en el modelo, pero le pasamos el nombre correcto al archivo
-        archivo_django.name = os.path.basename(ruta_archivo)
-        documento.archivo = archivo_django
-        documento.save()
-
-    print(f"📄 Documento generado: {ruta_archivo}")
+    if diferido:
+        # 4. Delegar el PDF y el versionado del Documento al worker (tras el commit)
+        encolar_generacion_documento(tramite.id)
+        logger.debug("Documento del trámite #%s en cola de generación", tramite.id)
+        return tramite
+
+    # 4. Rellenar el PDF de la plantilla (pool de renderizado) y guardarlo como Documento
+    _guardar_nueva_version_documento(tramite, plantilla, datos_limpios)
 
     return tramite
 
 
+def generar_documento_tramite(tramite_id: int):
+    """
+    Genera el PDF diferido de un trámite y crea su versión de Documento.
+    La ejecuta el worker de documentos; actualiza estado_documento en cada etapa.
+
+    El trabajo se reclama pasando de PENDIENTE a GENERANDO con un UPDATE condicionado:
+    si el trámite ya no está PENDIENTE (lo generó otro worker o el comando
+    recuperar_trabajos_pendientes) no se hace nada.
+
+    Args:
+        tramite_id: ID del trámite con estado_documento='PENDIENTE'
+    """
+    if not Tramite.objects.filter(id=tramite_id, estado_documento='PENDIENTE').update(
+        estado_documento='GENERANDO', estado_documento_desde=timezone.now()
+    ):
+        logger.info("El documento del trámite #%s ya no está pendiente; se omite", tramite_id)
+        return
+
+    try:
+        tramite = Tramite.objects.select_related('solicitante', 'plantilla').get(id=tramite_id)
+        plantilla = tramite.obtener_plantilla_vigente()
+        if plantilla is None:
+            raise ValidationError(f"No se encontró plantilla activa para el trámite '{tramite.nombre}'")
+
+        _guardar_nueva_version_documento(tramite, plantilla, tramite.datos_formulario)
+    except Exception as e:
+        logger.error("Error al generar el documento del trámite #%s: %s", tramite_id, e)
+        Tramite.objects.filter(id=tramite_id).update(estado_documento='ERROR', estado_documento_desde=timezone.now())
+        raise
+
+    Tramite.objects.filter(id=tramite_id).update(estado_documento='LISTO', estado_documento_desde=timezone.now())
+
+
 def actualizar_datos_tramite(tramite_id: int, solicitante, form_data: dict):
     """
     Actualiza los datos de un trámite existente y regenera el PDF.
@@ -302,55 +444,25 @@ def actualizar_datos_tramite(tramite_id: int, solicitante, form_data: dict):
         PermissionDenied: Si el usuario no es el propietario
         ValidationError: Si los datos no son válidos
     """
+    # Huella de los datos vigentes, para no versionar un documento idéntico
+    datos_previos = Tramite.objects.filter(id=tramite_id).values_list('datos_formulario', flat=True).first()
+
     # 1. Guardar datos de forma segura (valida propiedad automáticamente)
-    tramite = TramiteDataService.guardar_datos_formulario(tramite_id, solicitante, form_data)
-
-    print(f"✅ Trámite #{tramite.id} actualizado para solicitante #{solicitante.id}")
-    print(f"📋 Datos actualizados: {len(tramite.datos_formulario)} campos")
-
-    # 2. Obtener la plantilla asociada
-    plantilla = PlantillaDocumento.objects.get(tipo_especifico=tramite.nombre, activo=True)
-    tramite.plantilla = plantilla # Asignar para _generar_ruta_archivo
-
-    # 3. Regenerar el PDF con los nuevos datos
-    pdf_buffer = _rellenar_pdf_plantilla(plantilla, tramite.datos_formulario)
-
-    # 4. Crear nueva versión del documento de forma segura
-    with transaction.atomic():
-        # Bloquear para obtener la última versión real y evitar condiciones de carrera
-        ultimo_documento = Documento.objects.select_for_update().filter(
-            tramite=tramite,
-            nombre=plantilla.tipo_especifico
-        ).order_by('-version').first()
-        
-        nueva_version = (ultimo_documento.version + 1) if ultimo_documento else 1
-
-        # 5. Definir el nombre base del archivo
-        tipo_limpio = plantilla.tipo_especifico.lower().replace(' ', '_')
-        nombre_base = f"{tipo_limpio}.pdf"
-        
-        # Verificar existencia física para evitar colisiones y sufijos aleatorios
-        while True:
-            ruta_archivo = _generar_ruta_archivo(tramite, plantilla.tipo_especifico, nueva_version, nombre_base)
-            if not default_storage.exists(ruta_archivo):
-                break
-            nueva_version += 1
-
-        # 6. Crear el nuevo documento con la nueva versión
-        documento = Documento(
-            tramite=tramite,
-            nombre=plantilla.tipo_especifico,
-            version=nueva_version
-        )
+    with medir_etapa('validar'):
+        tramite = TramiteDataService.guardar_datos_formulario(tramite_id, solicitante, form_data)
+
+    logger.info("Trámite #%s actualizado para solicitante #%s (%d campos)", tramite.id, solicitante.id, len(tramite.datos_formulario))
+
+    # 2. Plantilla asociada (ya cargada y validada al guardar los datos)
+    plantilla = tramite.plantilla
 
-        archivo_django = SimpleUploadedFile(nombre_base, pdf_buffer.read(), content_type='application/pdf')
-        
-        # Para evitar duplicidad de lógica, confiamos en el modelo, pero le pasamos el nombre correcto al archivo
-        archivo_django.name = os.path.basename(ruta_archivo)
-        documento.archivo = archivo_django
-        documento.save()
+    datos_sin_cambios = calcular_huella_datos(datos_previos) == calcular_huella_datos(tramite.datos_formulario)
+    if datos_sin_cambios and Documento.objects.filter(tramite=tramite, nombre=plantilla.tipo_especifico).exists():
+        logger.debug("Datos sin cambios: se conserva la versión actual del documento del trámite #%s", tramite.id)
+        return tramite
 
-    print(f"📄 Documento actualizado: {ruta_archivo}")
+    # 3. Crear la nueva versión del documento
+    _guardar_nueva_version_documento(tramite, plantilla, tramite.datos_formulario)
 
     return tramite
 
@@ -374,9 +486,11 @@ def generar_pdf_desde_tramite(tramite_id: int, solicitante_id: int) -> io.BytesI
     tramite = TramiteDataService.obtener_tramite_con_datos(tramite_id, solicitante_id)
 
     # Obtener la plantilla asociada
-    plantilla = PlantillaDocumento.objects.get(tipo_especifico=tramite.nombre, activo=True)
+    plantilla = tramite.obtener_plantilla_vigente()
+    if plantilla is None:
+        raise ValidationError(f"No se encontró plantilla activa para el trámite '{tramite.nombre}'")
 
-    # Generar el PDF con los datos guardados
-    pdf_buffer = _rellenar_pdf_plantilla(plantilla, tramite.datos_formulario)
+    # Generar el PDF con los datos guardados (pool de renderizado)
+    pdf_buffer = renderizar_pdf(plantilla, tramite.datos_formulario)
 
     return pdf_buffer
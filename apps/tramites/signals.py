@@ -0,0 +1,100 @@
+"""
+Señales de la app de trámites.
+"""
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CampoPlantilla, PlantillaDocumento, Tramite
+from .services.esquema_formulario import invalidar_esquema_formulario
+from .services.menu_plantillas import invalidar_catalogo, invalidar_segmentos_bloqueados
+from .services.asignacion_service import invalidar_roster_tramitadores, obtener_roster_tramitadores
+from .services.estadisticas_tramitadores import registrar_cambio_tramite
+
+
+@receiver([post_save, post_delete], sender=CampoPlantilla)
+def invalidar_esquema_por_campo(sender, instance, **kwargs):
+    """
+    Cualquier alta, cambio o baja de un campo invalida el esquema compilado de su plantilla.
+    """
+    invalidar_esquema_formulario(instance.plantilla_id)
+
+
+@receiver([post_save, post_delete], sender=PlantillaDocumento)
+def invalidar_esquema_por_plantilla(sender, instance, **kwargs):
+    invalidar_esquema_formulario(instance.id)
+    invalidar_catalogo()
+
+
+@receiver([post_save, post_delete], sender=Tramite)
+def invalidar_segmentos_por_tramite(sender, instance, **kwargs):
+    """
+    Un trámite creado, que cambia de estado o se borra puede (des)bloquear un segmento de su solicitante.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not {'estado', 'segmento'} & set(update_fields):
+        return
+    invalidar_segmentos_bloqueados(instance.solicitante_id)
+
+
+@receiver(post_save, sender=Tramite)
+def actualizar_contadores_por_tramite(sender, instance, created, **kwargs):
+    """
+    Mantiene los contadores por tramitador (CargaTramitador, EstadisticaTramitador) al crear,
+    asignar, reasignar o cambiar de estado un trámite.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and not {'estado', 'tramitador_asignado'} & set(update_fields):
+        return
+    actual = (instance.estado, instance.tramitador_asignado_id)
+    if created:
+        anterior = (None, None)
+    else:
+        # Un campo no leído de la BD (only/defer) no ha cambiado si no está en update_fields
+        originales = getattr(instance, '_valores_carga', {})
+        anterior = (originales.get('estado', actual[0]), originales.get('tramitador_asignado_id', actual[1]))
+    registrar_cambio_tramite(anterior, actual)
+    instance._valores_carga = {'estado': actual[0], 'tramitador_asignado_id': actual[1]}
+
+
+@receiver(post_delete, sender=Tramite)
+def descontar_tramite_borrado(sender, instance, **kwargs):
+    registrar_cambio_tramite((instance.estado, instance.tramitador_asignado_id), (None, None))
+
+
+@receiver(post_save, sender=PlantillaDocumento)
+def propagar_segmento_plantilla(sender, instance, created, **kwargs):
+    """
+    Mantiene el segmento desnormalizado de los trámites si el administrador cambia el de la plantilla.
+    Solo actúa si el segmento cambió respecto al leído de la BD; el admin rechaza antes el cambio
+    si chocaría con el índice único (PlantillaDocumento.clean).
+    """
+    if not created and instance.segmento_cambiado:
+        afectados = Tramite.objects.filter(plantilla=instance).exclude(segmento=instance.segmento)
+        solicitantes = set(afectados.values_list('solicitante_id', flat=True))
+        try:
+            with transaction.atomic():
+                afectados.update(segmento=instance.segmento)
+        except IntegrityError:
+            raise ValidationError(
+                f"No se puede mover la plantilla #{instance.id} al segmento '{instance.segmento}': "
+                "algún solicitante ya tiene un trámite en curso en ese segmento."
+            )
+        # update() no emite señales: (des)bloquea el segmento en el menú de cada solicitante
+        for solicitante_id in solicitantes:
+            invalidar_segmentos_bloqueados(solicitante_id)
+    instance._segmento_original = instance.segmento
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def invalidar_roster_por_usuario(sender, instance, **kwargs):
+    """
+    Altas, bajas, cambios de rol o activación de tramitadores cambian la lista del modo 'contador'.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and set(update_fields) <= {'last_login', 'password'}:
+        return
+    if instance.rol == 'TRAMITADOR' or instance.id in obtener_roster_tramitadores():
+        invalidar_roster_tramitadores()
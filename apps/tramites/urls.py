@@ -3,10 +3,12 @@ from .views import (
     GenerarFormularioPlantillaView, 
     IniciarTramiteView, 
     ActualizarTramiteView,
+    EstadoDocumentoTramiteView,
     DetalleTramiteSolicitanteView,
     DescargarPlantillaView,
     VisualizarPDFSolicitanteView,
-    VisualizarDocumentoEspecificoView
+    VisualizarDocumentoEspecificoView,
+    MetricasServicioView
 )
 
 app_name = 'tramites'
@@ -15,8 +17,10 @@ urlpatterns = [
     path('generar-formulario/<int:plantilla_id>/', GenerarFormularioPlantillaView.as_view(), name='generar_formulario_plantilla'),
     path('iniciar-tramite/<int:plantilla_id>/', IniciarTramiteView.as_view(), name='iniciar_tramite'),
     path('actualizar-tramite/<int:tramite_id>/', ActualizarTramiteView.as_view(), name='actualizar_tramite'),
+    path('estado-documento/<int:tramite_id>/', EstadoDocumentoTramiteView.as_view(), name='estado_documento'),
     path('detalle/<int:tramite_id>/', DetalleTramiteSolicitanteView.as_view(), name='detalle_tramite'),
     path('descargar-plantilla/<int:tramite_id>/', DescargarPlantillaView.as_view(), name='descargar_plantilla'),
     path('tramite/<int:tramite_id>/pdf/', VisualizarPDFSolicitanteView.as_view(), name='visualizar-pdf'),
     path('documento/<int:documento_id>/ver/', VisualizarDocumentoEspecificoView.as_view(), name='visualizar-documento'),
+    path('metricas/', MetricasServicioView.as_view(), name='metricas_servicio'),
 ]
@@ -5,14 +5,20 @@ from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.urls import reverse
-from django.core.exceptions import PermissionDenied
-from collections import defaultdict
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.utils.cache import get_conditional_response
 
 from .models import PlantillaDocumento, CampoPlantilla, Tramite, Documento, HistorialCambios
-from .services import iniciar_nuevo_tramite, actualizar_datos_tramite, TramiteDataService
+from .services import iniciar_nuevo_tramite, actualizar_datos_tramite, TramiteDataService, SegmentoOcupadoError
 from .services.storage_service import guardar_documento
+from .services.instrumentacion import exportar_prometheus, volcar_histogramas
+from .services.esquema_formulario import obtener_esquema_formulario
+from .services.fragmento_formulario import etag_formulario, renderizar_formulario
+from .services.menu_plantillas import construir_menu_plantillas
 from .forms import SubirDocumentoForm
 
+MENSAJE_SEGMENTO_OCUPADO = 'No puedes iniciar este trámite porque ya tienes uno en curso en el mismo segmento.'
+
 class GenerarFormularioPlantillaView(LoginRequiredMixin, View):
     """
     Vista que genera y devuelve un formulario HTML dinámicamente
@@ -22,28 +28,13 @@ class GenerarFormularioPlantillaView(LoginRequiredMixin, View):
         plantilla = get_object_or_404(PlantillaDocumento, id=plantilla_id, activo=True)
         
         # Validación de bloqueo de segmento
-        # Verificar si el usuario ya tiene un trámite activo en este segmento
-        estados_activos = ['PENDIENTE', 'EN_PROCESO', 'RETRASADO']
-        
-        # Buscar trámites activos del usuario
-        tramites_activos = Tramite.objects.filter(
+        # Una sola búsqueda en el índice único parcial de trámites activos por segmento
+        segmento_bloqueado = Tramite.objects.filter(
             solicitante=request.user,
-            estado__in=estados_activos
-        )
-        
-        # Verificar si alguno pertenece al mismo segmento que la plantilla solicitada
-        # Necesitamos saber el segmento de los trámites activos.
-        # Podemos hacerlo buscando las plantillas correspondientes a esos trámites.
-        
-        segmento_bloqueado = False
-        for tramite in tramites_activos:
-            # Intentar encontrar la plantilla del trámite activo para saber su segmento
-            # Asumimos que tramite.nombre coincide con plantilla.tipo_especifico
-            plantilla_tramite = PlantillaDocumento.objects.filter(tipo_especifico=tramite.nombre).first()
-            if plantilla_tramite and plantilla_tramite.segmento == plantilla.segmento:
-                segmento_bloqueado = True
-                break
-        
+            estado__in=Tramite.ESTADOS_ACTIVOS,
+            segmento=plantilla.segmento
+        ).exists()
+
         if segmento_bloqueado:
              # Si es una petición AJAX, devolver error JSON, si no, redirigir
              if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -53,18 +44,21 @@ class GenerarFormularioPlantillaView(LoginRequiredMixin, View):
                  return redirect('usuarios:dashboard-solicitante')
 
         
-        # Agrupar campos por sección
-        campos_por_seccion = defaultdict(list)
-        for campo in plantilla.campos.all().order_by('seccion', 'orden'):
-            campos_por_seccion[campo.seccion].append(campo)
-
-        form_html = render_to_string('tramites/formulario_dinamico.html', {
-            'plantilla': plantilla,
-            'campos_por_seccion': dict(campos_por_seccion), # Pasar el diccionario agrupado
-            'user': request.user
-        }, request=request)
-
-        return JsonResponse({'form_html': form_html, 'plantilla_nombre': plantilla.nombre})
+        # El fragmento se renderiza una vez por versión de la plantilla; la ETag permite
+        # responder 304 si el navegador ya tiene esta versión con el mismo token CSRF
+        etag = etag_formulario(request, plantilla)
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            # Con la ETag en el 304 NoCacheMiddleware mantiene 'private, no-cache' (no 'no-store')
+            # y el navegador conserva el formulario para la siguiente revalidación
+            no_modificado['ETag'] = etag
+            return no_modificado
+
+        form_html = renderizar_formulario(request, plantilla)
+
+        response = JsonResponse({'form_html': form_html, 'plantilla_nombre': plantilla.nombre})
+        response['ETag'] = etag
+        return response
 
 
 class IniciarTramiteView(LoginRequiredMixin, View):
@@ -79,18 +73,14 @@ class IniciarTramiteView(LoginRequiredMixin, View):
         plantilla = get_object_or_404(PlantillaDocumento, id=plantilla_id, activo=True)
         
         # Validación de bloqueo de segmento (Backend Check)
-        estados_activos = ['PENDIENTE', 'EN_PROCESO', 'RETRASADO']
-        tramites_activos = Tramite.objects.filter(
+        # Aviso temprano antes de leer los archivos; la garantía la da el índice único al crear
+        if Tramite.objects.filter(
             solicitante=request.user,
-            estado__in=estados_activos
-        )
-        
-        for tramite in tramites_activos:
-            plantilla_tramite = PlantillaDocumento.objects.filter(tipo_especifico=tramite.nombre).first()
-            if plantilla_tramite and plantilla_tramite.segmento == plantilla.segmento:
-                messages.error(request, 'No puedes iniciar este trámite porque ya tienes uno en curso en el mismo segmento.')
-                return redirect(reverse('usuarios:dashboard-solicitante'))
-
+            estado__in=Tramite.ESTADOS_ACTIVOS,
+            segmento=plantilla.segmento
+        ).exists():
+            messages.error(request, MENSAJE_SEGMENTO_OCUPADO)
+            return redirect(reverse('usuarios:dashboard-solicitante'))
 
         # En este flujo modificado, el formulario de inicio de trámite es en realidad
         # la subida del primer documento (plantilla llenada).
@@ -102,10 +92,8 @@ class IniciarTramiteView(LoginRequiredMixin, View):
 
             if archivos:
                 try:
-                    nuevo_tramite = iniciar_nuevo_tramite(request.user, plantilla, {})
-                    doc_generado = Documento.objects.filter(tramite=nuevo_tramite).first()
-                    if doc_generado:
-                        doc_generado.delete()
+                    # Los documentos del trámite son los PDF subidos: no se genera uno desde la plantilla
+                    nuevo_tramite = iniciar_nuevo_tramite(request.user, plantilla, {}, generar_documento=False)
 
                     documentos_guardados = 0
 
@@ -115,13 +103,38 @@ class IniciarTramiteView(LoginRequiredMixin, View):
 
                     return redirect(reverse('usuarios:dashboard-solicitante'))
 
+                except SegmentoOcupadoError:
+                    # Otra petición concurrente creó el trámite del segmento primero
+                    messages.error(request, MENSAJE_SEGMENTO_OCUPADO)
+                    return redirect(reverse('usuarios:dashboard-solicitante'))
                 except Exception as e:
                     messages.error(request, f"Error al iniciar el trámite: {e}")
                     return redirect(reverse('usuarios:dashboard-solicitante'))
-            else:
-                messages.error(request, "Debe seleccionar al menos un archivo PDF.")
+
+            # Sin archivos: formulario en línea; el PDF se genera desde la plantilla
+            # (en el worker de documentos si TRAMITE_DOCUMENTO_ASINCRONO está activo)
+            form_data = {
+                key: value for key, value in request.POST.items() if key != 'csrfmiddlewaretoken'
+            }
+            if not form_data:
+                messages.error(request, "Debe seleccionar al menos un archivo PDF o completar el formulario.")
                 return redirect(reverse('usuarios:dashboard-solicitante'))
 
+            try:
+                nuevo_tramite = iniciar_nuevo_tramite(request.user, plantilla, form_data)
+                if nuevo_tramite.estado_documento == 'PENDIENTE':
+                    messages.success(request, f"Trámite '{nuevo_tramite.nombre}' iniciado. El documento se está generando.")
+                else:
+                    messages.success(request, f"Trámite '{nuevo_tramite.nombre}' iniciado con éxito.")
+            except SegmentoOcupadoError:
+                messages.error(request, MENSAJE_SEGMENTO_OCUPADO)
+            except ValidationError as e:
+                for mensaje in e.messages:
+                    messages.error(request, mensaje)
+            except Exception as e:
+                messages.error(request, f"Error al iniciar el trámite: {e}")
+            return redirect(reverse('usuarios:dashboard-solicitante'))
+
 
 class ActualizarTramiteView(LoginRequiredMixin, View):
     """
@@ -136,17 +149,17 @@ class ActualizarTramiteView(LoginRequiredMixin, View):
         try:
             datos_actuales = TramiteDataService.obtener_datos_tramite(tramite_id, request.user)
 
-            tramite = Tramite.objects.get(id=tramite_id)
-            plantilla = PlantillaDocumento.objects.get(tipo_especifico=tramite.nombre, activo=True)
+            tramite = Tramite.objects.select_related('plantilla').get(id=tramite_id)
+            plantilla = tramite.obtener_plantilla_vigente()
+            if plantilla is None:
+                raise ValidationError(f"No hay plantilla activa para el trámite '{tramite.nombre}'")
             
-            # Agrupar campos por sección para la edición
-            campos_por_seccion = defaultdict(list)
-            for campo in plantilla.campos.all().order_by('seccion', 'orden'):
-                campos_por_seccion[campo.seccion].append(campo)
+            # Campos agrupados por sección para la edición, desde el esquema compilado
+            esquema = obtener_esquema_formulario(plantilla)
 
             form_html = render_to_string('tramites/formulario_dinamico.html', {
                 'plantilla': plantilla,
-                'campos_por_seccion': dict(campos_por_seccion), # Pasar el diccionario agrupado
+                'campos_por_seccion': esquema.campos_por_seccion,
                 'datos_actuales': datos_actuales,
                 'tramite_id': tramite_id,
                 'user': request.user
@@ -177,10 +190,27 @@ class ActualizarTramiteView(LoginRequiredMixin, View):
         except PermissionDenied as e:
             messages.error(request, f"Permiso denegado: {e}")
             return redirect(reverse('usuarios:dashboard-solicitante'))
+        except ValidationError as e:
+            for mensaje in e.messages:
+                messages.error(request, mensaje)
+            return redirect(reverse('usuarios:dashboard-solicitante'))
         except Exception as e:
             messages.error(request, f"Error al actualizar el trámite: {e}")
             return redirect(reverse('usuarios:dashboard-solicitante'))
 
+class EstadoDocumentoTramiteView(LoginRequiredMixin, View):
+    """
+    Devuelve en JSON el estado de la generación diferida del documento de un trámite.
+    El dashboard del solicitante la consulta periódicamente para mostrar el progreso.
+    """
+    def get(self, request, tramite_id):
+        tramite = get_object_or_404(Tramite, id=tramite_id, solicitante=request.user)
+        return JsonResponse({
+            'tramite_id': tramite.id,
+            'estado_documento': tramite.estado_documento,
+            'estado_documento_display': tramite.get_estado_documento_display(),
+        })
+
 class DetalleTramiteSolicitanteView(LoginRequiredMixin, View):
     """
     Vista para que el solicitante vea el detalle de su trámite, descargue la plantilla y suba el PDF llenado.
@@ -212,11 +242,7 @@ class DetalleTramiteSolicitanteView(LoginRequiredMixin, View):
         ).select_related('tramite').order_by('-fecha_subida')
         
         # Intentar obtener la plantilla asociada (usando el trámite más reciente o el actual)
-        plantilla = None
-        try:
-            plantilla = PlantillaDocumento.objects.filter(tipo_especifico=tramite_actual.nombre, activo=True).first()
-        except Exception:
-            pass
+        plantilla = tramite_actual.obtener_plantilla_vigente()
 
         # Formulario para subir documento (se asocia al trámite actual/más reciente activo)
         # Si el trámite actual está finalizado, quizás deberíamos bloquear la subida o crear uno nuevo,
@@ -234,39 +260,12 @@ class DetalleTramiteSolicitanteView(LoginRequiredMixin, View):
         # Esto significa que NUNCA se debe mostrar la gestión de documentos en esta vista.
         mostrar_gestion_documentos = False
 
-        # --- Logic added to populate the sidebar (same as Dashboard) ---
-        # 1. Get all tramites for the user to calculate status/menu
-        all_tramites = Tramite.objects.filter(solicitante=request.user).order_by('-fecha_inicio')
-        
-        # 2. Identify blocked segments
-        estados_activos = ['PENDIENTE', 'EN_PROCESO', 'RETRASADO']
-        segmentos_bloqueados = set()
-        plantillas_all = PlantillaDocumento.objects.all()
-        mapa_tramite_segmento = {p.tipo_especifico: p.segmento for p in plantillas_all}
-        
-        for t in all_tramites:
-            if t.estado in estados_activos:
-                segmento = mapa_tramite_segmento.get(t.nombre)
-                if segmento:
-                    segmentos_bloqueados.add(segmento)
-
-        # 3. Build the menu
-        plantillas_activas = PlantillaDocumento.objects.filter(activo=True).order_by('segmento', 'tipo_especifico')
-        menu_plantillas = defaultdict(list)
-        tipos_vistos = set()
-
-        for p in plantillas_activas:
-            if p.tipo_especifico not in tipos_vistos:
-                bloqueado = p.segmento in segmentos_bloqueados
-                menu_plantillas[p.segmento].append({
-                    'id': p.id,
-                    'tipo': p.tipo_especifico,
-                    'bloqueado': bloqueado
-                })
-                tipos_vistos.add(p.tipo_especifico)
-
-        # 4. Get recent tramite for the spinner
-        tramite_reciente = all_tramites.first()
+        # --- Sidebar (same as Dashboard) ---
+        # Cached template catalog + the user's blocked segments
+        menu_plantillas, _ = construir_menu_plantillas(request.user)
+
+        # Recent tramite for the spinner
+        tramite_reciente = Tramite.objects.filter(solicitante=request.user).order_by('-fecha_inicio').first()
         # ---------------------------------------------------------------
 
         context = {
@@ -277,7 +276,7 @@ class DetalleTramiteSolicitanteView(LoginRequiredMixin, View):
             'plantilla': plantilla,
             'form': form,
             'mostrar_gestion_documentos': mostrar_gestion_documentos,
-            'menu_plantillas': dict(menu_plantillas),
+            'menu_plantillas': menu_plantillas,
             'tramite_reciente': tramite_reciente,
         }
         return render(request, 'tramites/detalle_tramite_solicitante.html', context)
@@ -288,14 +287,6 @@ class DetalleTramiteSolicitanteView(LoginRequiredMixin, View):
             return redirect(reverse('usuarios:login'))
 
         tramite = get_object_or_404(Tramite, id=tramite_id, solicitante=request.user)
-        
-        # Intentar obtener la plantilla asociada para pasarla al storage service
-        try:
-            plantilla = PlantillaDocumento.objects.filter(tipo_especifico=tramite.nombre, activo=True).first()
-            if plantilla:
-                tramite.plantilla = plantilla
-        except Exception:
-            pass
 
         form = SubirDocumentoForm(request.POST, request.FILES)
 
@@ -330,8 +321,10 @@ class DescargarPlantillaView(LoginRequiredMixin, View):
         if request.user.rol != 'SOLICITANTE':
             raise PermissionDenied("Solo solicitantes.")
 
-        tramite = get_object_or_404(Tramite, id=tramite_id, solicitante=request.user)
-        plantilla = get_object_or_404(PlantillaDocumento, tipo_especifico=tramite.nombre, activo=True)
+        tramite = get_object_or_404(Tramite.objects.select_related('plantilla'), id=tramite_id, solicitante=request.user)
+        plantilla = tramite.obtener_plantilla_vigente()
+        if plantilla is None:
+            raise Http404("No hay plantilla activa para este trámite.")
 
         if not plantilla.archivo_base:
             messages.error(request, "No hay archivo base para esta plantilla.")
@@ -393,3 +386,18 @@ class VisualizarDocumentoEspecificoView(LoginRequiredMixin, View):
             )
         except Exception as e:
             raise Http404(f"Error al abrir el documento: {e}")
+
+class MetricasServicioView(LoginRequiredMixin, View):
+    """
+    Expone los histogramas de tiempos por etapa de este proceso.
+    Por defecto en formato de texto de Prometheus (con los contadores de las cachés de PDF);
+    con ?formato=json como diccionario.
+    Solo para administradores.
+    """
+    def get(self, request):
+        if request.user.rol != 'ADMINISTRADOR':
+            raise PermissionDenied("Acceso denegado.")
+
+        if request.GET.get('formato') == 'json':
+            return JsonResponse(volcar_histogramas())
+        return HttpResponse(exportar_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
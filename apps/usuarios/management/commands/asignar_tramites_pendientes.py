@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.tramites.services.asignacion_service import AsignacionTramitadorService, TAMANO_LOTE_ASIGNACION
+
+
+class Command(BaseCommand):
+    help = (
+        'Asigna en bloque, con la estrategia configurada, los trámites activos sin tramitador '
+        '(por ejemplo, los creados mientras no había tramitadores activos).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=TAMANO_LOTE_ASIGNACION,
+            help=f'Trámites por transacción (default: {TAMANO_LOTE_ASIGNACION})'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor que 0")
+
+        inicio = time.monotonic()
+        asignados = AsignacionTramitadorService.asignar_tramites_sin_tramitador(tamano_lote=options['lote'])
+        duracion = time.monotonic() - inicio
+
+        if asignados:
+            self.stdout.write(self.style.SUCCESS(f"{asignados} trámites asignados en {duracion:.1f}s"))
+        else:
+            self.stdout.write(self.style.WARNING("No se asignó ningún trámite (no hay pendientes o no hay tramitadores activos)"))
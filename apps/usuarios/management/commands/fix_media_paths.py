@@ -2,7 +2,7 @@ import os
 import shutil
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from apps.tramites.models import Documento, PlantillaDocumento
+from apps.tramites.models import Documento, carpeta_segmento
 
 class Command(BaseCommand):
     help = 'Corrige las rutas de los archivos en media/ para seguir el patrón solicitante/solicitante_<id>/'
@@ -36,19 +36,8 @@ class Command(BaseCommand):
                 # Extraer nombre de archivo
                 filename = os.path.basename(old_path)
                 
-                # Determinar segmento de forma robusta
-                segmento = 'general'
-                try:
-                    # Intentar buscar la plantilla asociada al trámite por nombre
-                    plantilla = PlantillaDocumento.objects.filter(tipo_especifico=doc.tramite.nombre).first()
-                    if plantilla:
-                        segmento = plantilla.segmento.lower().replace(' ', '_')
-                    elif hasattr(doc.tramite, 'nombre'):
-                         segmento = doc.tramite.nombre.split()[0].lower()
-                except Exception:
-                    # Fallback si falla la consulta
-                    if hasattr(doc.tramite, 'nombre'):
-                         segmento = doc.tramite.nombre.split()[0].lower()
+                # Segmento desnormalizado del trámite (mismo criterio que documento_upload_to)
+                segmento = carpeta_segmento(doc.tramite)
                 
                 new_relative_path = f"{expected_prefix}{segmento}/{filename}"
                 
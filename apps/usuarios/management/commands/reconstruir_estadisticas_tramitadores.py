@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.tramites.services.estadisticas_tramitadores import reconstruir_estadisticas
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula desde cero los contadores de trabajo por tramitador (EstadisticaTramitador y '
+        'CargaTramitador) a partir de los trámites. Úsalo si se modificaron trámites sin pasar por el ORM.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        resultado = reconstruir_estadisticas()
+        duracion = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"Estadísticas reconstruidas: {resultado['tramitadores']} tramitadores, "
+            f"{resultado['filas']} filas en {duracion:.1f}s"
+        ))
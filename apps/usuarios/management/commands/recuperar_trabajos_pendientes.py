@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.tramites.services.documento_worker import recuperar_documentos_pendientes
+from apps.tramites.services.plantilla_worker import recuperar_plantillas_pendientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Vuelve a ejecutar los trabajos en segundo plano que se perdieron al reiniciarse el proceso '
+        'web: plantillas que siguen en PENDIENTE o PROCESANDO y documentos de trámites que siguen en '
+        'PENDIENTE o GENERANDO pasado el tiempo límite. '
+        'Pensado para ejecutarse periódicamente (cron) o al arrancar el servidor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutos', type=int, default=15,
+            help='Antigüedad mínima, en minutos, de un trabajo para darlo por perdido (default: 15)'
+        )
+
+    def handle(self, *args, **options):
+        if options['minutos'] < 0:
+            raise CommandError("--minutos no puede ser negativo")
+
+        antiguedad = timedelta(minutes=options['minutos'])
+        # Primero las plantillas: un documento necesita su plantilla activa para generarse
+        plantillas = recuperar_plantillas_pendientes(antiguedad)
+        documentos = recuperar_documentos_pendientes(antiguedad)
+
+        if plantillas or documentos:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(plantillas)} plantillas y {len(documentos)} documentos de trámites reprocesados"
+            ))
+        else:
+            self.stdout.write("No hay trabajos pendientes abandonados")
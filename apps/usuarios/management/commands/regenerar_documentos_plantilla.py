@@ -0,0 +1,199 @@
+import json
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from apps.tramites.models import Documento, PlantillaDocumento, Tramite
+from apps.tramites.services.storage_service import _generar_ruta_archivo
+from apps.tramites.services.pdf_render_cache import calcular_huella_datos
+from apps.tramites.services.pdf_render_engine import obtener_motor, renderizar_lote_a_archivos
+from apps.tramites.services.pdf_template_cache import obtener_huella_plantilla
+
+
+def _ruta_preparacion(ruta_final: str) -> str:
+    """
+    Ruta oculta junto a la final (mismo sistema de archivos: la publicación es un rename atómico).
+    """
+    directorio, nombre = os.path.split(ruta_final)
+    return os.path.join(directorio, f".{nombre}.regenerando")
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenera, en paralelo, una nueva versión del documento de todos los trámites de una plantilla '
+        'cuyo último PDF se generó con un archivo base anterior. Reanuda desde un checkpoint si se interrumpe.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('plantilla_id', type=int, help='ID de la PlantillaDocumento revisada')
+        parser.add_argument('--lote', type=int, default=200, help='Trámites por lote (default: 200)')
+        parser.add_argument('--checkpoint', help='Archivo JSON de checkpoint (default: var/regeneracion_plantilla_<id>.json)')
+        parser.add_argument('--reiniciar', action='store_true', help='Ignorar el checkpoint existente y empezar desde el inicio')
+
+    def handle(self, *args, **options):
+        try:
+            plantilla = PlantillaDocumento.objects.get(id=options['plantilla_id'])
+        except PlantillaDocumento.DoesNotExist:
+            raise CommandError(f"No existe la plantilla #{options['plantilla_id']}")
+
+        huella = obtener_huella_plantilla(plantilla)
+        ruta_checkpoint = options['checkpoint'] or os.path.join(
+            settings.BASE_DIR, 'var', f"regeneracion_plantilla_{plantilla.id}.json"
+        )
+        checkpoint = self._leer_checkpoint(ruta_checkpoint, huella, options['reiniciar'])
+        if checkpoint['ultimo_tramite_id']:
+            self.stdout.write(self.style.WARNING(
+                f"Reanudando desde el trámite #{checkpoint['ultimo_tramite_id']} "
+                f"({checkpoint['generados']} documentos ya generados)"
+            ))
+
+        # Trámites de la plantilla sin una versión generada con el archivo base actual
+        ya_regenerados = Documento.objects.filter(
+            tramite__plantilla=plantilla, nombre=plantilla.tipo_especifico, huella_plantilla=huella
+        ).values('tramite_id')
+        tramites = (
+            Tramite.objects
+            .filter(plantilla=plantilla, id__gt=checkpoint['ultimo_tramite_id'])
+            .exclude(datos_formulario={})
+            .exclude(id__in=ya_regenerados)
+            .select_related('solicitante')
+            .only('id', 'nombre', 'segmento', 'datos_formulario', 'solicitante__id')
+            .order_by('id')
+        )
+
+        motor = obtener_motor()
+        workers = motor.max_workers if motor is not None else 1
+        self.stdout.write(f"Regenerando documentos de '{plantilla.nombre}' con {workers} worker(s)...")
+
+        inicio = time.monotonic()
+        generados = errores = 0
+        lote = []
+        for tramite in tramites.iterator(chunk_size=options['lote']):
+            lote.append(tramite)
+            if len(lote) >= options['lote']:
+                g, e = self._procesar_lote(plantilla, huella, lote)
+                generados, errores = generados + g, errores + e
+                self._guardar_checkpoint(ruta_checkpoint, checkpoint, huella, lote[-1].id, g, e)
+                self._informar_progreso(generados, errores, inicio)
+                lote = []
+        if lote:
+            g, e = self._procesar_lote(plantilla, huella, lote)
+            generados, errores = generados + g, errores + e
+            self._guardar_checkpoint(ruta_checkpoint, checkpoint, huella, lote[-1].id, g, e)
+            self._informar_progreso(generados, errores, inicio)
+
+        duracion = time.monotonic() - inicio
+        rendimiento = generados / duracion if duracion else 0.0
+        # Terminado sin interrupciones: el checkpoint ya no es necesario
+        if os.path.exists(ruta_checkpoint):
+            os.remove(ruta_checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f"Proceso finalizado.\nGenerados: {generados}\nErrores: {errores}\n"
+            f"Duración: {duracion:.1f}s\nRendimiento: {rendimiento:.1f} documentos/s"
+        ))
+
+    def _procesar_lote(self, plantilla, huella, tramites):
+        """
+        Calcula las versiones del lote, renderiza los PDFs en el pool y crea los Documentos con bulk_create.
+
+        Los PDFs se renderizan con un nombre de preparación y solo se publican en su ruta final
+        dentro de la transacción del bulk_create: si el insert falla no quedan archivos huérfanos
+        que desplacen los números de versión de la siguiente ejecución.
+        """
+        storage = Documento._meta.get_field('archivo').storage
+        nombre_base = f"{plantilla.tipo_especifico.lower().replace(' ', '_')}.pdf"
+
+        ultimas_versiones = dict(
+            Documento.objects
+            .filter(tramite_id__in=[t.id for t in tramites], nombre=plantilla.tipo_especifico)
+            .values('tramite_id')
+            .annotate(ultima=Max('version'))
+            .values_list('tramite_id', 'ultima')
+        )
+
+        pendientes = []
+        for tramite in tramites:
+            tramite.plantilla = plantilla  # Ya es su plantilla: evita una consulta en _generar_ruta_archivo
+            version = ultimas_versiones.get(tramite.id, 0) + 1
+            while True:
+                ruta_archivo = _generar_ruta_archivo(tramite, plantilla.tipo_especifico, version, nombre_base)
+                if not storage.exists(ruta_archivo):
+                    break
+                version += 1
+            pendientes.append((tramite, version, ruta_archivo))
+
+        # El motor reparte el lote entre los workers del pool
+        preparados = [_ruta_preparacion(storage.path(ruta)) for _, _, ruta in pendientes]
+        resultados = renderizar_lote_a_archivos(
+            plantilla, [(t.datos_formulario, preparado) for (t, _, _), preparado in zip(pendientes, preparados)]
+        )
+
+        documentos = []
+        publicar = []
+        errores = 0
+        for (tramite, version, ruta_archivo), preparado, error in zip(pendientes, preparados, resultados):
+            if error:
+                errores += 1
+                self.stdout.write(self.style.ERROR(f"Error regenerando el trámite #{tramite.id}: {error}"))
+                continue
+            documento = Documento(
+                tramite=tramite,
+                nombre=plantilla.tipo_especifico,
+                version=version,
+                huella_plantilla=huella,
+                huella_datos=calcular_huella_datos(tramite.datos_formulario),
+            )
+            documento.archivo.name = ruta_archivo
+            documentos.append(documento)
+            publicar.append((preparado, storage.path(ruta_archivo)))
+
+        publicados = []
+        try:
+            with transaction.atomic():
+                Documento.objects.bulk_create(documentos)
+                for preparado, destino in publicar:
+                    os.replace(preparado, destino)
+                    publicados.append(destino)
+        except BaseException:
+            # Rollback: ningún archivo del lote debe quedar en su ruta final
+            for destino in publicados:
+                os.remove(destino)
+            raise
+        finally:
+            for preparado in preparados:
+                if os.path.exists(preparado):
+                    os.remove(preparado)
+
+        return len(documentos), errores
+
+    def _leer_checkpoint(self, ruta, huella, reiniciar):
+        vacio = {'huella': huella, 'ultimo_tramite_id': 0, 'generados': 0, 'errores': 0}
+        if reiniciar or not os.path.exists(ruta):
+            return vacio
+        with open(ruta) as archivo:
+            checkpoint = json.load(archivo)
+        if checkpoint.get('huella') != huella:
+            # El archivo base cambió otra vez: el progreso anterior ya no sirve
+            self.stdout.write(self.style.WARNING("El checkpoint corresponde a otra versión de la plantilla; se ignora"))
+            return vacio
+        return checkpoint
+
+    def _guardar_checkpoint(self, ruta, checkpoint, huella, ultimo_tramite_id, generados, errores):
+        checkpoint.update({
+            'huella': huella,
+            'ultimo_tramite_id': ultimo_tramite_id,
+            'generados': checkpoint['generados'] + generados,
+            'errores': checkpoint['errores'] + errores,
+        })
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w') as archivo:
+            json.dump(checkpoint, archivo)
+        os.replace(temporal, ruta)
+
+    def _informar_progreso(self, generados, errores, inicio):
+        duracion = time.monotonic() - inicio
+        rendimiento = generados / duracion if duracion else 0.0
+        self.stdout.write(f"  {generados} generados, {errores} errores — {rendimiento:.1f} documentos/s")
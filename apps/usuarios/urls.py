@@ -7,6 +7,7 @@ from .views_roles.admin_view import (
     EditarUsuarioView,
     EliminarUsuarioView,
     GestionPlantillasView,
+    EstadoProcesamientoPlantillaView,
     GestionTramitesAdminView,
     DetalleTramiteAdminView,
     VisualizarPDFAdminView
@@ -34,6 +35,7 @@ urlpatterns = [
     path('editar-usuario/<int:usuario_id>/', EditarUsuarioView.as_view(), name='editar-usuario'),
     path('eliminar-usuario/<int:usuario_id>/', EliminarUsuarioView.as_view(), name='eliminar-usuario'),
     path('gestion-plantillas/', GestionPlantillasView.as_view(), name='gestion-plantillas'),
+    path('gestion-plantillas/<int:plantilla_id>/estado/', EstadoProcesamientoPlantillaView.as_view(), name='estado-plantilla'),
     path('gestion-tramites/', GestionTramitesAdminView.as_view(), name='gestion-tramites'),
     path('tramite/<int:tramite_id>/', DetalleTramiteAdminView.as_view(), name='detalle-tramite-admin'),
     path('tramite/<int:tramite_id>/pdf/', VisualizarPDFAdminView.as_view(), name='visualizar-pdf-admin'),
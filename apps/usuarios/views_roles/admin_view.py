@@ -4,7 +4,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.decorators.cache import never_cache
 from django.utils.decorators import method_decorator
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, JsonResponse
 from apps.usuarios.models import UsuarioCRM
 from apps.tramites.selectors import get_all_plantillas
 from apps.tramites.services.storage_service import crear_plantilla_documento, eliminar_plantilla_documento
@@ -231,8 +231,13 @@ class GestionPlantillasView(LoginRequiredMixin, View):
             archivo = request.FILES.get('archivo_base') # Usar request.FILES para archivos
 
             try:
-                crear_plantilla_documento(nombre, segmento, tipo_especifico, archivo, request.user)
-                messages.success(request, 'Plantilla subida exitosamente.')
+                plantilla = crear_plantilla_documento(nombre, segmento, tipo_especifico, archivo, request.user)
+                if plantilla.estado_procesamiento == 'ERROR':
+                    messages.error(request, f'La plantilla no se pudo procesar: {plantilla.error_procesamiento}')
+                elif plantilla.estado_procesamiento == 'LISTA':
+                    messages.success(request, 'Plantilla subida exitosamente.')
+                else:
+                    messages.success(request, 'Plantilla subida. Se está procesando en segundo plano.')
             except ValueError as e:
                 messages.error(request, str(e))
             except Exception as e:
@@ -241,6 +246,27 @@ class GestionPlantillasView(LoginRequiredMixin, View):
             return redirect('usuarios:gestion-plantillas')
 
 
+@method_decorator(never_cache, name='dispatch')
+class EstadoProcesamientoPlantillaView(LoginRequiredMixin, View):
+    """
+    Devuelve en JSON el estado del procesamiento en segundo plano de una plantilla.
+    La gestión de plantillas la consulta periódicamente mientras no esté lista.
+    """
+    def get(self, request, plantilla_id):
+        if request.user.rol != 'ADMINISTRADOR':
+            return JsonResponse({'error': 'Acceso denegado.'}, status=403)
+
+        plantilla = get_object_or_404(PlantillaDocumento, id=plantilla_id)
+        return JsonResponse({
+            'plantilla_id': plantilla.id,
+            'estado_procesamiento': plantilla.estado_procesamiento,
+            'estado_procesamiento_display': plantilla.get_estado_procesamiento_display(),
+            'error_procesamiento': plantilla.error_procesamiento,
+            'activo': plantilla.activo,
+            'total_campos': plantilla.campos.count(),
+        })
+
+
 @method_decorator(never_cache, name='dispatch')
 class GestionTramitesAdminView(LoginRequiredMixin, View):
     """
@@ -12,6 +12,11 @@ class NoCacheMiddleware:
         
         # Si el usuario está autenticado, forzamos a que el navegador no guarde caché
         if hasattr(request, 'user') and request.user.is_authenticated:
+            if response.has_header('ETag'):
+                # Respuestas con ETag: el navegador las guarda pero debe revalidarlas siempre
+                # (tras cerrar sesión la revalidación ya no pasa el login)
+                response['Cache-Control'] = 'private, no-cache'
+                return response
             response['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
             response['Pragma'] = 'no-cache'
             response['Expires'] = '0'
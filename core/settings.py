@@ -92,6 +92,100 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# --- PDF Generation ---
+# Maximum number of parsed PDF templates each process keeps in its LRU cache.
+PDF_TEMPLATE_CACHE_MAX = 32
+
+# Process pool used to render PDFs outside the request thread.
+# MODO: 'procesos' (default) or 'inline' (render in the calling thread, useful for debugging).
+PDF_RENDER_ENGINE = {
+    'MODO': 'procesos',
+    'MAX_WORKERS': None,          # None = os.cpu_count()
+    'MAX_COLA': 32,               # Jobs allowed to wait for a free worker
+    'TIMEOUT': 30,                # Seconds per job (also max wait for a queue slot)
+    'TRABAJOS_POR_WORKER': 200,   # Recycle the worker processes after this many jobs each
+    'CONTEXTO': 'spawn',          # multiprocessing start method
+}
+
+# Content-addressed disk cache of rendered PDFs, keyed by (renderer version, template hash,
+# data hash). Holds applicant data: keep DIRECTORIO outside MEDIA_ROOT so it is never served,
+# but on the same filesystem: document renders are cached as hard links, not copies.
+PDF_RENDER_CACHE = {
+    'ACTIVO': True,
+    'DIRECTORIO': BASE_DIR / 'var' / 'pdf_render_cache',
+    'MAX_BYTES': 256 * 1024 * 1024,   # LRU eviction above this total size
+}
+
+# Commit new tramites immediately and generate their PDF in a local background worker.
+# WORKERS = 0 runs each job inline right after the commit (tests, debugging).
+# Queued jobs live in memory: run `manage.py recuperar_trabajos_pendientes` periodically
+# (and on startup) to requeue documents left PENDIENTE/GENERANDO by a restart.
+TRAMITE_DOCUMENTO_ASINCRONO = True
+TRAMITE_DOCUMENTO_WORKERS = 2
+
+# Process uploaded templates (PDF validation, field and layout extraction, activation)
+# in a local background worker; the admin page polls their estado_procesamiento.
+# Same queue rules as the document worker (WORKERS = 0 runs inline; lost jobs are
+# requeued by `manage.py recuperar_trabajos_pendientes`).
+PLANTILLA_INGESTA_ASINCRONA = True
+PLANTILLA_INGESTA_WORKERS = 1
+
+# --- Form Schema Cache ---
+# Compiled form schemas (apps/tramites/services/esquema_formulario.py) are stored in the
+# default cache under a per-template version key. With the default per-process LocMemCache
+# each process only sees its own invalidations; configure a shared CACHES backend
+# (Redis/Memcached) when running several workers.
+
+# --- Tramitador Assignment ---
+# MODO selects the strategy:
+#   'contador'    atomic counter modulo a cached roster of active tramitadores; on PostgreSQL
+#                 the counter is a sequence, so concurrent tramite creations never wait on each other.
+#   'menor_carga' tramitador with the fewest open (PENDIENTE / EN_PROCESO) tramites, read from the
+#                 CargaTramitador table that signals keep up to date; ties are broken round-robin.
+#   'registro'    legacy round-robin that row-locks UltimaAsignacion.
+#   A dotted path to an EstrategiaAsignacion subclass is also accepted.
+# ROSTER_TTL: seconds the roster stays cached (user signals also invalidate it).
+ASIGNACION_TRAMITADORES = {
+    'MODO': 'contador',
+    'ROSTER_TTL': 300,
+}
+
+# --- Template Field Classifier ---
+# Keyword tables used to guess each PDF field's type and readable label, per locale.
+# Built-in 'es' and 'en' tables live in apps/tramites/services/clasificador_campos.py;
+# entries here extend them (or add new locales) without code changes. A 'text' list names
+# whole words that keep a field as plain text (e.g. 'lugar' in 'lugar_nacimiento').
+CLASIFICADOR_CAMPOS = {
+    'IDIOMAS': ['es', 'en'],
+    'PALABRAS_CLAVE': {},   # {'pt': {'email': ['correio'], 'date': ['data'], ...}}
+    'ABREVIATURAS': {},     # {'es': {'Nac': 'Nacionalidad'}}
+}
+
+# --- Service Instrumentation ---
+# Per-stage timing histograms (validar, asignar, renderizar, almacenar, historial, ...),
+# kept in memory per process and exposed at /tramites/metricas/.
+# MUESTREO is the fraction of executions that are timed (1.0 = all of them).
+INSTRUMENTACION = {
+    'ACTIVO': True,
+    'MUESTREO': 1.0,
+}
+
+# Service-layer log records (replace the old print() progress messages).
+# Set the 'apps' level to DEBUG to also log every stage timing.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'apps': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,274 @@
+"""
+Benchmarks del pipeline de generación de PDFs.
+
+Construye plantillas sintéticas con reportlab (parametrizadas por número de campos,
+páginas y anotaciones sin datos) y mide cada camino:
+- relleno_acroform:       _rellenar_pdf_plantilla con la plantilla ya en la caché de proceso
+- relleno_acroform_frio:  igual, vaciando la caché de plantillas en cada iteración
+- superposicion:          _rellenar_pdf_plantilla sobre una plantilla sin AcroForm
+- fallback_simple:        _generar_pdf_simple_fallback
+- extraccion:             extraer_campos_pdf (índice de layout + CampoPlantilla)
+
+Los tiempos se toman sin tracemalloc; la memoria pico de Python se mide en una pasada
+adicional. rss_pico_kb es el pico del proceso hasta terminar el caso (monótono): para
+comparar el RSS de un solo camino, ejecutar ese caso aislado con --caso.
+
+Usa la base de datos de pruebas de Django (como tests/features/environment.py) y un
+MEDIA_ROOT temporal, por lo que no toca datos reales.
+
+Uso:
+    python tests/benchmarks/benchmark_pdf.py --salida antes.json
+    python tests/benchmarks/benchmark_pdf.py --salida despues.json --comparar antes.json
+    python tests/benchmarks/benchmark_pdf.py --campos 10 100 --paginas 1 10 --anotaciones 0 50 --iteraciones 30
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, RAIZ_PROYECTO)
+
+CASOS = ['relleno_acroform', 'relleno_acroform_frio', 'superposicion', 'fallback_simple', 'extraccion']
+
+
+# --- Plantillas sintéticas ---
+
+def generar_pdf_sintetico(campos: int, paginas: int, anotaciones: int, con_acroform: bool = True) -> bytes:
+    """
+    PDF con `campos` campos de texto repartidos entre `paginas` páginas y `anotaciones`
+    anotaciones de enlace (sin datos) que el relleno y la extracción deben recorrer.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    can = canvas.Canvas(buffer, pagesize=letter)
+    _, alto = letter
+    campos_por_pagina = -(-campos // paginas) if campos else 0
+    anotaciones_por_pagina = -(-anotaciones // paginas) if anotaciones else 0
+
+    campo = anotacion = 0
+    for pagina in range(paginas):
+        can.drawString(72, alto - 50, f"Formulario sintético - página {pagina + 1}")
+        y = alto - 90
+        for _ in range(campos_por_pagina):
+            if campo >= campos:
+                break
+            nombre = f"campo_{campo:04d}"
+            can.drawString(72, y + 5, nombre)
+            if con_acroform:
+                can.acroForm.textfield(name=nombre, x=220, y=y, width=250, height=14, fontSize=9)
+            campo += 1
+            y -= 18
+            if y < 60:
+                y = alto - 90
+        for i in range(anotaciones_por_pagina):
+            if anotacion >= anotaciones:
+                break
+            can.linkURL('https://example.com', (480, 40 + i % 40 * 2, 500, 50 + i % 40 * 2), relative=0)
+            anotacion += 1
+        can.showPage()
+    can.save()
+    return buffer.getvalue()
+
+
+def datos_sinteticos(campos: int) -> dict:
+    return {f"campo_{i:04d}": f"Valor de prueba {i}" for i in range(campos)}
+
+
+# --- Medición ---
+
+def _rss_pico_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # macOS reporta bytes
+
+
+def medir(funcion, iteraciones: int) -> dict:
+    """
+    Ejecuta `funcion` una vez de calentamiento y luego `iteraciones` veces cronometradas.
+    """
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        funcion()
+
+        tiempos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+
+        tracemalloc.start()
+        funcion()
+        _, pico_python = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    total = sum(tiempos)
+    ordenados = sorted(tiempos)
+    return {
+        'iteraciones': iteraciones,
+        'tiempo_total_s': round(total, 4),
+        'media_ms': round(statistics.mean(tiempos) * 1000, 3),
+        'mediana_ms': round(statistics.median(tiempos) * 1000, 3),
+        'p95_ms': round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000, 3),
+        'min_ms': round(ordenados[0] * 1000, 3),
+        'documentos_por_s': round(iteraciones / total, 2) if total else None,
+        'memoria_pico_python_kb': pico_python // 1024,
+        'rss_pico_kb': _rss_pico_kb(),
+    }
+
+
+def construir_caso(caso: str, plantilla_acroform, plantilla_plana, datos: dict):
+    from apps.tramites.services.pdf_field_extractor import extraer_campos_pdf
+    from apps.tramites.services.pdf_template_cache import limpiar_cache
+    from apps.tramites.services.tramite_service import _generar_pdf_simple_fallback, _rellenar_pdf_plantilla
+
+    if caso == 'relleno_acroform':
+        return lambda: _rellenar_pdf_plantilla(plantilla_acroform, datos)
+    if caso == 'relleno_acroform_frio':
+        def relleno_frio():
+            limpiar_cache()
+            return _rellenar_pdf_plantilla(plantilla_acroform, datos)
+        return relleno_frio
+    if caso == 'superposicion':
+        return lambda: _rellenar_pdf_plantilla(plantilla_plana, datos)
+    if caso == 'fallback_simple':
+        return lambda: _generar_pdf_simple_fallback(plantilla_plana, datos)
+    if caso == 'extraccion':
+        return lambda: extraer_campos_pdf(plantilla_acroform)
+    raise ValueError(f"Caso desconocido: {caso}")
+
+
+def crear_plantillas(campos: int, paginas: int, anotaciones: int, administrador):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from apps.tramites.models import PlantillaDocumento
+
+    sufijo = f"{campos}c_{paginas}p_{anotaciones}a"
+    plantillas = []
+    for con_acroform in (True, False):
+        contenido = generar_pdf_sintetico(campos, paginas, anotaciones, con_acroform)
+        tipo = f"Benchmark {'AcroForm' if con_acroform else 'Plana'} {sufijo}"
+        plantillas.append(PlantillaDocumento.objects.create(
+            nombre=tipo,
+            segmento='Benchmark',
+            tipo_especifico=tipo,
+            archivo_base=SimpleUploadedFile(f"{tipo.lower().replace(' ', '_')}.pdf", contenido, content_type='application/pdf'),
+            administrador=administrador,
+            activo=True,
+        ))
+    return plantillas
+
+
+def ejecutar(args) -> dict:
+    from django.contrib.auth import get_user_model
+    from apps.tramites.services.pdf_template_cache import limpiar_cache
+
+    administrador = get_user_model().objects.create(
+        email='benchmark@example.com', nombre='Benchmark', rol='ADMINISTRADOR'
+    )
+
+    resultados = []
+    for campos in args.campos:
+        for paginas in args.paginas:
+            for anotaciones in args.anotaciones:
+                plantilla_acroform, plantilla_plana = crear_plantillas(campos, paginas, anotaciones, administrador)
+                datos = datos_sinteticos(campos)
+                for caso in args.caso or CASOS:
+                    limpiar_cache()
+                    medicion = medir(construir_caso(caso, plantilla_acroform, plantilla_plana, datos), args.iteraciones)
+                    resultado = {'caso': caso, 'campos': campos, 'paginas': paginas, 'anotaciones': anotaciones, **medicion}
+                    resultados.append(resultado)
+                    print(
+                        f"{caso:<22} campos={campos:<4} páginas={paginas:<3} anotaciones={anotaciones:<4} "
+                        f"mediana={medicion['mediana_ms']:>9.3f} ms  p95={medicion['p95_ms']:>9.3f} ms  "
+                        f"{medicion['documentos_por_s'] or 0:>8.1f} doc/s  rss_pico={medicion['rss_pico_kb']} kB"
+                    )
+
+    import PyPDF2
+    import reportlab
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'pypdf2': PyPDF2.__version__,
+        'reportlab': reportlab.Version,
+        'resultados': resultados,
+    }
+
+
+def comparar(actual: dict, ruta_anterior: str):
+    """
+    Imprime la variación de la mediana frente a una ejecución anterior (mismos parámetros).
+    """
+    with open(ruta_anterior) as archivo:
+        anterior = json.load(archivo)
+
+    def clave(r):
+        return (r['caso'], r['campos'], r['paginas'], r['anotaciones'])
+
+    previos = {clave(r): r for r in anterior.get('resultados', [])}
+    print(f"\nComparación con {ruta_anterior} ({anterior.get('fecha')}):")
+    for resultado in actual['resultados']:
+        previo = previos.get(clave(resultado))
+        if previo is None:
+            continue
+        factor = previo['mediana_ms'] / resultado['mediana_ms'] if resultado['mediana_ms'] else float('inf')
+        print(
+            f"{resultado['caso']:<22} campos={resultado['campos']:<4} páginas={resultado['paginas']:<3} "
+            f"anotaciones={resultado['anotaciones']:<4} {previo['mediana_ms']:>9.3f} -> "
+            f"{resultado['mediana_ms']:>9.3f} ms  (x{factor:.2f})"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks del pipeline de generación de PDFs')
+    parser.add_argument('--campos', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--paginas', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--anotaciones', type=int, nargs='+', default=[0, 20])
+    parser.add_argument('--iteraciones', type=int, default=20)
+    parser.add_argument('--caso', choices=CASOS, action='append', help='Ejecutar solo estos casos (repetible)')
+    parser.add_argument('--salida', default='bench_pdf.json', help='Archivo JSON de resultados')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar medianas')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    django.setup()
+    from django.test import override_settings
+    from django.test.runner import DiscoverRunner
+
+    runner = DiscoverRunner(interactive=False, verbosity=0)
+    runner.setup_test_environment()
+    config_bd = runner.setup_databases()
+    try:
+        with tempfile.TemporaryDirectory() as media_temporal, override_settings(MEDIA_ROOT=media_temporal):
+            informe = ejecutar(args)
+    finally:
+        runner.teardown_databases(config_bd)
+        runner.teardown_test_environment()
+
+    with open(args.salida, 'w') as archivo:
+        json.dump(informe, archivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.salida}")
+
+    if args.comparar:
+        comparar(informe, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
@@ -19,3 +19,78 @@ Característica: Asignación automática de tareas y tramitadores
     Cuando se crea un segundo trámite nuevo en el sistema
     Entonces el sistema debe asignar este segundo trámite al tramitador "B"
     Y no debe asignarlo nuevamente al tramitador "A" para garantizar el balanceo
+
+  Escenario: El contador de asignación reparte la carga de forma equilibrada
+    Dado que hay 3 tramitadores activos más en el sistema
+    Cuando se asignan 22 trámites nuevos
+    Entonces cada tramitador debe recibir 4 o 5 trámites
+    Y dar de alta un nuevo tramitador debe incluirlo en las siguientes asignaciones
+
+  Escenario: La estrategia de menor carga prioriza al tramitador con menos trámites abiertos
+    Dado que la asignación usa la estrategia "menor_carga"
+    Y que el tramitador "A" tiene 3 trámites abiertos y el tramitador "B" tiene 1
+    Cuando se asignan 3 trámites nuevos
+    Entonces el tramitador "B" debe recibir 2 trámites y el tramitador "A" 1
+    Cuando el tramitador "A" aprueba 2 de sus trámites
+    Entonces la carga registrada de cada tramitador debe coincidir con sus trámites abiertos
+
+  Escenario: Una asignación revertida no deja marcadas en caché filas de carga inexistentes
+    Dado que la asignación usa la estrategia "menor_carga"
+    Y que una asignación que creó las filas de carga de los tramitadores se revirtió
+    Entonces no deben quedar filas de carga ni la marca de filas creadas en la caché
+    Cuando se asignan 2 trámites nuevos
+    Entonces cada tramitador debe recibir 1 o 1 trámites
+
+  Escenario: La estrategia de menor carga recrea las filas que la caché da por existentes
+    Dado que la asignación usa la estrategia "menor_carga"
+    Y que una asignación que creó las filas de carga de los tramitadores se revirtió
+    Y que la caché da por creadas las filas de carga de los tramitadores
+    Cuando se asignan 2 trámites nuevos
+    Entonces cada tramitador debe recibir 1 o 1 trámites
+    Y la estrategia de menor carga debe planificar 2 asignaciones aunque falten filas de carga
+
+  Esquema del escenario: Los trámites creados sin tramitadores activos se asignan en bloque
+    Dado que la asignación usa la estrategia "<estrategia>"
+    Y que no hay tramitadores activos y se crean 7 trámites
+    Entonces ninguno de los trámites creados tiene tramitador asignado
+    Cuando se reactivan los tramitadores y se ejecuta la asignación en bloque con lotes de 3
+    Entonces los trámites creados quedan repartidos 4 y 3 entre los tramitadores
+    Y cada trámite asignado en bloque debe tener su registro en el historial
+    Y la carga registrada de cada tramitador debe coincidir con sus trámites abiertos
+
+    Ejemplos:
+      | estrategia  |
+      | contador    |
+      | menor_carga |
+      | registro    |
+
+  Escenario: Las estadísticas de carga se leen de contadores mantenidos en cada cambio
+    Dado que el tramitador "A" tiene 3 trámites abiertos y el tramitador "B" tiene 1
+    Cuando el tramitador "A" aprueba 2 de sus trámites
+    Y el tramitador "B" rechaza 1 de sus trámites
+    Y se reasigna el trámite en proceso del tramitador "A" al tramitador "B"
+    Y se detectan los trámites en proceso con la fecha límite vencida
+    Entonces las estadísticas de los tramitadores deben coincidir con sus trámites por estado
+    Y las estadísticas de los tramitadores se obtienen sin consultar la tabla de trámites
+    Cuando se cambian trámites sin pasar por el ORM
+    Entonces las estadísticas de los tramitadores deben diferir de sus trámites por estado
+    Cuando se reconstruyen las estadísticas de los tramitadores
+    Entonces las estadísticas de los tramitadores deben coincidir con sus trámites por estado
+    Y la carga registrada de cada tramitador debe coincidir con sus trámites abiertos
+
+  Escenario: Reasignar un trámite leído antes de que otra petición lo aprobara no desfasa los contadores
+    Dado que el tramitador "A" tiene 3 trámites abiertos y el tramitador "B" tiene 1
+    Y que una petición leyó un trámite pendiente del tramitador "A"
+    Cuando otra petición aprueba ese trámite
+    Y la primera petición reasigna el trámite leído al tramitador "B"
+    Entonces la carga registrada de cada tramitador debe coincidir con sus trámites abiertos
+    Y las estadísticas de los tramitadores deben coincidir con sus trámites por estado
+
+  Escenario: Aprobar y detectar retrasos sobre trámites reasignados mantiene los contadores
+    Dado que el tramitador "A" tiene 3 trámites abiertos y el tramitador "B" tiene 1
+    Y que una petición leyó los trámites en proceso con la fecha límite vencida
+    Cuando se reasigna el trámite en proceso del tramitador "A" al tramitador "B"
+    Y el tramitador "A" aprueba 1 de sus trámites
+    Y se marcan como retrasados los trámites leídos
+    Entonces la carga registrada de cada tramitador debe coincidir con sus trámites abiertos
+    Y las estadísticas de los tramitadores deben coincidir con sus trámites por estado
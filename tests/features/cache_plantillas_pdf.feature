@@ -0,0 +1,64 @@
+# language:es
+Característica: Caché de plantillas PDF parseadas
+  Como sistema que genera los documentos de los trámites
+  Quiero reutilizar la estructura parseada de cada plantilla maestra
+  Para no volver a leer y parsear el PDF base en cada solicitud
+
+  Antecedentes:
+    Dado que existe una plantilla maestra con campos de formulario PDF
+
+  Escenario: Rellenos consecutivos reutilizan la plantilla parseada
+    Cuando se rellena la plantilla 3 veces con datos del solicitante
+    Entonces la caché debe registrar 1 fallo y 2 aciertos
+    Y cada PDF generado debe contener el valor enviado
+
+  Escenario: Los contadores de la caché se publican en las métricas de servicio
+    Cuando se rellena la plantilla 3 veces con datos del solicitante
+    Y un administrador consulta las métricas de servicio en formato Prometheus
+    Entonces las métricas deben exportar 2 aciertos y 1 fallo de la caché de plantillas
+
+  Escenario: Una plantilla sin campos recibe los datos superpuestos sin alterar la versión cacheada
+    Dado que existe una plantilla maestra de una página sin campos de formulario
+    Cuando se superponen 35 datos sobre la plantilla dos veces con valores distintos
+    Entonces cada PDF superpuesto debe conservar el texto de la plantilla en la primera página
+    Y la primera página debe contener los datos 1 a 31 y la página añadida los datos 32 a 35
+    Y ningún PDF superpuesto debe contener valores del otro relleno
+    Y el lector cacheado de la plantilla no debe haber cambiado
+
+  Escenario: Eliminar la plantilla invalida la caché
+    Dado que la plantilla ya fue rellenada una vez
+    Cuando el administrador elimina la plantilla maestra
+    Entonces la caché no debe conservar entradas de la plantilla
+
+  Escenario: Generar el mismo PDF dos veces reutiliza el documento renderizado
+    Cuando se genera el PDF de la plantilla 2 veces con los mismos datos
+    Entonces la caché de renderizados debe registrar 1 fallo y 1 acierto
+    Y ambos PDFs generados deben ser idénticos
+
+  Escenario: El documento publicado y su entrada en la caché comparten el archivo
+    Cuando se genera el PDF de la plantilla en un archivo con la caché de renderizados activa
+    Entonces la entrada de la caché debe ser un enlace al mismo archivo que el PDF generado
+    Cuando se genera el PDF de la plantilla en un archivo con la caché de renderizados activa
+    Entonces la caché de renderizados debe registrar 1 fallo y 1 acierto
+
+  Escenario: Cambiar la versión del renderizador deja de servir los PDFs cacheados
+    Cuando se genera el PDF de la plantilla en un archivo con la caché de renderizados activa
+    Y se genera el PDF de la plantilla en un archivo con la versión de renderizador 3
+    Entonces la caché de renderizados debe registrar 2 fallos y 0 aciertos
+
+  Escenario: Guardar un trámite sin cambios no crea una nueva versión del documento
+    Dado que existe un trámite con su documento generado desde la plantilla
+    Cuando el solicitante guarda el trámite con los mismos datos
+    Entonces el trámite debe tener 1 versión del documento
+    Cuando el solicitante guarda el trámite con datos distintos
+    Entonces el trámite debe tener 2 versiones del documento
+
+  Escenario: Una versión con datos distintos es un documento completo con los valores nuevos
+    Dado que existe un trámite con su documento generado desde la plantilla
+    Cuando el solicitante guarda el trámite con datos distintos
+    Entonces la última versión del documento debe contener el pasaporte "P999"
+
+  Escenario: El pool de procesos arrancado con 'spawn' renderiza en sus workers
+    Cuando se renderizan 3 PDFs distintos con el pool de procesos "spawn"
+    Entonces ningún renderizado debe haberse hecho en el proceso actual
+    Y cada PDF generado debe contener el valor enviado
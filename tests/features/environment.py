@@ -2,6 +2,7 @@ import os
 import django
 from django.conf import settings
 from django.test.runner import DiscoverRunner
+from django.core.cache import cache
 from django.db import transaction
 
 def before_all(context):
@@ -29,6 +30,9 @@ def before_scenario(context, scenario):
     Se ejecuta antes de cada escenario.
     Inicia una transacción atómica para aislar los cambios del escenario.
     """
+    # La caché sobrevive al rollback: vaciarla para no reutilizar datos de otro escenario
+    cache.clear()
+
     # Iniciar transacción atómica usando la API correcta de Django
     context.scenario_transaction = transaction.atomic()
     context.scenario_transaction.__enter__()
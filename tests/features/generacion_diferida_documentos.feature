@@ -0,0 +1,30 @@
+# language:es
+Característica: Generación diferida de documentos de trámites
+  Como solicitante
+  Quiero que mi trámite quede registrado en cuanto envío el formulario
+  Para no esperar a que se genere el PDF y seguir su estado desde el panel
+
+  Antecedentes:
+    Dado que existe una plantilla maestra con campos de formulario PDF
+    Y que existe un solicitante autenticado para la generación diferida
+
+  Escenario: El formulario en línea crea el trámite y el worker genera el documento
+    Cuando el solicitante envía el formulario en línea con el pasaporte "P555"
+    Entonces el trámite debe quedar con el documento en estado "PENDIENTE"
+    Y la consulta del estado del documento debe responder "PENDIENTE"
+    Cuando el worker de documentos procesa los trabajos en cola
+    Entonces el trámite debe quedar con el documento en estado "LISTO"
+    Y la consulta del estado del documento debe responder "LISTO"
+    Y la última versión del documento debe contener el pasaporte "P555"
+
+  Escenario: Un documento abandonado por un reinicio se recupera con el comando
+    Dado que existe un trámite cuyo documento quedó en "GENERANDO" hace 60 minutos
+    Cuando se ejecuta la recuperación de trabajos pendientes con un límite de 15 minutos
+    Entonces el trámite debe quedar con el documento en estado "LISTO"
+    Y el trámite debe tener 1 versión del documento
+
+  Escenario: La recuperación no toca los documentos recién encolados
+    Dado que existe un trámite cuyo documento quedó en "PENDIENTE" hace 5 minutos
+    Cuando se ejecuta la recuperación de trabajos pendientes con un límite de 15 minutos
+    Entonces el trámite debe quedar con el documento en estado "PENDIENTE"
+    Y el trámite debe tener 0 versiones del documento
@@ -0,0 +1,53 @@
+# language:es
+Característica: Ingesta de plantillas en segundo plano
+  Como administrador del sistema
+  Quiero que la subida de una plantilla termine en cuanto el archivo queda guardado
+  Para no esperar a que se extraigan los campos de PDFs grandes y ver el progreso en el panel
+
+  Antecedentes:
+    Dado que existe un administrador para la ingesta de plantillas
+
+  Escenario: La subida deja la plantilla en cola y el worker la activa
+    Cuando el administrador sube la plantilla "Solicitud de Residencia" con un PDF con campos
+    Entonces la plantilla debe quedar en estado de procesamiento "PENDIENTE" e inactiva
+    Y la plantilla no debe tener campos todavía
+    Cuando el worker de plantillas procesa la plantilla
+    Entonces la plantilla debe quedar en estado de procesamiento "LISTA" y activa
+    Y la plantilla debe tener el campo extraído "numero_pasaporte"
+
+  Escenario: Un archivo que no es PDF queda en error sin campos genéricos
+    Cuando el administrador sube la plantilla "Archivo Inválido" con un archivo que no es PDF
+    Y el worker de plantillas procesa la plantilla
+    Entonces la plantilla debe quedar en estado de procesamiento "ERROR" e inactiva
+    Y el error de procesamiento debe indicar "no es un PDF"
+    Y la plantilla no debe tener campos todavía
+
+  Escenario: El panel consulta el estado del procesamiento
+    Dado que el administrador subió la plantilla "Solicitud de Residencia" con un PDF con campos
+    Cuando el administrador consulta el estado de procesamiento de la plantilla
+    Entonces la respuesta debe indicar el estado de procesamiento "PENDIENTE"
+
+  Escenario: Una subida idéntica reutiliza el archivo y la extracción de la plantilla existente
+    Dado que el administrador subió la plantilla "Solicitud de Residencia" con un PDF con campos
+    Y el worker de plantillas procesa la plantilla
+    Cuando el administrador sube el mismo PDF como la plantilla "Solicitud de Residencia (copia)"
+    Entonces la nueva plantilla debe quedar en estado de procesamiento "LISTA" y activa sin procesarse
+    Y ambas plantillas deben compartir el mismo archivo almacenado
+    Y la nueva plantilla debe tener los mismos campos que la original
+    Y al eliminar la plantilla original el archivo compartido debe conservarse
+
+  Escenario: Una plantilla abandonada por un reinicio se recupera con el comando
+    Dado que el administrador subió la plantilla "Solicitud de Residencia" con un PDF con campos
+    Y que la plantilla quedó en estado de procesamiento "PROCESANDO" hace 60 minutos
+    Cuando se ejecuta la recuperación de trabajos pendientes de plantillas
+    Entonces la plantilla debe quedar en estado de procesamiento "LISTA" y activa
+    Y la plantilla debe tener el campo extraído "numero_pasaporte"
+
+  Escenario: Reemplazar el archivo desde el admin vuelve a procesar la plantilla
+    Dado que el administrador subió la plantilla "Solicitud de Residencia" con un PDF con campos
+    Y el worker de plantillas procesa la plantilla
+    Cuando el administrador reemplaza en el admin el archivo de la plantilla por un PDF con el campo "fecha_nacimiento"
+    Entonces la plantilla debe quedar en estado de procesamiento "LISTA" y activa
+    Y la plantilla debe tener el campo extraído "fecha_nacimiento"
+    Y la plantilla ya no debe tener el campo "numero_pasaporte"
+    Y el archivo de la plantilla debe estar en el almacén por huella
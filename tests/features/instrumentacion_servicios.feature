@@ -0,0 +1,25 @@
+# language: es
+Característica: Instrumentación de tiempos de la capa de servicios
+  Como administrador del sistema
+  Quiero conocer cuánto tarda cada etapa de los trámites (validar, asignar, renderizar, almacenar, historial)
+  Para saber dónde se consume el tiempo de las peticiones sin depender de mensajes en consola
+
+  Antecedentes:
+    Dado que los histogramas de instrumentación están vacíos
+    Y que existe un trámite pendiente asignado a un tramitador para instrumentación
+
+  Escenario: La aprobación registra la duración de la etapa de historial
+    Cuando el tramitador asignado aprueba el trámite instrumentado
+    Entonces el histograma de la etapa "historial" debe tener 1 ejecución
+    Y la exportación Prometheus debe incluir la etapa "historial"
+
+  Escenario: Con la instrumentación desactivada no se registran etapas
+    Dado que la instrumentación de servicios está desactivada
+    Cuando el tramitador asignado aprueba el trámite instrumentado
+    Entonces no debe haber histogramas de etapas registrados
+
+  Escenario: Solo los administradores pueden consultar las métricas
+    Dado que el tramitador asignado aprobó el trámite instrumentado
+    Cuando un administrador consulta las métricas de servicio en formato JSON
+    Entonces la respuesta de métricas debe incluir la etapa "historial"
+    Y un solicitante que consulta las métricas de servicio debe recibir acceso denegado
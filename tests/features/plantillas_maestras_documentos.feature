@@ -41,3 +41,82 @@ Característica: Gestión de Plantillas Maestras de Documentos
     Cuando el solicitante sube múltiples archivos PDF completados para este trámite
     Entonces debe registrarse múltiples documentos asociados al trámite
     Y debe registrarse múltiples documentos asociados al trámite
+
+  Escenario: El formulario de la plantilla se sirve desde caché y se revalida con ETag
+    Cuando el solicitante abre el formulario de la plantilla desde el menú
+    Entonces la respuesta debe incluir el token CSRF del solicitante y una ETag
+    Cuando el solicitante vuelve a abrir el formulario enviando la ETag recibida
+    Entonces el sistema debe responder 304 sin reenviar el formulario
+    Cuando el solicitante revalida el formulario dos veces seguidas con la ETag recibida
+    Entonces ambas respuestas 304 deben conservar la ETag y permitir guardar el formulario en caché
+    Cuando el administrador renombra la plantilla a "Formulario de Solicitud v2"
+    Y el solicitante vuelve a abrir el formulario enviando la ETag recibida
+    Entonces el sistema debe devolver el formulario con el nombre "Formulario de Solicitud v2"
+
+  Escenario: Los cambios de la plantilla hechos sin señales también invalidan el formulario cacheado
+    Cuando el solicitante abre el formulario de la plantilla desde el menú
+    Y el solicitante vuelve a abrir el formulario enviando la ETag recibida
+    Entonces el sistema debe responder 304 sin reenviar el formulario
+    Cuando la plantilla se renombra a "Formulario Renombrado" sin emitir señales
+    Y el solicitante vuelve a abrir el formulario enviando la ETag recibida
+    Entonces el sistema debe devolver el formulario con el nombre "Formulario Renombrado"
+    Cuando el solicitante guarda la ETag del formulario recibido
+    Y el archivo base de la plantilla se reemplaza por "plantilla_reemplazada.pdf" sin emitir señales
+    Y el solicitante vuelve a abrir el formulario enviando la ETag recibida
+    Entonces el sistema debe devolver el formulario con el enlace a "plantilla_reemplazada.pdf"
+
+  Esquema del escenario: Los trámites existentes siguen funcionando al reemplazar su plantilla
+    Dado que el solicitante tiene 0 trámites activos en otros segmentos y uno iniciado desde la plantilla maestra
+    Cuando el administrador <accion> la plantilla maestra y sube una nueva del mismo tipo
+    Entonces el trámite iniciado debe poder editarse y descargarse con la nueva plantilla
+    Y el documento diferido del trámite debe generarse con la nueva plantilla
+
+    Ejemplos:
+      | accion    |
+      | desactiva |
+      | elimina   |
+
+  Escenario: Los trámites existentes se asocian a su plantilla y segmento
+    Dado que el solicitante inicia un nuevo trámite de tipo "Visa de Turismo"
+    Cuando se ejecuta el relleno de plantilla y segmento de los trámites existentes
+    Entonces el trámite debe quedar asociado a la plantilla maestra con el segmento "Visas"
+
+  Escenario: Un trámite activo bloquea el formulario de su segmento sin consultas por trámite
+    Dado que el solicitante tiene 5 trámites activos en otros segmentos y uno iniciado desde la plantilla maestra
+    Cuando el solicitante abre el formulario de la plantilla desde el menú
+    Entonces el sistema debe rechazar el formulario por segmento bloqueado
+    Y la verificación del segmento no debe depender del número de trámites activos
+
+  Escenario: La base de datos impide dos trámites activos en el mismo segmento
+    Dado que el solicitante tiene 5 trámites activos en otros segmentos y uno iniciado desde la plantilla maestra
+    Cuando otra petición intenta iniciar un segundo trámite desde la plantilla maestra
+    Entonces el sistema debe rechazarlo por segmento ocupado
+    Y el solicitante debe seguir teniendo un solo trámite activo en el segmento "Visas"
+
+  Escenario: Mover la plantilla a otro segmento mueve sus trámites y el bloqueo del solicitante
+    Dado que el solicitante tiene 5 trámites activos en otros segmentos y uno iniciado desde la plantilla maestra
+    Cuando el administrador mueve la plantilla maestra al segmento "Pasaportes"
+    Entonces el trámite de la plantilla maestra debe quedar en el segmento "Pasaportes"
+    Y los segmentos bloqueados del solicitante deben invalidarse e incluir "Pasaportes" pero no "Visas"
+
+  Escenario: Guardar la plantilla sin cambiar su segmento no toca sus trámites
+    Dado que el solicitante tiene 5 trámites activos en otros segmentos y uno iniciado desde la plantilla maestra
+    Cuando el administrador renombra la plantilla a "Formulario de Solicitud v2"
+    Entonces el guardado no debe actualizar los trámites de la plantilla
+
+  Escenario: No se puede mover la plantilla a un segmento en el que el solicitante ya tiene un trámite activo
+    Dado que el solicitante tiene 5 trámites activos en otros segmentos y uno iniciado desde la plantilla maestra
+    Cuando el administrador intenta mover la plantilla maestra al segmento "Segmento 0"
+    Entonces el formulario del admin debe rechazar el segmento
+    Y guardar la plantilla igualmente debe fallar con un error de validación
+    Y el trámite de la plantilla maestra debe quedar en el segmento "Visas"
+
+  Escenario: El menú lateral del solicitante se cachea y refleja los cambios de estado
+    Dado que el solicitante tiene 5 trámites activos en otros segmentos y uno iniciado desde la plantilla maestra
+    Y que el solicitante ya abrió su panel una vez
+    Cuando el solicitante abre su panel de nuevo
+    Entonces el menú debe mostrar la plantilla "Visa de Turismo" bloqueada
+    Y el menú no debe consultar las plantillas ni los trámites uno por uno
+    Cuando el trámite de la plantilla maestra es aprobado
+    Y el solicitante abre su panel de nuevo
+    Entonces el menú debe mostrar la plantilla "Visa de Turismo" disponible
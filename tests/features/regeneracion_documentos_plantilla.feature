@@ -0,0 +1,40 @@
+# language:es
+Característica: Regeneración masiva de documentos tras revisar una plantilla
+  Como administrador del sistema
+  Quiero regenerar de una vez los documentos de todos los trámites de una plantilla revisada
+  Para que cada trámite tenga una versión generada con el archivo base vigente
+
+  Antecedentes:
+    Dado que los documentos regenerados se guardan en un directorio temporal
+    Y que existe una plantilla maestra con campos de formulario PDF
+    Y que la plantilla tiene 3 trámites con datos del formulario
+
+  Escenario: Cada trámite recibe una versión nueva con el archivo base actual
+    Cuando se ejecuta la regeneración de documentos de la plantilla en lotes de 2
+    Entonces cada trámite debe tener 1 versión generada con el archivo base actual
+    Y cada documento regenerado debe contener los datos de su trámite
+    Cuando se ejecuta la regeneración de documentos de la plantilla en lotes de 2
+    Entonces cada trámite debe tener 1 versión generada con el archivo base actual
+
+  Escenario: Los documentos regenerados usan los permisos de archivo configurados
+    Dado que los archivos subidos se guardan con permisos "640"
+    Cuando se ejecuta la regeneración de documentos de la plantilla en lotes de 2
+    Entonces cada documento regenerado debe tener permisos "640"
+
+  Escenario: Los trámites de otra plantilla con el mismo tipo no se regeneran
+    Dado que otra plantilla con el mismo tipo específico tiene un trámite con datos
+    Cuando se ejecuta la regeneración de documentos de la plantilla en lotes de 2
+    Entonces el trámite de la otra plantilla no debe tener documentos
+
+  Escenario: Si el registro de los documentos falla no quedan archivos publicados
+    Cuando la regeneración de documentos falla al registrar los documentos
+    Entonces ningún trámite debe tener documentos
+    Y no debe quedar ningún PDF en las carpetas de los trámites
+    Cuando se ejecuta la regeneración de documentos de la plantilla en lotes de 2
+    Entonces cada trámite debe tener 1 versión generada con el archivo base actual
+
+  Escenario: El pool de procesos reparte el lote entre sus workers
+    Cuando se ejecuta la regeneración de documentos con un pool de 2 procesos
+    Entonces cada trámite debe tener 1 versión generada con el archivo base actual
+    Y cada documento regenerado debe contener los datos de su trámite
+    Y ningún renderizado debe haberse hecho en el proceso actual
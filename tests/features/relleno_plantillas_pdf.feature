@@ -0,0 +1,50 @@
+# language:es
+Característica: Relleno de plantillas PDF de varias páginas
+  Como solicitante de un trámite migratorio
+  Quiero que todos los campos del formulario oficial se rellenen con mis datos
+  Para obtener un documento completo aunque el formulario tenga varias páginas
+
+  Antecedentes:
+    Dado que existe una plantilla maestra PDF de 2 páginas con una casilla de verificación
+
+  Escenario: La extracción de campos calcula el índice de layout de todas las páginas
+    Cuando el sistema extrae los campos de la plantilla
+    Entonces el índice de layout debe ubicar el campo "pasaporte" en la página 2
+    Y la plantilla debe tener un campo de tipo "checkbox" llamado "acepta_terminos"
+
+  Escenario: El relleno alcanza los campos de todas las páginas
+    Dado que el sistema extrae los campos de la plantilla
+    Cuando se rellena la plantilla con el pasaporte "X123" y los términos aceptados
+    Entonces la página 2 del PDF generado debe contener el valor "X123" en el campo "pasaporte"
+    Y la casilla "acepta_terminos" del PDF generado debe quedar marcada
+
+  Escenario: Volver a extraer los campos conserva los existentes y su personalización
+    Dado que el sistema extrae los campos de la plantilla
+    Y que el administrador movió el campo "pasaporte" a la sección "Documentos" con orden 50
+    Cuando el sistema vuelve a extraer los campos de la plantilla
+    Entonces el campo "pasaporte" debe conservar su identificador, la sección "Documentos" y el orden 50
+    Y la re-extracción no debe crear ni eliminar campos
+
+  Escenario: El clasificador de campos admite idiomas configurados sin cambiar el código
+    Dado que la configuración del clasificador añade el idioma "pt" con la palabra clave "data" para fechas
+    Cuando se clasifican los nombres de campo "data_emissao, correo_contacto, nro_dni"
+    Entonces el campo "data_emissao" debe clasificarse como "date"
+    Y el campo "correo_contacto" debe clasificarse como "email"
+    Y el campo "nro_dni" debe mostrarse como "Número DNI"
+
+  Escenario: Una palabra más específica del nombre decide el tipo antes que las subcadenas
+    Cuando se clasifican los nombres de campo "lugar_nacimiento, fecha_nacimiento, numero_pasaporte, telefono_casa, birthdate, birth_place"
+    Entonces el campo "lugar_nacimiento" debe clasificarse como "text"
+    Y el campo "fecha_nacimiento" debe clasificarse como "date"
+    Y el campo "numero_pasaporte" debe clasificarse como "text"
+    Y el campo "telefono_casa" debe clasificarse como "number"
+    Y el campo "birthdate" debe clasificarse como "date"
+    Y el campo "birth_place" debe clasificarse como "text"
+
+  Escenario: El esquema del formulario se compila una vez y se invalida al editar un campo
+    Dado que el sistema extrae los campos de la plantilla
+    Y que el esquema del formulario de la plantilla ya fue compilado
+    Cuando se obtiene de nuevo el esquema del formulario
+    Entonces no se debe consultar la tabla de campos de la plantilla
+    Cuando el administrador marca el campo "pasaporte" como requerido
+    Entonces la validación de datos sin "pasaporte" debe fallar con "El campo 'Pasaporte' es requerido."
@@ -163,18 +163,20 @@ def step_impl(context):
 @step('que se ha asignado un trámite reciente al tramitador "A"')
 def step_impl(context):
     """
-    Simula una asignación previa al primer tramitador para probar Round-Robin.
+    Asigna un primer trámite con el servicio: el ciclo empieza por el primer tramitador (A).
     """
     # Asegurar que existen los tramitadores (reutiliza lógica si ya se ejecutó el antecedente)
     if not hasattr(context, 'tramitadores'):
         step_impl_tramitadores(context) # Llamada manual si no se usó antecedente
         
     tramitador_a = context.tramitadores[0] # Asumimos orden por ID o creación
-    
-    # Forzar el estado del algoritmo para que el último asignado sea A
-    from apps.tramites.models import UltimaAsignacion
-    UltimaAsignacion.objects.update_or_create(id=1, defaults={'ultimo_tramitador_id': tramitador_a.id})
-    
+
+    tramite_previo = _crear_tramite(context, nombre="Trámite Previo")
+    _ejecutar_asignacion(tramite_previo)
+    tramite_previo.refresh_from_db()
+    assert tramite_previo.tramitador_asignado_id == tramitador_a.id, \
+        f"El primer trámite se asignó a #{tramite_previo.tramitador_asignado_id}, no a {tramitador_a.email}"
+
     context.ultimo_asignado = tramitador_a
 
 @step("se crea un segundo trámite nuevo en el sistema")
@@ -207,3 +209,302 @@ def step_impl(context):
     tramitador_a = context.tramitadores[0]
     
     assert asignado.id != tramitador_a.id, "Se asignó nuevamente al tramitador A, falló el balanceo"
+
+@step(r"que hay (?P<cantidad>\d+) tramitadores activos más en el sistema")
+def step_impl_tramitadores_extra(context, cantidad):
+    context.tramitadores += [
+        _crear_tramitador(context, f"Tramitador Extra {i}", f"tramitador.extra{i}@example.com")
+        for i in range(int(cantidad))
+    ]
+
+@step(r"se asignan (?P<cantidad>\d+) trámites nuevos")
+def step_impl_asignar_varios(context, cantidad):
+    from collections import Counter
+    tramites = []
+    for i in range(int(cantidad)):
+        tramite = _crear_tramite(context, nombre=f"Trámite {i}")
+        _ejecutar_asignacion(tramite)
+        tramites.append(tramite)
+    context.reparto = Counter(t.tramitador_asignado_id for t in tramites)
+
+@step(r"cada tramitador debe recibir (?P<minimo>\d+) o (?P<maximo>\d+) trámites")
+def step_impl_reparto_equilibrado(context, minimo, maximo):
+    for tramitador in context.tramitadores:
+        recibidos = context.reparto.get(tramitador.id, 0)
+        assert int(minimo) <= recibidos <= int(maximo), \
+            f"{tramitador.email} recibió {recibidos} trámites (reparto: {dict(context.reparto)})"
+
+@step(r"dar de alta un nuevo tramitador debe incluirlo en las siguientes asignaciones")
+def step_impl_alta_tramitador(context):
+    """
+    La señal de usuario invalida la lista cacheada: el nuevo tramitador entra en el ciclo.
+    """
+    nuevo = _crear_tramitador(context, "Tramitador Nuevo", "tramitador.nuevo@example.com")
+    asignados = set()
+    for i in range(len(context.tramitadores) + 1):
+        tramite = _crear_tramite(context, nombre=f"Trámite posterior {i}")
+        _ejecutar_asignacion(tramite)
+        asignados.add(tramite.tramitador_asignado_id)
+    assert nuevo.id in asignados, "El nuevo tramitador no recibió trámites"
+
+def _tramitador_por_letra(context, letra):
+    return context.tramitadores["AB".index(letra)]
+
+@step(r'que la asignación usa la estrategia "(?P<modo>[^"]+)"')
+def step_impl_estrategia(context, modo):
+    from django.test import override_settings
+    ajustes = override_settings(ASIGNACION_TRAMITADORES={'MODO': modo, 'ROSTER_TTL': 300})
+    ajustes.enable()
+    context.add_cleanup(ajustes.disable)
+
+@step(r'que el tramitador "(?P<a>[AB])" tiene (?P<abiertos_a>\d+) trámites abiertos y el tramitador "(?P<b>[AB])" tiene (?P<abiertos_b>\d+)')
+def step_impl_carga_inicial(context, a, abiertos_a, b, abiertos_b):
+    from apps.tramites.models import Tramite
+    for letra, abiertos in ((a, abiertos_a), (b, abiertos_b)):
+        tramitador = _tramitador_por_letra(context, letra)
+        for i in range(int(abiertos)):
+            Tramite.objects.create(
+                solicitante=context.solicitante,
+                nombre=f"Trámite abierto {letra}{i}",
+                estado='EN_PROCESO' if i % 2 else 'PENDIENTE',
+                fecha_limite=timezone.now() + timedelta(days=30),
+                tramitador_asignado=tramitador,
+            )
+
+@step(r'el tramitador "(?P<a>[AB])" debe recibir (?P<total_a>\d+) trámites y el tramitador "(?P<b>[AB])" (?P<total_b>\d+)')
+def step_impl_reparto_por_carga(context, a, total_a, b, total_b):
+    for letra, total in ((a, total_a), (b, total_b)):
+        recibidos = context.reparto.get(_tramitador_por_letra(context, letra).id, 0)
+        assert recibidos == int(total), \
+            f"El tramitador {letra} recibió {recibidos} trámites, se esperaban {total} (reparto: {dict(context.reparto)})"
+
+@step(r'el tramitador "(?P<letra>[AB])" aprueba (?P<cantidad>\d+) de sus trámites')
+def step_impl_aprobar_varios(context, letra, cantidad):
+    from apps.tramites.models import Tramite
+    from apps.tramites.services.aprobacion_service import AprobacionTramiteService
+    tramitador = _tramitador_por_letra(context, letra)
+    pendientes = Tramite.objects.filter(tramitador_asignado=tramitador, estado='PENDIENTE').values_list('id', flat=True)
+    for tramite_id in list(pendientes)[:int(cantidad)]:
+        AprobacionTramiteService.aprobar_tramite(tramite_id, tramitador)
+
+@step(r"la carga registrada de cada tramitador debe coincidir con sus trámites abiertos")
+def step_impl_carga_coincide(context):
+    from apps.tramites.models import CargaTramitador, Tramite
+    for tramitador in context.tramitadores:
+        esperado = Tramite.objects.filter(tramitador_asignado=tramitador, estado__in=Tramite.ESTADOS_ABIERTOS).count()
+        registrado = CargaTramitador.objects.get(tramitador=tramitador).abiertos
+        assert registrado == esperado, \
+            f"{tramitador.email}: la carga registrada es {registrado}, pero tiene {esperado} trámites abiertos"
+
+@step(r"que no hay tramitadores activos y se crean (?P<cantidad>\d+) trámites")
+def step_impl_sin_tramitadores(context, cantidad):
+    for tramitador in context.tramitadores:
+        tramitador.is_active = False
+        tramitador.save()
+    context.tramites_en_espera = []
+    for i in range(int(cantidad)):
+        tramite = _crear_tramite(context, nombre=f"Trámite en espera {i}")
+        _ejecutar_asignacion(tramite)
+        context.tramites_en_espera.append(tramite)
+
+@step(r"ninguno de los trámites creados tiene tramitador asignado")
+def step_impl_sin_asignar(context):
+    from apps.tramites.models import Tramite
+    ids = [tramite.id for tramite in context.tramites_en_espera]
+    assert not Tramite.objects.filter(id__in=ids, tramitador_asignado__isnull=False).exists(), \
+        "Se asignó un trámite sin haber tramitadores activos"
+
+@step(r"se reactivan los tramitadores y se ejecuta la asignación en bloque con lotes de (?P<lote>\d+)")
+def step_impl_asignacion_en_bloque(context, lote):
+    from io import StringIO
+    from django.core.management import call_command
+    for tramitador in context.tramitadores:
+        tramitador.is_active = True
+        tramitador.save()
+    salida = StringIO()
+    call_command('asignar_tramites_pendientes', lote=int(lote), stdout=salida)
+    context.salida_comando = salida.getvalue()
+
+@step(r"los trámites creados quedan repartidos (?P<mayor>\d+) y (?P<menor>\d+) entre los tramitadores")
+def step_impl_reparto_en_bloque(context, mayor, menor):
+    from collections import Counter
+    from apps.tramites.models import Tramite
+    ids = [tramite.id for tramite in context.tramites_en_espera]
+    reparto = Counter(Tramite.objects.filter(id__in=ids).values_list('tramitador_asignado_id', flat=True))
+    assert None not in reparto, f"Quedaron trámites sin asignar: {context.salida_comando}"
+    assert sorted(reparto.values(), reverse=True) == [int(mayor), int(menor)], f"Reparto: {dict(reparto)}"
+    assert f"{len(ids)} trámites asignados" in context.salida_comando, context.salida_comando
+
+@step(r"cada trámite asignado en bloque debe tener su registro en el historial")
+def step_impl_historial_en_bloque(context):
+    from apps.tramites.models import HistorialCambios
+    for tramite in context.tramites_en_espera:
+        assert HistorialCambios.objects.filter(tramite=tramite, descripcion__contains="asignación en bloque").count() == 1, \
+            f"El trámite #{tramite.id} no tiene su registro de asignación en el historial"
+
+@step(r'el tramitador "(?P<letra>[AB])" rechaza (?P<cantidad>\d+) de sus trámites')
+def step_impl_rechazar_varios(context, letra, cantidad):
+    from apps.tramites.models import Tramite
+    from apps.tramites.services.aprobacion_service import AprobacionTramiteService
+    tramitador = _tramitador_por_letra(context, letra)
+    pendientes = Tramite.objects.filter(tramitador_asignado=tramitador, estado='PENDIENTE').values_list('id', flat=True)
+    for tramite_id in list(pendientes)[:int(cantidad)]:
+        AprobacionTramiteService.rechazar_tramite(tramite_id, tramitador, "Documentación incompleta")
+
+@step(r'se reasigna el trámite en proceso del tramitador "(?P<origen>[AB])" al tramitador "(?P<destino>[AB])"')
+def step_impl_reasignar(context, origen, destino):
+    from apps.tramites.models import Tramite
+    from apps.tramites.services.asignacion_service import AsignacionTramitadorService
+    tramite = Tramite.objects.get(tramitador_asignado=_tramitador_por_letra(context, origen), estado='EN_PROCESO')
+    AsignacionTramitadorService.reasignar_tramitador_a_tramite(tramite, _tramitador_por_letra(context, destino))
+
+@step(r"se detectan los trámites en proceso con la fecha límite vencida")
+def step_impl_detectar_retrasos(context):
+    from apps.tramites.models import Tramite
+    from apps.tramites.services.monitoring_service import detectar_retrasos
+    Tramite.objects.filter(estado='EN_PROCESO').update(fecha_limite=timezone.now() - timedelta(days=1))
+    detectar_retrasos()
+    assert Tramite.objects.filter(estado='RETRASADO').exists(), "Ningún trámite se marcó como retrasado"
+
+CAMPOS_ESTADISTICAS = (
+    'total_tramites', 'tramites_pendientes', 'tramites_aprobados', 'tramites_rechazados',
+    'tramites_en_proceso', 'tramites_completados',
+)
+
+def _estadisticas_por_conteo():
+    """
+    Consulta anterior a los contadores: COUNT filtrado sobre tramites_tramite por tramitador.
+    """
+    from django.contrib.auth import get_user_model
+    from django.db.models import Count, Q
+    def contar(estado=None):
+        return Count('tramites_asignados', filter=Q(tramites_asignados__estado=estado) if estado else None)
+    filas = get_user_model().objects.filter(rol='TRAMITADOR', is_active=True).annotate(
+        total_tramites=contar(),
+        tramites_pendientes=contar('PENDIENTE'),
+        tramites_aprobados=contar('APROBADO'),
+        tramites_rechazados=contar('RECHAZADO'),
+        tramites_en_proceso=contar('EN_PROCESO'),
+        tramites_completados=contar('COMPLETADO'),
+    )
+    return {fila.id: tuple(getattr(fila, campo) for campo in CAMPOS_ESTADISTICAS) for fila in filas}
+
+def _estadisticas_por_contadores():
+    from apps.tramites.services.asignacion_service import AsignacionTramitadorService
+    return {
+        fila.id: tuple(getattr(fila, campo) for campo in CAMPOS_ESTADISTICAS)
+        for fila in AsignacionTramitadorService.obtener_estadisticas_tramitadores()
+    }
+
+@step(r"las estadísticas de los tramitadores deben coincidir con sus trámites por estado")
+def step_impl_estadisticas_coinciden(context):
+    contadores, conteo = _estadisticas_por_contadores(), _estadisticas_por_conteo()
+    assert contadores == conteo, f"Contadores {contadores} != consulta COUNT {conteo} ({CAMPOS_ESTADISTICAS})"
+
+@step(r"las estadísticas de los tramitadores deben diferir de sus trámites por estado")
+def step_impl_estadisticas_difieren(context):
+    assert _estadisticas_por_contadores() != _estadisticas_por_conteo(), "Los contadores no quedaron desfasados"
+
+@step(r"las estadísticas de los tramitadores se obtienen sin consultar la tabla de trámites")
+def step_impl_estadisticas_sin_tramites(context):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from apps.tramites.services.asignacion_service import AsignacionTramitadorService
+    with CaptureQueriesContext(connection) as consultas:
+        list(AsignacionTramitadorService.obtener_estadisticas_tramitadores())
+    assert len(consultas) == 1, f"Se ejecutaron {len(consultas)} consultas"
+    assert 'tramites_tramite' not in consultas[0]['sql'], consultas[0]['sql']
+
+@step(r"se cambian trámites sin pasar por el ORM")
+def step_impl_cambios_sin_orm(context):
+    from apps.tramites.models import Tramite
+    # update() no envía señales: los contadores quedan desfasados hasta la reconstrucción
+    Tramite.objects.filter(tramitador_asignado__in=context.tramitadores, estado='RETRASADO').update(estado='COMPLETADO')
+    Tramite.objects.filter(tramitador_asignado=context.tramitadores[0], estado='APROBADO').update(
+        tramitador_asignado=context.tramitadores[1]
+    )
+
+@step(r"se reconstruyen las estadísticas de los tramitadores")
+def step_impl_reconstruir(context):
+    from io import StringIO
+    from django.core.management import call_command
+    call_command('reconstruir_estadisticas_tramitadores', stdout=StringIO())
+
+@step(r'que una petición leyó un trámite pendiente del tramitador "(?P<letra>[AB])"')
+def step_impl_lectura_previa(context, letra):
+    from apps.tramites.models import Tramite
+    context.tramite_leido = Tramite.objects.filter(
+        tramitador_asignado=_tramitador_por_letra(context, letra), estado='PENDIENTE'
+    ).first()
+
+@step(r"otra petición aprueba ese trámite")
+def step_impl_otra_aprueba(context):
+    from apps.tramites.services.aprobacion_service import AprobacionTramiteService
+    tramite = context.tramite_leido
+    AprobacionTramiteService.aprobar_tramite(tramite.id, tramite.tramitador_asignado)
+
+@step(r'la primera petición reasigna el trámite leído al tramitador "(?P<letra>[AB])"')
+def step_impl_reasignar_leido(context, letra):
+    """
+    La instancia todavía cree que el trámite está PENDIENTE.
+    """
+    from apps.tramites.services.asignacion_service import AsignacionTramitadorService
+    assert context.tramite_leido.estado == 'PENDIENTE'
+    AsignacionTramitadorService.reasignar_tramitador_a_tramite(context.tramite_leido, _tramitador_por_letra(context, letra))
+
+@step(r"que una petición leyó los trámites en proceso con la fecha límite vencida")
+def step_impl_lectura_retrasos(context):
+    """
+    Detiene detectar_retrasos justo después de su consulta: los cambios posteriores
+    llegan mientras recorre los trámites leídos.
+    """
+    from apps.tramites.models import Tramite
+    Tramite.objects.filter(estado='EN_PROCESO').update(fecha_limite=timezone.now() - timedelta(days=1))
+    Tramite.objects.filter(estado='PENDIENTE').update(fecha_limite=timezone.now() - timedelta(days=1))
+    context.tramites_leidos = list(Tramite.objects.filter(fecha_limite__lt=timezone.now(), estado__in=('EN_PROCESO', 'PENDIENTE')))
+
+@step(r"se marcan como retrasados los trámites leídos")
+def step_impl_marcar_leidos(context):
+    from unittest import mock
+    from apps.tramites.services.monitoring_service import detectar_retrasos
+    # Los trámites PENDIENTE leídos simulan filas que eran EN_PROCESO al consultar y cambiaron después
+    with mock.patch('apps.tramites.services.monitoring_service.Tramite.objects.filter', return_value=context.tramites_leidos):
+        detectar_retrasos()
+
+def _clave_filas_roster():
+    from apps.tramites.services.asignacion_service import CLAVE_ROSTER, obtener_roster_tramitadores
+    return f"{CLAVE_ROSTER}:carga:{hash(obtener_roster_tramitadores())}"
+
+@step(r"que una asignación que creó las filas de carga de los tramitadores se revirtió")
+def step_impl_asignacion_revertida(context):
+    from django.db import transaction
+    from apps.tramites.models import CargaTramitador
+    from apps.tramites.services.asignacion_service import EstrategiaMenorCarga
+
+    CargaTramitador.objects.all().delete()
+    try:
+        with transaction.atomic():
+            EstrategiaMenorCarga().seleccionar()
+            raise RuntimeError("Fallo posterior a la selección del tramitador")
+    except RuntimeError:
+        pass
+
+@step(r"no deben quedar filas de carga ni la marca de filas creadas en la caché")
+def step_impl_sin_filas_ni_marca(context):
+    from django.core.cache import cache
+    from apps.tramites.models import CargaTramitador
+    assert not CargaTramitador.objects.exists(), "Las filas de carga sobrevivieron a la reversión"
+    assert cache.get(_clave_filas_roster()) is None, "La caché marca como creadas filas revertidas"
+
+@step(r"que la caché da por creadas las filas de carga de los tramitadores")
+def step_impl_marca_filas(context):
+    from django.core.cache import cache
+    cache.set(_clave_filas_roster(), True, 300)
+
+@step(r"la estrategia de menor carga debe planificar (?P<cantidad>\d+) asignaciones aunque falten filas de carga")
+def step_impl_planificar_sin_filas(context, cantidad):
+    from apps.tramites.models import CargaTramitador
+    from apps.tramites.services.asignacion_service import EstrategiaMenorCarga
+    CargaTramitador.objects.all().delete()
+    plan = EstrategiaMenorCarga().planificar(int(cantidad))
+    assert len(plan) == int(cantidad), f"Plan incompleto: {plan}"
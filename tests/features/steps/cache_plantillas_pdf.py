@@ -0,0 +1,368 @@
+from behave import *
+from django.core.files.uploadedfile import SimpleUploadedFile
+import io
+import os
+
+use_step_matcher("re")
+
+# --- Helpers Internos ---
+
+def _generar_pdf_con_campos(nombres_campos):
+    """Genera en memoria un PDF con un campo de texto AcroForm por cada nombre."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    buffer = io.BytesIO()
+    can = canvas.Canvas(buffer, pagesize=letter)
+    y_position = 700
+    for nombre in nombres_campos:
+        can.drawString(72, y_position + 5, nombre)
+        can.acroForm.textfield(name=nombre, x=200, y=y_position, width=250, height=20)
+        y_position -= 40
+    can.save()
+    return buffer.getvalue()
+
+# --- Steps ---
+
+@step(r"que existe una plantilla maestra con campos de formulario PDF")
+def step_impl_plantilla_con_campos(context):
+    """
+    Crea una plantilla cuyo archivo base es un PDF real con campos AcroForm.
+    """
+    from apps.tramites.models import PlantillaDocumento
+    from apps.tramites.services.pdf_template_cache import limpiar_cache
+    from django.contrib.auth import get_user_model
+    Usuario = get_user_model()
+
+    admin, _ = Usuario.objects.get_or_create(
+        email='admin.cache@example.com',
+        defaults={'nombre': 'Admin Cache', 'rol': 'ADMINISTRADOR'}
+    )
+
+    contenido = _generar_pdf_con_campos(['nombre_completo', 'numero_pasaporte'])
+    context.plantilla = PlantillaDocumento.objects.create(
+        nombre="Formulario Cache",
+        segmento="Visas",
+        tipo_especifico="Visa Cache",
+        archivo_base=SimpleUploadedFile("formulario_cache.pdf", contenido, content_type="application/pdf"),
+        administrador=admin,
+        activo=True
+    )
+    limpiar_cache()
+
+@step(r"se rellena la plantilla (?P<veces>\d+) veces con datos del solicitante")
+def step_impl_rellenar_varias_veces(context, veces):
+    """
+    Ejecuta el relleno de la plantilla varias veces seguidas.
+    """
+    from apps.tramites.services.tramite_service import _rellenar_pdf_plantilla
+
+    context.pdfs_generados = []
+    for i in range(int(veces)):
+        buffer = _rellenar_pdf_plantilla(context.plantilla, {'nombre_completo': f'Solicitante {i}'})
+        context.pdfs_generados.append((f'Solicitante {i}', buffer.getvalue()))
+
+@step(r"la caché debe registrar (?P<fallos>\d+) fallo y (?P<aciertos>\d+) aciertos")
+def step_impl_verificar_contadores(context, fallos, aciertos):
+    """
+    Verifica los contadores de la caché de plantillas.
+    """
+    from apps.tramites.services.pdf_template_cache import estadisticas_cache
+    stats = estadisticas_cache()
+    assert stats['fallos'] == int(fallos), f"Fallos esperados {fallos}, obtenidos {stats['fallos']}"
+    assert stats['aciertos'] == int(aciertos), f"Aciertos esperados {aciertos}, obtenidos {stats['aciertos']}"
+
+@step(r"cada PDF generado debe contener el valor enviado")
+def step_impl_verificar_valores(context):
+    """
+    Verifica que la reutilización de la caché no mezcle valores entre rellenos.
+    """
+    import PyPDF2
+    for valor_esperado, contenido in context.pdfs_generados:
+        pagina = PyPDF2.PdfReader(io.BytesIO(contenido)).pages[0]
+        valores = {
+            anotacion.get_object().get('/T'): anotacion.get_object().get('/V')
+            for anotacion in pagina['/Annots']
+        }
+        assert valores.get('nombre_completo') == valor_esperado, \
+            f"Se esperaba '{valor_esperado}', el PDF contiene '{valores.get('nombre_completo')}'"
+
+@step(r"que la plantilla ya fue rellenada una vez")
+def step_impl_rellenada_una_vez(context):
+    """
+    Rellena la plantilla para que quede en caché.
+    """
+    from apps.tramites.services.tramite_service import _rellenar_pdf_plantilla
+    from apps.tramites.services.pdf_template_cache import estadisticas_cache
+    _rellenar_pdf_plantilla(context.plantilla, {'nombre_completo': 'Solicitante'})
+    assert estadisticas_cache()['entradas'] == 1, "La plantilla no quedó en caché"
+
+@step(r"el administrador elimina la plantilla maestra")
+def step_impl_eliminar_plantilla(context):
+    """
+    Elimina la plantilla usando el servicio de administración.
+    """
+    from apps.tramites.services.storage_service import eliminar_plantilla_documento
+    eliminar_plantilla_documento(context.plantilla.id)
+
+@step(r"la caché no debe conservar entradas de la plantilla")
+def step_impl_cache_vacia(context):
+    """
+    Verifica que la plantilla eliminada ya no esté en caché.
+    """
+    from apps.tramites.services.pdf_template_cache import estadisticas_cache
+    stats = estadisticas_cache()
+    assert stats['entradas'] == 0, f"La caché conserva {stats['entradas']} entradas"
+    assert stats['invalidaciones'] == 1, "No se registró la invalidación"
+
+def _renderizado_en_linea(directorio):
+    """Renderiza en el proceso actual con una caché de renderizados en un directorio temporal."""
+    from django.test import override_settings
+    return override_settings(
+        PDF_RENDER_ENGINE={'MODO': 'inline'},
+        PDF_RENDER_CACHE={'ACTIVO': True, 'DIRECTORIO': directorio, 'MAX_BYTES': 10 * 1024 * 1024},
+    )
+
+@step(r"se genera el PDF de la plantilla (?P<veces>\d+) veces con los mismos datos")
+def step_impl_generar_mismos_datos(context, veces):
+    """
+    Genera el PDF por el punto de entrada del motor de renderizado.
+    """
+    import tempfile
+    from apps.tramites.services.pdf_render_engine import renderizar_pdf
+    from apps.tramites.services.pdf_render_cache import limpiar_cache_renderizado
+
+    limpiar_cache_renderizado()
+    context.pdfs_renderizados = []
+    with tempfile.TemporaryDirectory() as directorio, _renderizado_en_linea(directorio):
+        for _ in range(int(veces)):
+            buffer = renderizar_pdf(context.plantilla, {'nombre_completo': 'Solicitante Repetido'})
+            context.pdfs_renderizados.append(buffer.getvalue())
+
+@step(r"la caché de renderizados debe registrar (?P<fallos>\d+) fallos? y (?P<aciertos>\d+) aciertos?")
+def step_impl_verificar_cache_renderizado(context, fallos, aciertos):
+    """
+    Verifica los contadores de la caché de PDFs renderizados.
+    """
+    from apps.tramites.services.pdf_render_cache import estadisticas_cache_renderizado
+    stats = estadisticas_cache_renderizado()
+    assert stats['fallos'] == int(fallos), f"Fallos esperados {fallos}, obtenidos {stats['fallos']}"
+    assert stats['aciertos'] == int(aciertos), f"Aciertos esperados {aciertos}, obtenidos {stats['aciertos']}"
+
+@step(r"se genera el PDF de la plantilla en un archivo con (?:la caché de renderizados activa|la versión de renderizador (?P<version>\d+))")
+def step_impl_generar_a_archivo(context, version=None):
+    """
+    Genera el PDF como el versionado de documentos: en un archivo temporal del directorio destino.
+    """
+    import tempfile
+    from unittest import mock
+    from apps.tramites.services import pdf_render_cache
+    from apps.tramites.services.pdf_render_engine import renderizar_pdf_a_archivo
+
+    if not hasattr(context, 'directorio_renderizados'):
+        pdf_render_cache.limpiar_cache_renderizado()
+        context.directorio_renderizados = tempfile.TemporaryDirectory()
+        context.add_cleanup(context.directorio_renderizados.cleanup)
+    raiz = context.directorio_renderizados.name
+    version = int(version) if version else pdf_render_cache.VERSION_RENDERIZADO
+    with _renderizado_en_linea(os.path.join(raiz, 'cache')), \
+            mock.patch.object(pdf_render_cache, 'VERSION_RENDERIZADO', version):
+        context.ruta_generada = renderizar_pdf_a_archivo(
+            context.plantilla, {'nombre_completo': 'Solicitante Enlazado'}, os.path.join(raiz, 'documentos')
+        )
+    context.directorio_cache = os.path.join(raiz, 'cache')
+
+@step(r"la entrada de la caché debe ser un enlace al mismo archivo que el PDF generado")
+def step_impl_cache_enlazada(context):
+    entradas = [
+        os.path.join(carpeta, nombre)
+        for carpeta, _, nombres in os.walk(context.directorio_cache) for nombre in nombres
+    ]
+    assert len(entradas) == 1, entradas
+    assert os.path.samefile(entradas[0], context.ruta_generada), "La caché guardó una copia del PDF"
+
+@step(r"ambos PDFs generados deben ser idénticos")
+def step_impl_pdfs_identicos(context):
+    """
+    Verifica que el acierto devuelva exactamente los bytes renderizados la primera vez.
+    """
+    primero, segundo = context.pdfs_renderizados
+    assert primero == segundo, "El PDF servido desde la caché difiere del renderizado"
+
+@step(r"que existe un trámite con su documento generado desde la plantilla")
+def step_impl_tramite_con_documento(context):
+    """
+    Crea un trámite generando su primer documento de forma síncrona.
+    """
+    import tempfile
+    from apps.tramites.services.pdf_field_extractor import extraer_campos_pdf
+    from apps.tramites.services.tramite_service import iniciar_nuevo_tramite
+    from django.contrib.auth import get_user_model
+    Usuario = get_user_model()
+
+    extraer_campos_pdf(context.plantilla)
+    context.solicitante, _ = Usuario.objects.get_or_create(
+        email='solicitante.cache@example.com',
+        defaults={'nombre': 'Solicitante Cache', 'rol': 'SOLICITANTE'}
+    )
+    context.datos_tramite = {'nombre_completo': 'Ana Pérez', 'numero_pasaporte': 'P123'}
+    context.directorio_renderizados = tempfile.TemporaryDirectory()
+    with _renderizado_en_linea(context.directorio_renderizados.name):
+        context.tramite = iniciar_nuevo_tramite(
+            context.solicitante, context.plantilla, context.datos_tramite, asincrono=False
+        )
+
+@step(r"el solicitante guarda el trámite con (?P<cuales>los mismos datos|datos distintos)")
+def step_impl_guardar_tramite(context, cuales):
+    """
+    Actualiza los datos del trámite como lo hace la vista de edición.
+    """
+    from apps.tramites.services.tramite_service import actualizar_datos_tramite
+    datos = dict(context.datos_tramite)
+    if cuales == 'datos distintos':
+        datos['numero_pasaporte'] = 'P999'
+    with _renderizado_en_linea(context.directorio_renderizados.name):
+        actualizar_datos_tramite(context.tramite.id, context.solicitante, datos)
+
+@step(r"el trámite debe tener (?P<cantidad>\d+) versi(?:ón|ones) del documento")
+def step_impl_versiones_documento(context, cantidad):
+    """
+    Cuenta las versiones del documento del trámite.
+    """
+    from apps.tramites.models import Documento
+    versiones = Documento.objects.filter(tramite=context.tramite).count()
+    assert versiones == int(cantidad), f"Se esperaban {cantidad} versiones, hay {versiones}"
+
+@step(r'la última versión del documento debe contener el pasaporte "(?P<pasaporte>[^"]+)"')
+def step_impl_valor_ultima_version(context, pasaporte):
+    """
+    Verifica que la nueva versión contenga el valor nuevo sin perder los no modificados.
+    """
+    import PyPDF2
+    from apps.tramites.models import Documento
+    ultima = Documento.objects.filter(tramite=context.tramite).order_by('-version').first()
+    with ultima.archivo.open('rb') as archivo:
+        pagina = PyPDF2.PdfReader(io.BytesIO(archivo.read()), strict=True).pages[0]
+    valores = {
+        anotacion.get_object().get('/T'): anotacion.get_object().get('/V')
+        for anotacion in pagina['/Annots']
+    }
+    assert valores.get('numero_pasaporte') == pasaporte, \
+        f"Se esperaba '{pasaporte}', el PDF contiene '{valores.get('numero_pasaporte')}'"
+    assert valores.get('nombre_completo') == 'Ana Pérez', "Se perdió un valor no modificado"
+
+@step(r'se renderizan (?P<veces>\d+) PDFs distintos con el pool de procesos "(?P<contexto>[^"]+)"')
+def step_impl_renderizar_en_pool(context, veces, contexto):
+    """
+    Renderiza con la configuración por defecto del motor (procesos), sin caché de renderizados.
+    """
+    from django.test import override_settings
+    from apps.tramites.services.pdf_render_engine import obtener_motor, renderizar_pdf
+
+    context.pdfs_generados = []
+    with override_settings(
+        PDF_RENDER_ENGINE={'MODO': 'procesos', 'MAX_WORKERS': 1, 'TIMEOUT': 60, 'CONTEXTO': contexto},
+        PDF_RENDER_CACHE={'ACTIVO': False},
+    ):
+        for i in range(int(veces)):
+            buffer = renderizar_pdf(context.plantilla, {'nombre_completo': f'Solicitante {i}'})
+            context.pdfs_generados.append((f'Solicitante {i}', buffer.getvalue()))
+        context.renderizados_locales = obtener_motor().renderizados_locales
+
+@step(r"ningún renderizado debe haberse hecho en el proceso actual")
+def step_impl_sin_renderizado_local(context):
+    assert context.renderizados_locales == 0, \
+        f"{context.renderizados_locales} renderizados cayeron al proceso actual (pool averiado)"
+
+@step(r"un administrador consulta las métricas de servicio en formato Prometheus")
+def step_impl_consultar_metricas_prometheus(context):
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.urls import reverse
+    administrador = get_user_model().objects.get(email='admin.cache@example.com')
+    cliente = Client()
+    cliente.force_login(administrador)
+    context.respuesta_metricas = cliente.get(reverse('tramites:metricas_servicio'))
+
+@step(r"las métricas deben exportar (?P<aciertos>\d+) aciertos y (?P<fallos>\d+) fallo de la caché de plantillas")
+def step_impl_metricas_cache(context, aciertos, fallos):
+    assert context.respuesta_metricas.status_code == 200, context.respuesta_metricas.status_code
+    texto = context.respuesta_metricas.content.decode()
+    proceso = os.getpid()
+    for campo, esperado in (('aciertos', aciertos), ('fallos', fallos)):
+        linea = f'tramites_cache_{campo}_total{{cache="plantillas",proceso="{proceso}"}} {esperado}'
+        assert linea in texto, f"No se encontró '{linea}' en:\n{texto}"
+
+def _huella_lector(parseada):
+    """Contenido, fuentes y número de páginas del lector cacheado, para detectar modificaciones."""
+    paginas = []
+    for pagina in parseada.reader.pages:
+        fuentes = pagina.get('/Resources', {}).get_object().get('/Font')
+        paginas.append((
+            pagina.get_contents().get_data() if pagina.get_contents() is not None else b'',
+            sorted(fuentes.get_object().keys()) if fuentes is not None else [],
+        ))
+    return len(parseada.reader.pages), paginas
+
+@step(r"que existe una plantilla maestra de una página sin campos de formulario")
+def step_impl_plantilla_sin_campos(context):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from apps.tramites.models import PlantillaDocumento
+
+    buffer = io.BytesIO()
+    can = canvas.Canvas(buffer, pagesize=letter)
+    can.drawString(72, 750, "Encabezado de la plantilla")
+    can.save()
+    context.plantilla = PlantillaDocumento.objects.create(
+        nombre="Formulario Superpuesto",
+        segmento="Visas",
+        tipo_especifico="Visa Superpuesta",
+        archivo_base=SimpleUploadedFile("formulario_superpuesto.pdf", buffer.getvalue(), content_type="application/pdf"),
+        administrador=context.plantilla.administrador,
+        activo=True
+    )
+
+@step(r"se superponen (?P<total>\d+) datos sobre la plantilla dos veces con valores distintos")
+def step_impl_superponer(context, total):
+    import PyPDF2
+    from apps.tramites.services.pdf_template_cache import obtener_plantilla_parseada
+    from apps.tramites.services.tramite_service import _generar_pdf_con_datos_superpuestos
+
+    parseada = obtener_plantilla_parseada(context.plantilla)
+    assert not parseada.tiene_acroform
+    context.huella_lector = _huella_lector(parseada)
+    context.pdfs_superpuestos = {}
+    for relleno in ('uno', 'dos'):
+        datos = {f'dato_{i}': f'valor-{relleno}-{i}' for i in range(1, int(total) + 1)}
+        buffer = _generar_pdf_con_datos_superpuestos(context.plantilla, datos, parseada=parseada)
+        context.pdfs_superpuestos[relleno] = [
+            pagina.extract_text() for pagina in PyPDF2.PdfReader(io.BytesIO(buffer.getvalue())).pages
+        ]
+    context.parseada = parseada
+
+@step(r"cada PDF superpuesto debe conservar el texto de la plantilla en la primera página")
+def step_impl_texto_plantilla(context):
+    for relleno, paginas in context.pdfs_superpuestos.items():
+        assert "Encabezado de la plantilla" in paginas[0], f"Relleno {relleno}: {paginas[0]!r}"
+
+@step(r"la primera página debe contener los datos (?P<desde>\d+) a (?P<hasta>\d+) y la página añadida los datos (?P<desde_extra>\d+) a (?P<hasta_extra>\d+)")
+def step_impl_paginas_superpuestas(context, desde, hasta, desde_extra, hasta_extra):
+    for relleno, paginas in context.pdfs_superpuestos.items():
+        assert len(paginas) == 2, f"Relleno {relleno}: {len(paginas)} páginas"
+        for indice_pagina, primero, ultimo in ((0, desde, hasta), (1, desde_extra, hasta_extra)):
+            for i in range(int(primero), int(ultimo) + 1):
+                linea = f"Dato {i}: valor-{relleno}-{i}"
+                assert linea in paginas[indice_pagina], \
+                    f"Relleno {relleno}: falta '{linea}' en la página {indice_pagina + 1}"
+        assert f"valor-{relleno}-{int(desde_extra)}" not in paginas[0]
+
+@step(r"ningún PDF superpuesto debe contener valores del otro relleno")
+def step_impl_sin_mezcla(context):
+    texto_uno = "".join(context.pdfs_superpuestos['uno'])
+    texto_dos = "".join(context.pdfs_superpuestos['dos'])
+    assert "valor-dos-" not in texto_uno and "valor-uno-" not in texto_dos
+
+@step(r"el lector cacheado de la plantilla no debe haber cambiado")
+def step_impl_lector_intacto(context):
+    assert _huella_lector(context.parseada) == context.huella_lector, "El renderizado modificó el lector cacheado"
@@ -0,0 +1,104 @@
+from behave import *
+
+use_step_matcher("re")
+
+# --- Helpers Internos ---
+
+def _worker_en_linea(context):
+    """
+    Worker de documentos sin hilos (ejecuta el trabajo al confirmar) y renderizado en el
+    proceso actual, para que el trabajo vea la transacción del escenario.
+    """
+    from django.test import override_settings
+    ajustes = override_settings(
+        TRAMITE_DOCUMENTO_ASINCRONO=True,
+        TRAMITE_DOCUMENTO_WORKERS=0,
+        PDF_RENDER_ENGINE={'MODO': 'inline'},
+        PDF_RENDER_CACHE={'ACTIVO': False},
+    )
+    ajustes.enable()
+    context.add_cleanup(ajustes.disable)
+
+# --- Pasos ---
+
+@step(r"que existe un solicitante autenticado para la generación diferida")
+def step_impl_solicitante_autenticado(context):
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from apps.tramites.services.pdf_field_extractor import extraer_campos_pdf
+    Usuario = get_user_model()
+
+    extraer_campos_pdf(context.plantilla)
+    context.solicitante, _ = Usuario.objects.get_or_create(
+        email='solicitante.diferido@example.com',
+        defaults={'nombre': 'Solicitante Diferido', 'rol': 'SOLICITANTE'}
+    )
+    context.cliente = Client()
+    context.cliente.force_login(context.solicitante)
+    _worker_en_linea(context)
+
+@step(r'el solicitante envía el formulario en línea con el pasaporte "(?P<pasaporte>[^"]+)"')
+def step_impl_enviar_formulario(context, pasaporte):
+    """
+    Envía el formulario como la sección en línea de formulario_dinamico.html. Los trabajos
+    on_commit se capturan: la transacción del escenario nunca se confirma.
+    """
+    from django.test import TestCase
+    from django.urls import reverse
+    from apps.tramites.models import Tramite
+
+    with TestCase.captureOnCommitCallbacks() as context.trabajos_en_cola:
+        respuesta = context.cliente.post(
+            reverse('tramites:iniciar_tramite', args=[context.plantilla.id]),
+            {'nombre_completo': 'Ana Pérez', 'numero_pasaporte': pasaporte},
+        )
+    assert respuesta.status_code == 302, respuesta.status_code
+    context.tramite = Tramite.objects.get(solicitante=context.solicitante)
+
+@step(r"el worker de documentos procesa los trabajos en cola")
+def step_impl_worker_procesa(context):
+    assert context.trabajos_en_cola, "No se encoló la generación del documento"
+    for trabajo in context.trabajos_en_cola:
+        trabajo()
+
+@step(r'el trámite debe quedar con el documento en estado "(?P<estado>[^"]+)"')
+def step_impl_estado_documento(context, estado):
+    context.tramite.refresh_from_db()
+    assert context.tramite.estado_documento == estado, context.tramite.estado_documento
+
+@step(r'la consulta del estado del documento debe responder "(?P<estado>[^"]+)"')
+def step_impl_consulta_estado(context, estado):
+    """
+    Consulta el endpoint que sondea el dashboard del solicitante.
+    """
+    from django.urls import reverse
+    respuesta = context.cliente.get(reverse('tramites:estado_documento', args=[context.tramite.id]))
+    assert respuesta.status_code == 200, respuesta.status_code
+    assert respuesta.json()['estado_documento'] == estado, respuesta.json()
+
+@step(r'que existe un trámite cuyo documento quedó en "(?P<estado>[^"]+)" hace (?P<minutos>\d+) minutos')
+def step_impl_tramite_abandonado(context, estado, minutos):
+    """
+    Simula un trabajo perdido: el trámite se crea en modo asíncrono y su trabajo on_commit
+    se descarta, como ocurre si el proceso se reinicia antes de ejecutarlo.
+    """
+    from datetime import timedelta
+    from django.test import TestCase
+    from django.utils import timezone
+    from apps.tramites.models import Tramite
+    from apps.tramites.services.tramite_service import iniciar_nuevo_tramite
+
+    with TestCase.captureOnCommitCallbacks():
+        context.tramite = iniciar_nuevo_tramite(
+            context.solicitante, context.plantilla,
+            {'nombre_completo': 'Ana Pérez', 'numero_pasaporte': 'P123'}, asincrono=True
+        )
+    Tramite.objects.filter(id=context.tramite.id).update(
+        estado_documento=estado, estado_documento_desde=timezone.now() - timedelta(minutes=int(minutos))
+    )
+
+@step(r"se ejecuta la recuperación de trabajos pendientes con un límite de (?P<minutos>\d+) minutos")
+def step_impl_recuperar(context, minutos):
+    import io
+    from django.core.management import call_command
+    call_command('recuperar_trabajos_pendientes', minutos=int(minutos), stdout=io.StringIO())
@@ -0,0 +1,206 @@
+from behave import *
+from django.core.files.uploadedfile import SimpleUploadedFile
+import io
+
+use_step_matcher("re")
+
+# --- Helpers Internos ---
+
+def _generar_pdf_con_campos(nombres=('nombre_completo', 'numero_pasaporte')):
+    """
+    Genera en memoria un PDF de una página con un campo de texto por cada nombre.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    can = canvas.Canvas(buffer, pagesize=letter)
+    can.drawString(72, 720, "Solicitud de Residencia")
+    for i, nombre in enumerate(nombres):
+        can.acroForm.textfield(name=nombre, x=200, y=680 - 40 * i, width=250, height=18)
+    can.showPage()
+    can.save()
+    return buffer.getvalue()
+
+def _subir_plantilla(context, nombre, contenido):
+    from apps.tramites.services.storage_service import crear_plantilla_documento
+    archivo = SimpleUploadedFile(f"{nombre.lower().replace(' ', '_')}.pdf", contenido, content_type="application/pdf")
+    context.contenido_subido = contenido
+    context.plantilla = crear_plantilla_documento(
+        nombre, 'Residencias', nombre, archivo, context.administrador, asincrono=True
+    )
+
+# --- Pasos ---
+
+@step(r'que existe un administrador para la ingesta de plantillas')
+def step_impl_admin_ingesta(context):
+    from django.contrib.auth import get_user_model
+    Usuario = get_user_model()
+    context.administrador, _ = Usuario.objects.get_or_create(
+        email='admin.ingesta@example.com',
+        defaults={'nombre': 'Admin Ingesta', 'rol': 'ADMINISTRADOR', 'is_staff': True}
+    )
+
+@step(r'(?:que )?el administrador (?:sube|subió) la plantilla "(?P<nombre>[^"]+)" con un PDF con campos')
+def step_impl_subir_pdf_con_campos(context, nombre):
+    _subir_plantilla(context, nombre, _generar_pdf_con_campos())
+
+@step(r'el administrador sube la plantilla "(?P<nombre>[^"]+)" con un archivo que no es PDF')
+def step_impl_subir_no_pdf(context, nombre):
+    _subir_plantilla(context, nombre, b"esto no es un documento pdf")
+
+@step(r'el worker de plantillas procesa la plantilla')
+def step_impl_worker_procesa(context):
+    """
+    Ejecuta el pipeline como lo haría el worker tras el commit (on_commit no se dispara en las pruebas).
+    """
+    from apps.tramites.services.storage_service import procesar_plantilla_documento
+    try:
+        procesar_plantilla_documento(context.plantilla.id)
+    except Exception:
+        pass  # Como en el worker: el motivo queda en error_procesamiento
+    context.plantilla.refresh_from_db()
+
+@step(r'la plantilla debe quedar en estado de procesamiento "(?P<estado>[^"]+)" e inactiva')
+def step_impl_estado_inactiva(context, estado):
+    context.plantilla.refresh_from_db()
+    assert context.plantilla.estado_procesamiento == estado, context.plantilla.estado_procesamiento
+    assert not context.plantilla.activo, "La plantilla no debería estar activa"
+
+@step(r'la plantilla debe quedar en estado de procesamiento "(?P<estado>[^"]+)" y activa')
+def step_impl_estado_activa(context, estado):
+    assert context.plantilla.estado_procesamiento == estado, \
+        f"{context.plantilla.estado_procesamiento}: {context.plantilla.error_procesamiento}"
+    assert context.plantilla.activo, "La plantilla debería estar activa"
+
+@step(r'la plantilla no debe tener campos todavía')
+def step_impl_sin_campos(context):
+    assert not context.plantilla.campos.exists(), list(context.plantilla.campos.values_list('nombre_tecnico', flat=True))
+
+@step(r'la plantilla debe tener el campo extraído "(?P<nombre>[^"]+)"')
+def step_impl_campo_extraido(context, nombre):
+    assert context.plantilla.campos.filter(nombre_tecnico=nombre).exists(), \
+        list(context.plantilla.campos.values_list('nombre_tecnico', flat=True))
+    assert nombre in context.plantilla.indice_campos.get('campos', {}), "El índice de layout no incluye el campo"
+
+@step(r'el error de procesamiento debe indicar "(?P<texto>[^"]+)"')
+def step_impl_error_procesamiento(context, texto):
+    assert texto in context.plantilla.error_procesamiento, context.plantilla.error_procesamiento
+
+@step(r'el administrador consulta el estado de procesamiento de la plantilla')
+def step_impl_consultar_estado(context):
+    from django.test import Client
+    from django.urls import reverse
+    cliente = Client()
+    cliente.force_login(context.administrador)
+    context.respuesta_estado = cliente.get(reverse('usuarios:estado-plantilla', args=[context.plantilla.id]))
+
+@step(r'la respuesta debe indicar el estado de procesamiento "(?P<estado>[^"]+)"')
+def step_impl_respuesta_estado(context, estado):
+    assert context.respuesta_estado.status_code == 200, context.respuesta_estado.status_code
+    assert context.respuesta_estado.json()['estado_procesamiento'] == estado, context.respuesta_estado.json()
+
+@step(r'el administrador sube el mismo PDF como la plantilla "(?P<nombre>[^"]+)"')
+def step_impl_subir_duplicado(context, nombre):
+    from unittest import mock
+    context.plantilla_original = context.plantilla
+    # Una subida duplicada no debe encolar ni ejecutar la extracción
+    with mock.patch('apps.tramites.services.storage_service.encolar_procesamiento_plantilla') as encolar, \
+            mock.patch('apps.tramites.services.storage_service.extraer_campos_pdf') as extraer:
+        _subir_plantilla(context, nombre, context.contenido_subido)
+    context.procesamientos_duplicado = encolar.call_count + extraer.call_count
+
+@step(r'la nueva plantilla debe quedar en estado de procesamiento "(?P<estado>[^"]+)" y activa sin procesarse')
+def step_impl_duplicado_lista(context, estado):
+    context.plantilla.refresh_from_db()
+    assert context.plantilla.estado_procesamiento == estado, context.plantilla.estado_procesamiento
+    assert context.plantilla.activo, "La plantilla duplicada debería estar activa"
+    assert context.procesamientos_duplicado == 0, "La subida duplicada volvió a procesar el PDF"
+
+@step(r'ambas plantillas deben compartir el mismo archivo almacenado')
+def step_impl_mismo_archivo(context):
+    original = context.plantilla_original
+    assert context.plantilla.archivo_base.name == original.archivo_base.name, \
+        f"{context.plantilla.archivo_base.name} != {original.archivo_base.name}"
+    assert context.plantilla.huella_archivo in original.archivo_base.name
+    assert context.plantilla.indice_campos == original.indice_campos
+
+@step(r'la nueva plantilla debe tener los mismos campos que la original')
+def step_impl_mismos_campos(context):
+    def campos(plantilla):
+        return list(plantilla.campos.order_by('nombre_tecnico').values_list('nombre_tecnico', 'tipo_campo', 'orden'))
+    assert campos(context.plantilla) == campos(context.plantilla_original), \
+        f"{campos(context.plantilla)} != {campos(context.plantilla_original)}"
+
+@step(r'al eliminar la plantilla original el archivo compartido debe conservarse')
+def step_impl_eliminar_original(context):
+    from apps.tramites.services.storage_service import eliminar_plantilla_documento
+    eliminar_plantilla_documento(context.plantilla_original.id)
+    context.plantilla.refresh_from_db()
+    assert context.plantilla.archivo_base.storage.exists(context.plantilla.archivo_base.name), \
+        "Se borró el archivo que aún usa otra plantilla"
+
+@step(r'que la plantilla quedó en estado de procesamiento "(?P<estado>[^"]+)" hace (?P<minutos>\d+) minutos')
+def step_impl_plantilla_abandonada(context, estado, minutos):
+    """
+    Simula un trabajo perdido por un reinicio: el trabajo on_commit nunca se ejecutó.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.tramites.models import PlantillaDocumento
+    PlantillaDocumento.objects.filter(id=context.plantilla.id).update(
+        estado_procesamiento=estado, estado_procesamiento_desde=timezone.now() - timedelta(minutes=int(minutos))
+    )
+
+@step(r'se ejecuta la recuperación de trabajos pendientes de plantillas')
+def step_impl_recuperar_plantillas(context):
+    from django.core.management import call_command
+    call_command('recuperar_trabajos_pendientes', minutos=15, stdout=io.StringIO())
+    context.plantilla.refresh_from_db()
+
+@step(r'el administrador reemplaza en el admin el archivo de la plantilla por un PDF con el campo "(?P<campo>[^"]+)"')
+def step_impl_reemplazar_en_admin(context, campo):
+    """
+    Guarda el formulario del admin como lo hace la vista de edición, con el worker de
+    plantillas sin hilos y ejecutando los trabajos on_commit capturados.
+    """
+    from django.contrib.admin.sites import site
+    from django.test import RequestFactory, TestCase, override_settings
+    from apps.tramites.models import PlantillaDocumento
+
+    modelo_admin = site._registry[PlantillaDocumento]
+    request = RequestFactory().post('/admin/')
+    request.user = context.administrador
+
+    contenido = _generar_pdf_con_campos(('nombre_completo', campo))
+    formulario = modelo_admin.get_form(request, context.plantilla)(
+        data={
+            'nombre': context.plantilla.nombre, 'segmento': context.plantilla.segmento,
+            'tipo_especifico': context.plantilla.tipo_especifico, 'activo': 'on',
+            'administrador': context.administrador.id,
+        },
+        files={'archivo_base': SimpleUploadedFile("reemplazo.pdf", contenido, content_type="application/pdf")},
+        instance=context.plantilla,
+    )
+    assert formulario.is_valid(), formulario.errors
+
+    with override_settings(PLANTILLA_INGESTA_ASINCRONA=True, PLANTILLA_INGESTA_WORKERS=0), \
+            TestCase.captureOnCommitCallbacks(execute=True) as trabajos:
+        modelo_admin.save_model(request, formulario.save(commit=False), formulario, change=True)
+    assert trabajos, "El reemplazo no encoló el procesamiento de la plantilla"
+    context.contenido_subido = contenido
+    context.plantilla.refresh_from_db()
+
+@step(r'la plantilla ya no debe tener el campo "(?P<nombre>[^"]+)"')
+def step_impl_sin_campo(context, nombre):
+    assert not context.plantilla.campos.filter(nombre_tecnico=nombre).exists(), "Quedó un campo del archivo anterior"
+    assert nombre not in context.plantilla.indice_campos.get('campos', {}), "El índice de layout conserva el campo anterior"
+
+@step(r'el archivo de la plantilla debe estar en el almacén por huella')
+def step_impl_archivo_por_huella(context):
+    from apps.tramites.services.storage_service import DIRECTORIO_PLANTILLAS_POR_HUELLA
+    import hashlib
+    huella = hashlib.sha256(context.contenido_subido).hexdigest()
+    assert context.plantilla.huella_archivo == huella, "La huella no corresponde al archivo nuevo"
+    assert context.plantilla.archivo_base.name == f"{DIRECTORIO_PLANTILLAS_POR_HUELLA}/{huella[:2]}/{huella}.pdf", \
+        context.plantilla.archivo_base.name
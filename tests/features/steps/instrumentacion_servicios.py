@@ -0,0 +1,95 @@
+from behave import *
+from django.utils import timezone
+from datetime import timedelta
+
+use_step_matcher("re")
+
+# --- Helpers Internos ---
+
+def _crear_usuario(email, nombre, rol):
+    from django.contrib.auth import get_user_model
+    Usuario = get_user_model()
+    usuario, _ = Usuario.objects.get_or_create(
+        email=email,
+        defaults={'nombre': nombre, 'rol': rol, 'is_active': True}
+    )
+    return usuario
+
+def _aprobar(context):
+    from apps.tramites.services.aprobacion_service import AprobacionTramiteService
+    AprobacionTramiteService.aprobar_tramite(context.tramite.id, context.tramitador)
+
+def _consultar_metricas(usuario):
+    from django.test import Client
+    from django.urls import reverse
+    cliente = Client()
+    cliente.force_login(usuario)
+    return cliente.get(reverse('tramites:metricas_servicio'), {'formato': 'json'})
+
+# --- Antecedentes ---
+
+@step(u'que los histogramas de instrumentación están vacíos')
+def step_impl(context):
+    from apps.tramites.services.instrumentacion import reiniciar_histogramas
+    reiniciar_histogramas()
+
+@step(u'que existe un trámite pendiente asignado a un tramitador para instrumentación')
+def step_impl(context):
+    from apps.tramites.models import Tramite
+    context.solicitante = _crear_usuario('solicitante.metricas@example.com', 'Solicitante Métricas', 'SOLICITANTE')
+    context.tramitador = _crear_usuario('tramitador.metricas@example.com', 'Tramitador Métricas', 'TRAMITADOR')
+    context.tramite = Tramite.objects.create(
+        solicitante=context.solicitante,
+        tramitador_asignado=context.tramitador,
+        nombre="Trámite Métricas",
+        estado='PENDIENTE',
+        fecha_limite=timezone.now() + timedelta(days=30)
+    )
+
+# --- Escenarios ---
+
+@step(u'que la instrumentación de servicios está desactivada')
+def step_impl(context):
+    from django.test import override_settings
+    ajustes = override_settings(INSTRUMENTACION={'ACTIVO': False})
+    ajustes.enable()
+    context.add_cleanup(ajustes.disable)
+
+@step(u'(?:que )?el tramitador asignado (?:aprueba|aprobó) el trámite instrumentado')
+def step_impl(context):
+    _aprobar(context)
+
+@step(u'el histograma de la etapa "(?P<etapa>[^"]+)" debe tener (?P<total>\d+) ejecuci[oó]n(?:es)?')
+def step_impl(context, etapa, total):
+    from apps.tramites.services.instrumentacion import volcar_histogramas
+    histogramas = volcar_histogramas()
+    assert etapa in histogramas, f"No hay histograma para '{etapa}': {list(histogramas)}"
+    assert histogramas[etapa]['total'] == int(total), histogramas[etapa]
+    assert histogramas[etapa]['errores'] == 0
+
+@step(u'la exportación Prometheus debe incluir la etapa "(?P<etapa>[^"]+)"')
+def step_impl(context, etapa):
+    from apps.tramites.services.instrumentacion import exportar_prometheus
+    texto = exportar_prometheus()
+    assert f'tramites_etapa_duracion_segundos_count{{etapa="{etapa}"}} 1' in texto, texto
+    assert f'tramites_etapa_duracion_segundos_bucket{{etapa="{etapa}",le="+Inf"}} 1' in texto, texto
+
+@step(u'no debe haber histogramas de etapas registrados')
+def step_impl(context):
+    from apps.tramites.services.instrumentacion import volcar_histogramas
+    assert volcar_histogramas() == {}, volcar_histogramas()
+
+@step(u'un administrador consulta las métricas de servicio en formato JSON')
+def step_impl(context):
+    administrador = _crear_usuario('admin.metricas@example.com', 'Admin Métricas', 'ADMINISTRADOR')
+    context.respuesta_metricas = _consultar_metricas(administrador)
+
+@step(u'la respuesta de métricas debe incluir la etapa "(?P<etapa>[^"]+)"')
+def step_impl(context, etapa):
+    assert context.respuesta_metricas.status_code == 200, context.respuesta_metricas.status_code
+    assert context.respuesta_metricas.json()[etapa]['total'] == 1
+
+@step(u'un solicitante que consulta las métricas de servicio debe recibir acceso denegado')
+def step_impl(context):
+    respuesta = _consultar_metricas(context.solicitante)
+    assert respuesta.status_code == 403, respuesta.status_code
@@ -377,4 +377,346 @@ def step_impl_verificar_multiples_documentos_asociados(context):
 
     for documento in context.documentos_subidos:
         assert documento.tramite == context.tramite, \
-            f"El documento versión {documento.version} no está asociado al trámite correcto"
\ No newline at end of file
+            f"El documento versión {documento.version} no está asociado al trámite correcto"
+@step(r"el solicitante abre el formulario de la plantilla desde el menú")
+def step_impl_abrir_formulario(context):
+    """
+    Pide el fragmento del formulario como lo hace el menú lateral del solicitante.
+    """
+    from django.test import Client
+    from django.urls import reverse
+
+    context.cliente = Client()
+    context.cliente.force_login(context.usuario)
+    context.url_formulario = reverse('tramites:generar_formulario_plantilla', args=[context.plantilla_maestra.id])
+    context.respuesta = context.cliente.get(context.url_formulario)
+    context.etag = context.respuesta.get('ETag')
+
+@step(r"la respuesta debe incluir el token CSRF del solicitante y una ETag")
+def step_impl_verificar_formulario(context):
+    """
+    Verifica el fragmento: token CSRF real (no el marcador de la caché) y ETag fuerte.
+    """
+    from apps.tramites.services.fragmento_formulario import MARCADOR_CSRF
+
+    assert context.respuesta.status_code == 200, f"Código inesperado: {context.respuesta.status_code}"
+    form_html = context.respuesta.json()['form_html']
+    assert 'name="csrfmiddlewaretoken"' in form_html, "El formulario no incluye el token CSRF"
+    assert MARCADOR_CSRF not in form_html, "El marcador CSRF no fue reemplazado"
+    assert context.etag and not context.etag.startswith('W/'), f"ETag inválida: {context.etag}"
+    assert 'no-cache' in context.respuesta['Cache-Control']
+
+@step(r"el solicitante vuelve a abrir el formulario enviando la ETag recibida")
+def step_impl_revalidar_formulario(context):
+    context.respuesta = context.cliente.get(context.url_formulario, HTTP_IF_NONE_MATCH=context.etag)
+
+@step(r"el solicitante revalida el formulario dos veces seguidas con la ETag recibida")
+def step_impl_revalidar_dos_veces(context):
+    context.respuestas_revalidacion = [
+        context.cliente.get(context.url_formulario, HTTP_IF_NONE_MATCH=context.etag) for _ in range(2)
+    ]
+
+@step(r"ambas respuestas 304 deben conservar la ETag y permitir guardar el formulario en caché")
+def step_impl_verificar_revalidaciones(context):
+    for respuesta in context.respuestas_revalidacion:
+        assert respuesta.status_code == 304, f"Código inesperado: {respuesta.status_code}"
+        assert respuesta.get('ETag') == context.etag, f"ETag del 304: {respuesta.get('ETag')}"
+        assert respuesta['Cache-Control'] == 'private, no-cache', \
+            f"Cache-Control del 304: {respuesta['Cache-Control']}"
+
+@step(r"el sistema debe responder 304 sin reenviar el formulario")
+def step_impl_verificar_304(context):
+    assert context.respuesta.status_code == 304, f"Código inesperado: {context.respuesta.status_code}"
+    assert not context.respuesta.content, "La respuesta 304 no debe tener cuerpo"
+
+@step(r'el administrador mueve la plantilla maestra al segmento "(?P<segmento>[^"]+)"')
+def step_impl_mover_segmento(context, segmento):
+    from unittest import mock
+    plantilla = type(context.plantilla_maestra).objects.get(id=context.plantilla_maestra.id)
+    plantilla.segmento = segmento
+    with mock.patch('apps.tramites.signals.invalidar_segmentos_bloqueados') as invalidar:
+        plantilla.save()
+    context.solicitantes_invalidados = [llamada.args[0] for llamada in invalidar.call_args_list]
+
+@step(r'el trámite de la plantilla maestra debe quedar en el segmento "(?P<segmento>[^"]+)"')
+def step_impl_segmento_tramite(context, segmento):
+    tramite = context.tramites_activos[-1]
+    tramite.refresh_from_db()
+    assert tramite.segmento == segmento, f"Segmento: {tramite.segmento!r}"
+
+@step(r'los segmentos bloqueados del solicitante deben invalidarse e incluir "(?P<nuevo>[^"]+)" pero no "(?P<anterior>[^"]+)"')
+def step_impl_bloqueados_tras_mover(context, nuevo, anterior):
+    from apps.tramites.services.menu_plantillas import obtener_segmentos_bloqueados
+    assert context.solicitantes_invalidados == [context.usuario.id], context.solicitantes_invalidados
+    bloqueados = obtener_segmentos_bloqueados(context.usuario)
+    assert nuevo in bloqueados and anterior not in bloqueados, bloqueados
+
+@step(r"el guardado no debe actualizar los trámites de la plantilla")
+def step_impl_sin_update_tramites(context):
+    actualizaciones = [sql for sql in context.consultas_guardado if sql.startswith('UPDATE "tramites_tramite"')]
+    assert not actualizaciones, f"UPDATE de trámites al guardar la plantilla: {actualizaciones}"
+
+@step(r'el administrador intenta mover la plantilla maestra al segmento "(?P<segmento>[^"]+)"')
+def step_impl_intentar_mover(context, segmento):
+    context.plantilla_movida = type(context.plantilla_maestra).objects.get(id=context.plantilla_maestra.id)
+    context.plantilla_movida.segmento = segmento
+
+@step(r"el formulario del admin debe rechazar el segmento")
+def step_impl_admin_rechaza(context):
+    """
+    El ModelForm del admin ejecuta full_clean(): el error se muestra en el campo, sin un 500.
+    """
+    from django.core.exceptions import ValidationError
+    try:
+        context.plantilla_movida.full_clean()
+    except ValidationError as e:
+        assert 'segmento' in e.message_dict, e.message_dict
+    else:
+        raise AssertionError("Se aceptó un segmento que choca con un trámite activo")
+
+@step(r"guardar la plantilla igualmente debe fallar con un error de validación")
+def step_impl_guardar_falla(context):
+    from django.core.exceptions import ValidationError
+    from django.db import transaction
+    try:
+        with transaction.atomic():
+            context.plantilla_movida.save()
+    except ValidationError:
+        pass
+    else:
+        raise AssertionError("Se guardó un segmento que choca con un trámite activo")
+
+@step(r'el administrador renombra la plantilla a "(?P<nombre>[^"]+)"')
+def step_impl_renombrar_plantilla(context, nombre):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    # Como el admin: la plantilla se lee de la BD antes de editarla
+    context.plantilla_maestra = type(context.plantilla_maestra).objects.get(id=context.plantilla_maestra.id)
+    context.plantilla_maestra.nombre = nombre
+    with CaptureQueriesContext(connection) as consultas:
+        context.plantilla_maestra.save()
+    context.consultas_guardado = [c['sql'] for c in consultas.captured_queries]
+
+@step(r'la plantilla se renombra a "(?P<nombre>[^"]+)" sin emitir señales')
+def step_impl_renombrar_sin_senales(context, nombre):
+    # Como las actualizaciones de storage_service: update() no pasa por post_save
+    type(context.plantilla_maestra).objects.filter(id=context.plantilla_maestra.id).update(nombre=nombre)
+
+@step(r'el archivo base de la plantilla se reemplaza por "(?P<archivo>[^"]+)" sin emitir señales')
+def step_impl_reemplazar_archivo_sin_senales(context, archivo):
+    type(context.plantilla_maestra).objects.filter(id=context.plantilla_maestra.id).update(
+        archivo_base=f'plantillas_maestras/{archivo}'
+    )
+
+@step(r"el solicitante guarda la ETag del formulario recibido")
+def step_impl_guardar_etag(context):
+    context.etag = context.respuesta['ETag']
+
+@step(r'el sistema debe devolver el formulario con el enlace a "(?P<archivo>[^"]+)"')
+def step_impl_verificar_enlace_archivo(context, archivo):
+    assert context.respuesta.status_code == 200, f"Código inesperado: {context.respuesta.status_code}"
+    assert f'plantillas_maestras/{archivo}' in context.respuesta.json()['form_html'], "El enlace de descarga no se actualizó"
+    assert context.respuesta['ETag'] != context.etag, "La ETag no cambió con el archivo base"
+
+@step(r'el sistema debe devolver el formulario con el nombre "(?P<nombre>[^"]+)"')
+def step_impl_verificar_formulario_actualizado(context, nombre):
+    assert context.respuesta.status_code == 200, f"Código inesperado: {context.respuesta.status_code}"
+    assert nombre in context.respuesta.json()['form_html'], "El fragmento cacheado no se invalidó"
+    assert context.respuesta['ETag'] != context.etag, "La ETag no cambió con la plantilla"
+
+@step(r"se ejecuta el relleno de plantilla y segmento de los trámites existentes")
+def step_impl_relleno_plantilla_segmento(context):
+    """
+    Ejecuta la función de datos de la migración 0018 sobre el estado actual.
+    """
+    import importlib
+    from types import SimpleNamespace
+    from django.apps import apps
+    from django.db import connection
+
+    migracion = importlib.import_module('apps.tramites.migrations.0018_tramite_plantilla_segmento')
+    migracion.asociar_plantillas(apps, SimpleNamespace(connection=connection))
+    context.tramite.refresh_from_db()
+
+@step(r'el trámite debe quedar asociado a la plantilla maestra con el segmento "(?P<segmento>[^"]+)"')
+def step_impl_verificar_asociacion(context, segmento):
+    assert context.tramite.plantilla_id == context.plantilla_maestra.id, \
+        f"Plantilla asociada: {context.tramite.plantilla_id}"
+    assert context.tramite.segmento == segmento, f"Segmento: {context.tramite.segmento!r}"
+
+@step(r"que el solicitante tiene (?P<cantidad>\d+) trámites activos en otros segmentos y uno iniciado desde la plantilla maestra")
+def step_impl_tramites_activos(context, cantidad):
+    """
+    Crea trámites activos en otros segmentos e inicia uno con el servicio (sin documento),
+    que registra la plantilla y su segmento.
+    """
+    from apps.tramites.models import Tramite
+    from apps.tramites.services.tramite_service import iniciar_nuevo_tramite
+
+    context.tramites_activos = [
+        Tramite.objects.create(
+            solicitante=context.usuario,
+            nombre=f"Trámite {i}",
+            segmento=f"Segmento {i}",
+            estado='EN_PROCESO',
+            fecha_limite=timezone.now() + timedelta(days=30),
+        )
+        for i in range(int(cantidad))
+    ]
+    tramite = iniciar_nuevo_tramite(context.usuario, context.plantilla_maestra, {}, generar_documento=False)
+    assert tramite.segmento == context.plantilla_maestra.segmento
+    context.tramites_activos.append(tramite)
+
+@step(r"el sistema debe rechazar el formulario por segmento bloqueado")
+def step_impl_formulario_bloqueado(context):
+    from django.urls import reverse
+    assert context.respuesta.status_code == 302, f"Código inesperado: {context.respuesta.status_code}"
+    assert context.respuesta.url == reverse('usuarios:dashboard-solicitante'), context.respuesta.url
+
+@step(r"la verificación del segmento no debe depender del número de trámites activos")
+def step_impl_consultas_constantes(context):
+    """
+    La verificación es una sola consulta EXISTS: no se busca la plantilla de cada trámite.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as consultas:
+        context.cliente.get(context.url_formulario)
+    consultas_plantilla = [
+        c['sql'] for c in consultas.captured_queries
+        if 'tramites_plantilladocumento' in c['sql'] and 'tipo_especifico' in c['sql'].split('WHERE')[-1]
+    ]
+    assert not consultas_plantilla, f"Búsquedas de plantilla por nombre: {consultas_plantilla}"
+    assert len(consultas.captured_queries) < len(context.tramites_activos) + 3, \
+        f"{len(consultas.captured_queries)} consultas para {len(context.tramites_activos)} trámites"
+
+@step(r"otra petición intenta iniciar un segundo trámite desde la plantilla maestra")
+def step_impl_segundo_tramite(context):
+    """
+    Llama al servicio directamente (como una petición que ya pasó la verificación previa de la vista).
+    """
+    from apps.tramites.services.tramite_service import iniciar_nuevo_tramite, SegmentoOcupadoError
+
+    context.error_segmento = None
+    try:
+        iniciar_nuevo_tramite(context.usuario, context.plantilla_maestra, {}, generar_documento=False)
+    except SegmentoOcupadoError as e:
+        context.error_segmento = e
+
+@step(r"el sistema debe rechazarlo por segmento ocupado")
+def step_impl_verificar_segmento_ocupado(context):
+    assert context.error_segmento is not None, "Se creó un segundo trámite activo en el segmento"
+
+@step(r'el solicitante debe seguir teniendo un solo trámite activo en el segmento "(?P<segmento>[^"]+)"')
+def step_impl_un_activo_por_segmento(context, segmento):
+    from apps.tramites.models import Tramite
+    activos = Tramite.objects.filter(
+        solicitante=context.usuario, segmento=segmento, estado__in=Tramite.ESTADOS_ACTIVOS
+    ).count()
+    assert activos == 1, f"Trámites activos en '{segmento}': {activos}"
+
+def _abrir_panel(context):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    if not hasattr(context, 'cliente'):
+        context.cliente = Client()
+        context.cliente.force_login(context.usuario)
+    with CaptureQueriesContext(connection) as consultas:
+        context.respuesta = context.cliente.get(reverse('usuarios:dashboard-solicitante'))
+    context.consultas_panel = [c['sql'] for c in consultas.captured_queries]
+    assert context.respuesta.status_code == 200, f"Código inesperado: {context.respuesta.status_code}"
+
+@step(r"que el solicitante ya abrió su panel una vez")
+def step_impl_panel_inicial(context):
+    _abrir_panel(context)
+
+@step(r"el solicitante abre su panel de nuevo")
+def step_impl_panel_de_nuevo(context):
+    _abrir_panel(context)
+
+def _entrada_menu(context, tipo):
+    for entradas in context.respuesta.context['menu_plantillas'].values():
+        for entrada in entradas:
+            if entrada['tipo'] == tipo:
+                return entrada
+    raise AssertionError(f"'{tipo}' no está en el menú")
+
+@step(r'el menú debe mostrar la plantilla "(?P<tipo>[^"]+)" bloqueada')
+def step_impl_menu_bloqueado(context, tipo):
+    assert _entrada_menu(context, tipo)['bloqueado'], f"'{tipo}' debería estar bloqueada"
+
+@step(r'el menú debe mostrar la plantilla "(?P<tipo>[^"]+)" disponible')
+def step_impl_menu_disponible(context, tipo):
+    assert not _entrada_menu(context, tipo)['bloqueado'], f"'{tipo}' debería estar disponible"
+
+@step(r"el menú no debe consultar las plantillas ni los trámites uno por uno")
+def step_impl_menu_cacheado(context):
+    """
+    El catálogo y los segmentos bloqueados salen de la caché: ni la tabla de plantillas
+    ni una consulta DISTINCT de segmentos en la segunda visita.
+    """
+    consultas_plantillas = [sql for sql in context.consultas_panel if 'FROM "tramites_plantilladocumento"' in sql]
+    consultas_segmentos = [sql for sql in context.consultas_panel if 'DISTINCT "tramites_tramite"."segmento"' in sql]
+    assert not consultas_plantillas, f"Consultas de plantillas: {consultas_plantillas}"
+    assert not consultas_segmentos, f"Consultas de segmentos: {consultas_segmentos}"
+
+@step(r"el trámite de la plantilla maestra es aprobado")
+def step_impl_aprobar_tramite_maestro(context):
+    """
+    Cambia el estado con save(update_fields), como el servicio de aprobación.
+    """
+    tramite = context.tramites_activos[-1]
+    tramite.estado = 'APROBADO'
+    tramite.save(update_fields=['estado'])
+
+@step(r"el administrador (?P<accion>desactiva|elimina) la plantilla maestra y sube una nueva del mismo tipo")
+def step_impl_reemplazar_plantilla(context, accion):
+    """
+    Reemplazo por nueva subida: la plantilla original deja de estar activa (o desaparece)
+    y se crea otra del mismo tipo y segmento.
+    """
+    anterior = type(context.plantilla_maestra).objects.get(id=context.plantilla_maestra.id)
+    if accion == 'desactiva':
+        anterior.activo = False
+        anterior.save()
+    else:
+        anterior.delete()
+    context.plantilla_nueva = type(anterior).objects.create(
+        nombre="Formulario de Solicitud (nueva subida)",
+        segmento=anterior.segmento,
+        tipo_especifico=anterior.tipo_especifico,
+        archivo_base=SimpleUploadedFile("plantilla_nueva.pdf", b"contenido_dummy_pdf", content_type="application/pdf"),
+        administrador=anterior.administrador,
+        activo=True
+    )
+    context.tramite = context.tramites_activos[-1]
+
+@step(r"el trámite iniciado debe poder editarse y descargarse con la nueva plantilla")
+def step_impl_editar_con_plantilla_nueva(context):
+    from django.test import Client
+    from django.urls import reverse
+    from apps.tramites.models import Documento
+    from apps.tramites.services.tramite_service import actualizar_datos_tramite, generar_pdf_desde_tramite
+
+    actualizar_datos_tramite(context.tramite.id, context.usuario, {})
+    assert Documento.objects.filter(tramite=context.tramite).exists(), "No se generó el documento al editar"
+    assert generar_pdf_desde_tramite(context.tramite.id, context.usuario.id).getvalue(), "El PDF descargado está vacío"
+
+    cliente = Client()
+    cliente.force_login(context.usuario)
+    respuesta = cliente.get(reverse('tramites:descargar_plantilla', args=[context.tramite.id]))
+    assert respuesta.status_code == 200, f"Código inesperado: {respuesta.status_code}"
+    assert 'nueva subida' in respuesta['Content-Disposition'], respuesta['Content-Disposition']
+
+@step(r"el documento diferido del trámite debe generarse con la nueva plantilla")
+def step_impl_generar_con_plantilla_nueva(context):
+    from apps.tramites.models import Tramite
+    from apps.tramites.services.tramite_service import generar_documento_tramite
+
+    Tramite.objects.filter(id=context.tramite.id).update(estado_documento='PENDIENTE')
+    generar_documento_tramite(context.tramite.id)
+    assert Tramite.objects.get(id=context.tramite.id).estado_documento == 'LISTO'
@@ -0,0 +1,148 @@
+from behave import *
+from django.core.files.uploadedfile import SimpleUploadedFile
+import io
+import os
+
+use_step_matcher("re")
+
+# --- Helpers Internos ---
+
+def _ajustar(context, **ajustes):
+    from django.test import override_settings
+    ajuste = override_settings(**ajustes)
+    ajuste.enable()
+    context.add_cleanup(ajuste.disable)
+
+def _crear_tramite(context, plantilla, indice):
+    from datetime import timedelta
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from apps.tramites.models import Tramite
+    Usuario = get_user_model()
+
+    solicitante, _ = Usuario.objects.get_or_create(
+        email=f'solicitante.regeneracion{indice}@example.com',
+        defaults={'nombre': f'Solicitante Regeneración {indice}', 'rol': 'SOLICITANTE'}
+    )
+    return Tramite.objects.create(
+        solicitante=solicitante,
+        nombre=plantilla.tipo_especifico,
+        plantilla=plantilla,
+        segmento=plantilla.segmento,
+        estado='EN_PROCESO',
+        fecha_limite=timezone.now() + timedelta(days=30),
+        datos_formulario={'nombre_completo': f'Solicitante {indice}', 'numero_pasaporte': f'P{indice:03d}'},
+    )
+
+def _regenerar(context, lote):
+    from django.core.management import call_command
+    call_command(
+        'regenerar_documentos_plantilla', context.plantilla.id, lote=lote,
+        checkpoint=os.path.join(context.directorio_media, 'checkpoint.json'), stdout=io.StringIO(),
+    )
+
+# --- Pasos ---
+
+@step(r"que los documentos regenerados se guardan en un directorio temporal")
+def step_impl_media_temporal(context):
+    import tempfile
+    directorio = tempfile.TemporaryDirectory()
+    context.add_cleanup(directorio.cleanup)
+    context.directorio_media = directorio.name
+    _ajustar(context, MEDIA_ROOT=directorio.name, PDF_RENDER_ENGINE={'MODO': 'inline'}, PDF_RENDER_CACHE={'ACTIVO': False})
+
+@step(r"que la plantilla tiene (?P<cantidad>\d+) trámites con datos del formulario")
+def step_impl_tramites_plantilla(context, cantidad):
+    context.tramites = [_crear_tramite(context, context.plantilla, i) for i in range(int(cantidad))]
+
+@step(r"que otra plantilla con el mismo tipo específico tiene un trámite con datos")
+def step_impl_otra_plantilla(context):
+    from apps.tramites.models import PlantillaDocumento
+    otra = PlantillaDocumento.objects.create(
+        nombre="Formulario Cache (anterior)",
+        segmento="Visas Antiguas",
+        tipo_especifico=context.plantilla.tipo_especifico,
+        archivo_base=SimpleUploadedFile("formulario_anterior.pdf", b"%PDF-1.4", content_type="application/pdf"),
+        administrador=context.plantilla.administrador,
+        activo=True,
+    )
+    context.tramite_otra_plantilla = _crear_tramite(context, otra, 99)
+
+@step(r"se ejecuta la regeneración de documentos de la plantilla en lotes de (?P<lote>\d+)")
+def step_impl_regenerar(context, lote):
+    _regenerar(context, int(lote))
+
+@step(r"se ejecuta la regeneración de documentos con un pool de (?P<workers>\d+) procesos")
+def step_impl_regenerar_pool(context, workers):
+    """
+    Un solo lote con todos los trámites: el motor lo reparte en un trabajo por worker.
+    'fork' hereda el MEDIA_ROOT temporal de la prueba ('spawn' se prueba en cache_plantillas_pdf).
+    """
+    from apps.tramites.services.pdf_render_engine import obtener_motor
+    _ajustar(context, PDF_RENDER_ENGINE={'MODO': 'procesos', 'MAX_WORKERS': int(workers), 'TIMEOUT': 60, 'CONTEXTO': 'fork'})
+    _regenerar(context, len(context.tramites))
+    context.renderizados_locales = obtener_motor().renderizados_locales
+
+@step(r"la regeneración de documentos falla al registrar los documentos")
+def step_impl_regenerar_falla(context):
+    from unittest import mock
+    from django.db import DatabaseError
+    with mock.patch('apps.tramites.models.Documento.objects.bulk_create', side_effect=DatabaseError("disco lleno")):
+        try:
+            _regenerar(context, 10)
+        except DatabaseError:
+            pass
+        else:
+            raise AssertionError("La regeneración no propagó el error del insert")
+
+@step(r"cada trámite debe tener (?P<cantidad>\d+) versi(?:ón|ones) generadas? con el archivo base actual")
+def step_impl_versiones_regeneradas(context, cantidad):
+    from apps.tramites.models import Documento
+    from apps.tramites.services.pdf_template_cache import obtener_huella_plantilla
+    huella = obtener_huella_plantilla(context.plantilla)
+    for tramite in context.tramites:
+        documentos = list(Documento.objects.filter(tramite=tramite))
+        assert len(documentos) == int(cantidad), f"Trámite #{tramite.id}: {len(documentos)} documentos"
+        assert all(d.huella_plantilla == huella for d in documentos), "Documento con otra huella de plantilla"
+        assert all(os.path.exists(d.archivo.path) for d in documentos), "Documento sin archivo publicado"
+
+@step(r"cada documento regenerado debe contener los datos de su trámite")
+def step_impl_datos_regenerados(context):
+    import PyPDF2
+    from apps.tramites.models import Documento
+    for tramite in context.tramites:
+        documento = Documento.objects.get(tramite=tramite)
+        with documento.archivo.open('rb') as archivo:
+            pagina = PyPDF2.PdfReader(io.BytesIO(archivo.read())).pages[0]
+        valores = {
+            anotacion.get_object().get('/T'): anotacion.get_object().get('/V')
+            for anotacion in pagina['/Annots']
+        }
+        assert valores.get('numero_pasaporte') == tramite.datos_formulario['numero_pasaporte'], valores
+
+@step(r'que los archivos subidos se guardan con permisos "(?P<modo>[0-7]+)"')
+def step_impl_permisos_configurados(context, modo):
+    _ajustar(context, FILE_UPLOAD_PERMISSIONS=int(modo, 8))
+
+@step(r'cada documento regenerado debe tener permisos "(?P<modo>[0-7]+)"')
+def step_impl_permisos_documentos(context, modo):
+    import stat
+    from apps.tramites.models import Documento
+    for documento in Documento.objects.filter(tramite__in=context.tramites):
+        permisos = stat.S_IMODE(os.stat(documento.archivo.path).st_mode)
+        assert permisos == int(modo, 8), f"Documento #{documento.id} con permisos {oct(permisos)}"
+
+@step(r"el trámite de la otra plantilla no debe tener documentos")
+def step_impl_otra_sin_documentos(context):
+    assert not context.tramite_otra_plantilla.documentos.exists(), "Se regeneró un trámite de otra plantilla"
+
+@step(r"ningún trámite debe tener documentos")
+def step_impl_sin_documentos(context):
+    from apps.tramites.models import Documento
+    assert not Documento.objects.filter(tramite__in=context.tramites).exists(), "Quedaron documentos registrados"
+
+@step(r"no debe quedar ningún PDF en las carpetas de los trámites")
+def step_impl_sin_archivos(context):
+    raiz = os.path.join(context.directorio_media, 'solicitante')
+    archivos = [nombre for _, _, nombres in os.walk(raiz) for nombre in nombres]
+    assert not archivos, f"Archivos huérfanos: {archivos}"
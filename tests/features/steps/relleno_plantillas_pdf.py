@@ -0,0 +1,243 @@
+from behave import *
+from django.core.files.uploadedfile import SimpleUploadedFile
+import io
+
+use_step_matcher("re")
+
+# --- Helpers Internos ---
+
+def _generar_pdf_dos_paginas():
+    """Genera un PDF con un texto y una casilla en la página 1 y un texto en la página 2."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    buffer = io.BytesIO()
+    can = canvas.Canvas(buffer, pagesize=letter)
+    can.drawString(72, 720, "Página 1")
+    can.acroForm.textfield(name='nombre_completo', x=200, y=650, width=250, height=20)
+    can.acroForm.checkbox(name='acepta_terminos', x=200, y=600)
+    can.showPage()
+    can.drawString(72, 720, "Página 2")
+    can.acroForm.textfield(name='pasaporte', x=200, y=650, width=250, height=20)
+    can.showPage()
+    can.save()
+    return buffer.getvalue()
+
+def _valores_pagina(contenido, numero_pagina):
+    """Devuelve {nombre: anotación} de los widgets de una página del PDF."""
+    import PyPDF2
+    pagina = PyPDF2.PdfReader(io.BytesIO(contenido)).pages[numero_pagina]
+    return {
+        anotacion.get_object().get('/T'): anotacion.get_object()
+        for anotacion in pagina.get('/Annots') or []
+    }
+
+# --- Steps ---
+
+@step(r"que existe una plantilla maestra PDF de 2 páginas con una casilla de verificación")
+def step_impl_plantilla_dos_paginas(context):
+    """
+    Crea una plantilla con un PDF real de dos páginas.
+    """
+    from apps.tramites.models import PlantillaDocumento
+    from django.contrib.auth import get_user_model
+    Usuario = get_user_model()
+
+    admin, _ = Usuario.objects.get_or_create(
+        email='admin.relleno@example.com',
+        defaults={'nombre': 'Admin Relleno', 'rol': 'ADMINISTRADOR'}
+    )
+
+    context.plantilla = PlantillaDocumento.objects.create(
+        nombre="Formulario Multipágina",
+        segmento="Residencias",
+        tipo_especifico="Residencia Multipágina",
+        archivo_base=SimpleUploadedFile("multipagina.pdf", _generar_pdf_dos_paginas(), content_type="application/pdf"),
+        administrador=admin,
+        activo=True
+    )
+
+@step(r"(?:que )?el sistema extrae los campos de la plantilla")
+def step_impl_extraer_campos(context):
+    """
+    Ejecuta la extracción automática de campos (la misma que al subir la plantilla).
+    """
+    from apps.tramites.services.pdf_field_extractor import extraer_campos_pdf
+    context.campos_creados = extraer_campos_pdf(context.plantilla)
+    context.plantilla.refresh_from_db()
+
+@step(r'el índice de layout debe ubicar el campo "(?P<campo>[^"]+)" en la página (?P<pagina>\d+)')
+def step_impl_verificar_indice(context, campo, pagina):
+    """
+    Verifica la página registrada en el índice de layout persistido.
+    """
+    indice = context.plantilla.indice_campos
+    assert campo in indice.get('campos', {}), f"El campo '{campo}' no está en el índice"
+    paginas = [widget['pagina'] + 1 for widget in indice['campos'][campo]['widgets']]
+    assert paginas == [int(pagina)], f"Se esperaba la página {pagina}, el índice indica {paginas}"
+
+@step(r'la plantilla debe tener un campo de tipo "(?P<tipo>[^"]+)" llamado "(?P<nombre>[^"]+)"')
+def step_impl_verificar_campo_tipo(context, tipo, nombre):
+    """
+    Verifica que la extracción creó el CampoPlantilla con el tipo correcto.
+    """
+    campo = context.plantilla.campos.filter(nombre_tecnico=nombre).first()
+    assert campo is not None, f"No se creó el campo '{nombre}'"
+    assert campo.tipo_campo == tipo, f"El campo '{nombre}' es de tipo '{campo.tipo_campo}', se esperaba '{tipo}'"
+
+@step(r'se rellena la plantilla con el pasaporte "(?P<pasaporte>[^"]+)" y los términos aceptados')
+def step_impl_rellenar(context, pasaporte):
+    """
+    Rellena la plantilla con datos en ambas páginas.
+    """
+    from apps.tramites.services.tramite_service import _rellenar_pdf_plantilla
+    buffer = _rellenar_pdf_plantilla(context.plantilla, {
+        'nombre_completo': 'Solicitante Multipágina',
+        'pasaporte': pasaporte,
+        'acepta_terminos': 'on',
+    })
+    context.pdf_generado = buffer.getvalue()
+
+@step(r'la página (?P<pagina>\d+) del PDF generado debe contener el valor "(?P<valor>[^"]+)" en el campo "(?P<campo>[^"]+)"')
+def step_impl_verificar_valor_pagina(context, pagina, valor, campo):
+    """
+    Verifica el valor del campo en la página indicada.
+    """
+    widgets = _valores_pagina(context.pdf_generado, int(pagina) - 1)
+    assert campo in widgets, f"El campo '{campo}' no está en la página {pagina}"
+    assert widgets[campo].get('/V') == valor, \
+        f"Se esperaba '{valor}', el PDF contiene '{widgets[campo].get('/V')}'"
+
+@step(r'la casilla "(?P<campo>[^"]+)" del PDF generado debe quedar marcada')
+def step_impl_verificar_casilla(context, campo):
+    """
+    Verifica que la casilla quede en su estado activo.
+    """
+    widgets = _valores_pagina(context.pdf_generado, 0)
+    assert widgets[campo].get('/AS') not in (None, '/Off'), "La casilla no quedó marcada"
+
+@step(r'que el administrador movió el campo "(?P<nombre>[^"]+)" a la sección "(?P<seccion>[^"]+)" con orden (?P<orden>\d+)')
+def step_impl_personalizar_campo(context, nombre, seccion, orden):
+    """
+    Simula la edición del campo desde CampoPlantillaInline.
+    """
+    campo = context.plantilla.campos.get(nombre_tecnico=nombre)
+    campo.seccion = seccion
+    campo.orden = int(orden)
+    campo.save()
+    context.ids_campos = dict(context.plantilla.campos.values_list('nombre_tecnico', 'id'))
+
+@step(r'el sistema vuelve a extraer los campos de la plantilla')
+def step_impl_reextraer_campos(context):
+    """
+    Repite la extracción registrando las consultas ejecutadas.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from apps.tramites.services.pdf_field_extractor import extraer_campos_pdf
+    with CaptureQueriesContext(connection) as consultas:
+        extraer_campos_pdf(context.plantilla)
+    context.consultas_reextraccion = consultas.captured_queries
+
+@step(r'el campo "(?P<nombre>[^"]+)" debe conservar su identificador, la sección "(?P<seccion>[^"]+)" y el orden (?P<orden>\d+)')
+def step_impl_verificar_personalizacion(context, nombre, seccion, orden):
+    """
+    Verifica que la sincronización no tocó el id, la sección ni el orden del campo.
+    """
+    campo = context.plantilla.campos.get(nombre_tecnico=nombre)
+    assert campo.id == context.ids_campos[nombre], "El campo se recreó con otro id"
+    assert campo.seccion == seccion, f"Sección '{campo.seccion}', se esperaba '{seccion}'"
+    assert campo.orden == int(orden), f"Orden {campo.orden}, se esperaba {orden}"
+
+@step(r'la re-extracción no debe crear ni eliminar campos')
+def step_impl_verificar_sin_churn(context):
+    """
+    Verifica que ningún campo se recreó y que no hubo INSERT ni DELETE en la re-extracción.
+    """
+    ids_actuales = dict(context.plantilla.campos.values_list('nombre_tecnico', 'id'))
+    assert ids_actuales == context.ids_campos, f"{context.ids_campos} -> {ids_actuales}"
+    sentencias = [consulta['sql'].split()[0].upper() for consulta in context.consultas_reextraccion]
+    assert 'INSERT' not in sentencias and 'DELETE' not in sentencias, sentencias
+
+@step(r'que la configuración del clasificador añade el idioma "(?P<idioma>[^"]+)" con la palabra clave "(?P<palabra>[^"]+)" para fechas')
+def step_impl_configurar_clasificador(context, idioma, palabra):
+    """
+    Amplía las tablas de palabras clave desde settings, como lo haría un despliegue.
+    """
+    from django.test import override_settings
+    ajustes = override_settings(CLASIFICADOR_CAMPOS={
+        'IDIOMAS': ['es', 'en', idioma],
+        'PALABRAS_CLAVE': {idioma: {'date': [palabra]}},
+    })
+    ajustes.enable()
+    context.add_cleanup(ajustes.disable)
+
+@step(r'se clasifican los nombres de campo "(?P<nombres>[^"]+)"')
+def step_impl_clasificar_lote(context, nombres):
+    """
+    Clasifica todos los nombres en una sola llamada al clasificador.
+    """
+    from apps.tramites.services.clasificador_campos import obtener_clasificador
+    context.clasificados = obtener_clasificador().clasificar_lote([n.strip() for n in nombres.split(',')])
+
+@step(r'el campo "(?P<nombre>[^"]+)" debe clasificarse como "(?P<tipo>[^"]+)"')
+def step_impl_verificar_tipo_clasificado(context, nombre, tipo):
+    assert context.clasificados[nombre][1] == tipo, context.clasificados[nombre]
+
+@step(r'el campo "(?P<nombre>[^"]+)" debe mostrarse como "(?P<legible>[^"]+)"')
+def step_impl_verificar_nombre_legible(context, nombre, legible):
+    assert context.clasificados[nombre][0] == legible, context.clasificados[nombre]
+
+@step(r'que el esquema del formulario de la plantilla ya fue compilado')
+def step_impl_compilar_esquema(context):
+    """
+    Primera lectura del esquema: se compila desde la BD y queda en caché.
+    """
+    from apps.tramites.services.esquema_formulario import obtener_esquema_formulario
+    context.esquema = obtener_esquema_formulario(context.plantilla)
+
+@step(r'se obtiene de nuevo el esquema del formulario')
+def step_impl_obtener_esquema(context):
+    """
+    Segunda lectura, capturando las consultas SQL ejecutadas.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from apps.tramites.services.esquema_formulario import obtener_esquema_formulario
+
+    with CaptureQueriesContext(connection) as consultas:
+        context.esquema_cacheado = obtener_esquema_formulario(context.plantilla.id)
+    context.consultas_esquema = [consulta['sql'] for consulta in consultas.captured_queries]
+
+@step(r'no se debe consultar la tabla de campos de la plantilla')
+def step_impl_verificar_sin_consultas(context):
+    """
+    Verifica que el esquema salió de la caché (mismo objeto, sin SQL).
+    """
+    assert context.esquema_cacheado is context.esquema, "Se recompiló el esquema"
+    assert not context.consultas_esquema, f"Consultas inesperadas: {context.consultas_esquema}"
+    assert context.esquema.campos, "El esquema está vacío"
+
+@step(r'el administrador marca el campo "(?P<nombre>[^"]+)" como requerido')
+def step_impl_marcar_requerido(context, nombre):
+    """
+    Edita el campo como lo haría el admin (save() emite la señal de invalidación).
+    """
+    campo = context.plantilla.campos.get(nombre_tecnico=nombre)
+    campo.es_requerido = True
+    campo.save()
+
+@step(r'la validación de datos sin "(?P<nombre>[^"]+)" debe fallar con "(?P<mensaje>[^"]+)"')
+def step_impl_verificar_validacion(context, nombre, mensaje):
+    """
+    Valida un formulario sin el campo y verifica que se usa el esquema actualizado.
+    """
+    from django.core.exceptions import ValidationError
+    from apps.tramites.services.tramite_data_service import TramiteDataService
+
+    try:
+        TramiteDataService.validar_datos_formulario({'nombre_completo': 'Ana Pérez'}, context.plantilla)
+    except ValidationError as e:
+        assert mensaje in e.messages, f"Mensajes: {e.messages}"
+    else:
+        raise AssertionError(f"La validación aceptó datos sin '{nombre}'")
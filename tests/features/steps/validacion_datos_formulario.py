@@ -0,0 +1,126 @@
+from behave import *
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+use_step_matcher("re")
+
+# --- Helpers Internos ---
+
+def _parsear_datos(texto):
+    """Convierte 'campo=valor; campo=valor' en un diccionario (los valores conservan sus espacios)."""
+    datos = {}
+    for par in texto.split(';'):
+        campo, _, valor = par.partition('=')
+        datos[campo.strip()] = valor
+    return datos
+
+# --- Steps ---
+
+@step(r"que existe una plantilla con campos tipados")
+def step_impl_plantilla_tipada(context):
+    """
+    Crea una plantilla con un campo de cada tipo a partir de la tabla del feature.
+    """
+    from apps.tramites.models import PlantillaDocumento, CampoPlantilla
+    from django.contrib.auth import get_user_model
+    Usuario = get_user_model()
+
+    admin, _ = Usuario.objects.get_or_create(
+        email='admin.validacion@example.com',
+        defaults={'nombre': 'Admin Validación', 'rol': 'ADMINISTRADOR'}
+    )
+    context.plantilla = PlantillaDocumento.objects.create(
+        nombre="Formulario Tipado",
+        segmento="Visas",
+        tipo_especifico="Visa Tipada",
+        archivo_base=SimpleUploadedFile("tipado.pdf", b"%PDF-1.4 dummy", content_type="application/pdf"),
+        administrador=admin,
+        activo=True
+    )
+    for orden, row in enumerate(context.table):
+        CampoPlantilla.objects.create(
+            plantilla=context.plantilla,
+            nombre_tecnico=row['nombre_tecnico'],
+            nombre_campo=row['nombre_campo'],
+            tipo_campo=row['tipo_campo'],
+            es_requerido=row['es_requerido'] == 'si',
+            orden=orden,
+        )
+
+@step(r'que la plantilla tiene el campo clasificado automáticamente "(?P<nombre>[^"]+)"')
+def step_impl_campo_clasificado(context, nombre):
+    """
+    Crea el campo con el tipo que le asigna la extracción de campos a partir de su nombre.
+    """
+    from apps.tramites.models import CampoPlantilla
+    from apps.tramites.services.clasificador_campos import obtener_clasificador
+    nombre_legible, tipo = obtener_clasificador().clasificar_lote([nombre])[nombre]
+    CampoPlantilla.objects.create(
+        plantilla=context.plantilla,
+        nombre_tecnico=nombre,
+        nombre_campo=nombre_legible,
+        tipo_campo=tipo,
+        es_requerido=True,
+        orden=context.plantilla.campos.count(),
+    )
+
+@step(r'se validan los datos "(?P<datos>[^"]*)"')
+def step_impl_validar_datos(context, datos):
+    """
+    Valida un envío con el servicio de datos de trámites.
+    """
+    from django.core.exceptions import ValidationError
+    from apps.tramites.services.tramite_data_service import TramiteDataService
+
+    context.datos_limpios = None
+    context.errores_validacion = None
+    try:
+        context.datos_limpios = TramiteDataService.validar_datos_formulario(_parsear_datos(datos), context.plantilla)
+    except ValidationError as e:
+        context.errores_validacion = e.message_dict
+
+@step(r"la validación debe aceptar los datos")
+def step_impl_datos_aceptados(context):
+    assert context.errores_validacion is None, f"Errores inesperados: {context.errores_validacion}"
+
+@step(r'el valor limpio de "(?P<campo>[^"]+)" debe ser "(?P<valor>[^"]+)"')
+def step_impl_valor_limpio(context, campo, valor):
+    assert context.datos_limpios[campo] == valor, f"Valor limpio: {context.datos_limpios[campo]!r}"
+
+@step(r'la validación debe rechazar los campos "(?P<campos>[^"]+)"')
+def step_impl_campos_rechazados(context, campos):
+    esperados = [campo.strip() for campo in campos.split(',')]
+    assert context.errores_validacion is not None, "La validación aceptó datos inválidos"
+    assert list(context.errores_validacion) == esperados, \
+        f"Campos con error: {list(context.errores_validacion)}, esperados: {esperados}"
+
+@step(r'el error de "(?P<campo>[^"]+)" debe ser "(?P<mensaje>[^"]+)"')
+def step_impl_mensaje_error(context, campo, mensaje):
+    assert context.errores_validacion[campo] == [mensaje], f"Errores: {context.errores_validacion[campo]}"
+
+@step(r"se valida un lote de (?P<total>\d+) envíos donde cada décimo tiene un correo inválido")
+def step_impl_validar_lote(context, total):
+    """
+    Valida un lote sintético como el de una importación masiva.
+    """
+    from apps.tramites.services.tramite_data_service import TramiteDataService
+
+    filas = [
+        {
+            'nombre_completo': f'Solicitante {i}',
+            'correo': f'solicitante{i}' if i % 10 == 0 else f'solicitante{i}@example.com',
+            'fecha_nacimiento': '1990-03-15',
+        }
+        for i in range(int(total))
+    ]
+    context.resultado_lote = TramiteDataService.validar_lote_datos_formulario(filas, context.plantilla)
+
+@step(r"el lote debe tener (?P<validos>\d+) envíos válidos y (?P<invalidos>\d+) con errores")
+def step_impl_verificar_lote(context, validos, invalidos):
+    resultado = context.resultado_lote
+    assert len(resultado.validos) == int(validos), f"Válidos: {len(resultado.validos)}"
+    assert len(resultado.errores) == int(invalidos), f"Con errores: {len(resultado.errores)}"
+    assert all(indice % 10 == 0 for indice in resultado.errores), "Índices de error incorrectos"
+
+@step(r'los errores del lote deben indicar solo el campo "(?P<campo>[^"]+)"')
+def step_impl_errores_lote(context, campo):
+    assert all(list(errores) == [campo] for errores in context.resultado_lote.errores.values())
@@ -0,0 +1,42 @@
+# language: es
+Característica: Validación tipada de los datos del formulario
+  Como tramitador
+  Quiero que los datos de cada trámite se validen según el tipo de cada campo
+  Para no generar documentos con correos, fechas o números inválidos que luego hay que regenerar
+
+  Antecedentes:
+    Dado que existe una plantilla con campos tipados
+      | nombre_tecnico   | nombre_campo        | tipo_campo | es_requerido |
+      | nombre_completo  | Nombre Completo     | text       | si           |
+      | correo           | Correo Electrónico  | email      | si           |
+      | fecha_nacimiento | Fecha de Nacimiento | date       | si           |
+      | telefono         | Teléfono            | number     | no           |
+      | acepta_terminos  | Acepta Términos     | checkbox   | no           |
+
+  Escenario: Un envío con datos válidos se acepta y se limpia
+    Cuando se validan los datos "nombre_completo= Ana Pérez ; correo=ana@example.com; fecha_nacimiento=15/03/1990; telefono=+593 99 123 4567; acepta_terminos=on"
+    Entonces la validación debe aceptar los datos
+    Y el valor limpio de "nombre_completo" debe ser "Ana Pérez"
+
+  Escenario: Cada campo inválido devuelve su propio error
+    Cuando se validan los datos "nombre_completo=   ; correo=ana@; fecha_nacimiento=31/02/1990; telefono=sin teléfono; acepta_terminos=quizás"
+    Entonces la validación debe rechazar los campos "nombre_completo, correo, fecha_nacimiento, telefono, acepta_terminos"
+    Y el error de "correo" debe ser "El campo 'Correo Electrónico' debe ser un correo electrónico válido."
+
+  Escenario: Los números se validan analizando el valor completo
+    Cuando se validan los datos "nombre_completo=Ana; correo=ana@example.com; fecha_nacimiento=1990-03-15; telefono=12abc"
+    Entonces la validación debe rechazar los campos "telefono"
+    Y el error de "telefono" debe ser "El campo 'Teléfono' debe contener un número válido."
+    Cuando se validan los datos "nombre_completo=Ana; correo=ana@example.com; fecha_nacimiento=1990-03-15; telefono=(02) 234-5678"
+    Entonces la validación debe aceptar los datos
+
+  Escenario: Un campo clasificado automáticamente como lugar acepta el nombre de una ciudad
+    Dado que la plantilla tiene el campo clasificado automáticamente "lugar_nacimiento"
+    Cuando se validan los datos "nombre_completo=Ana; correo=ana@example.com; fecha_nacimiento=1990-03-15; lugar_nacimiento=Quito"
+    Entonces la validación debe aceptar los datos
+    Y el valor limpio de "lugar_nacimiento" debe ser "Quito"
+
+  Escenario: Un lote de envíos se valida en una sola llamada
+    Cuando se valida un lote de 2000 envíos donde cada décimo tiene un correo inválido
+    Entonces el lote debe tener 1800 envíos válidos y 200 con errores
+    Y los errores del lote deben indicar solo el campo "correo"